@@ -4,26 +4,38 @@
 import logging
 import os
 import threading
-from concurrent.futures import Future, ThreadPoolExecutor
+from collections import deque
+from concurrent.futures import (CancelledError, Executor, Future,
+                                ThreadPoolExecutor)
 from copy import deepcopy
-from queue import Empty, Queue
-from time import sleep
-from typing import TYPE_CHECKING, Any, Dict, List
+from functools import partial
+from queue import Empty
+from time import monotonic, perf_counter
+from typing import (Any, Callable, Deque, Dict, List, NoReturn, Optional,
+                    Tuple, Union)
 from uuid import uuid4
 
-from flask import Blueprint, Flask, Response, abort, jsonify, request
+from flask import Blueprint, Flask, Response, abort, g, jsonify, request
 from waitress import serve
+from werkzeug.exceptions import RequestEntityTooLarge
 
+from nii_dg.cancellation import CancelToken, cancellable, check_cancelled
+from nii_dg.entity import Entity
 from nii_dg.error import CrateError, CrateValidationError, EntityError
+from nii_dg.metrics import (ENTITY_VALIDATION_DURATION, EXECUTOR_BUSY_WORKERS,
+                            EXECUTOR_WORKERS, HTTP_REQUEST_DURATION,
+                            HTTP_REQUESTS, JOB_DURATION, JOB_QUEUE_LENGTH,
+                            JOB_QUEUE_WAIT, JOBS, PHASE_DURATION, REGISTRY,
+                            REJECTED_REQUESTS)
+from nii_dg.profiling import CHECK_PROPS, VALIDATE, Profiler, activate, timed
 from nii_dg.ro_crate import ROCrate
-from nii_dg.utils import DG_CONFIG
-
-if TYPE_CHECKING:
-    from nii_dg.entity import Entity
-
+from nii_dg.scheduler import JobScheduler
+from nii_dg.stored_crate import LazyROCrate
+from nii_dg.utils import DG_CONFIG, chain_future
 
 GET_STATUS_CODE = 200
 POST_STATUS_CODE = 200
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
 JOB_STATUS = [
     "UNKNOWN",
     "QUEUED",
@@ -35,13 +47,75 @@ JOB_STATUS = [
     "CANCELED",
 ]
 
+# priority classes of jobs
+FAST = "fast"  # requests with at most DG_FAST_JOB_MAX_ENTITIES entities to validate
+BULK = "bulk"  # the other requests, run when no fast job is queued
+WORKFLOW = "workflow"  # requests that wait on an external service, e.g., a sapporo re-execution
+
+
+class WorkerPool(Executor):
+    """
+    The workers that run the jobs of some priority classes.
+    A job is taken from the scheduler only when a worker is free, so that a queued job with a higher priority is not
+    overtaken by the jobs already handed to the executor.
+
+    The pool is also the executor of the follow-up work of its jobs, e.g., checking a finished sapporo run.
+    Submitted work waits for a free worker like a job, ahead of the queued jobs.
+
+    Args:
+        name (str): The name of the pool, e.g., "default".
+        max_workers (int): The number of workers.
+        priorities (List[str]): The priority classes of the jobs to run, in the order of priority.
+    """
+
+    def __init__(self, name: str, max_workers: int, priorities: List[str]) -> None:
+        self.name = name
+        self.max_workers = max_workers
+        self.priorities = priorities
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=f"nii_dg_{name}"
+        )
+        self.free_workers = threading.Semaphore(max_workers)
+        self.follow_ups: Deque[Tuple["Future[Any]", Callable[..., Any], Any, Any]] = (
+            deque()
+        )
+
+    def submit(  # type: ignore[override]
+        self, fn: Callable[..., Any], /, *args: Any, **kwargs: Any
+    ) -> "Future[Any]":
+        future: "Future[Any]" = Future()
+        self.follow_ups.append((future, fn, args, kwargs))
+        # the dispatcher may be waiting for a job while holding the last free worker
+        scheduler.wake()
+        return future
+
 
 # --- state ---
 
-executor = ThreadPoolExecutor(max_workers=3)
-job_queue = Queue()  # type:ignore
+pools = [
+    WorkerPool("default", DG_CONFIG["DG_JOB_WORKERS"], [FAST, BULK]),
+    WorkerPool("workflow", DG_CONFIG["DG_WORKFLOW_JOB_WORKERS"], [WORKFLOW]),
+]
+pool_map: Dict[str, WorkerPool] = {
+    priority: pool for pool in pools for priority in pool.priorities
+}
+executor = pool_map[BULK].executor
+scheduler = JobScheduler()
+# the records of a request are kept until DG_JOB_RECORD_TTL seconds after its job has finished
 job_map: Dict[str, Future] = {}  # type:ignore
 request_map: Dict[str, Dict[str, Any]] = {}
+profile_map: Dict[str, Profiler] = {}
+token_map: Dict[str, CancelToken] = {}
+client_map: Dict[str, str] = {}  # until the job leaves the queue
+finished_jobs: Deque[Tuple[float, str]] = deque()  # (finished at, request_id)
+finished_jobs_lock = threading.Lock()
+client_jobs: Dict[str, int] = {}  # the number of queued and running jobs by client
+client_lock = threading.Lock()
+
+for pool in pools:
+    EXECUTOR_WORKERS.set(pool.max_workers, pool=pool.name)
+    EXECUTOR_BUSY_WORKERS.set(0, pool=pool.name)
+JOB_QUEUE_LENGTH.set_function(scheduler.qsize)
 
 # --- result wrapper ---
 
@@ -68,6 +142,25 @@ def result_wrapper(error_list: List[EntityError]) -> List[Dict[str, str]]:
 app_bp = Blueprint("app", __name__)
 
 
+@app_bp.before_app_request
+def start_request_timer() -> None:
+    g.request_start = perf_counter()
+
+
+@app_bp.after_app_request
+def record_request(response: Response) -> Response:
+    # the URL rule, not the path, so that each request ID does not make a new series
+    endpoint = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+    HTTP_REQUESTS.inc(
+        method=request.method, endpoint=endpoint, status=str(response.status_code)
+    )
+    if "request_start" in g:
+        HTTP_REQUEST_DURATION.observe(
+            perf_counter() - g.request_start, method=request.method, endpoint=endpoint
+        )
+    return response
+
+
 @app_bp.errorhandler(400)
 def invalid_request(err: Exception) -> Response:
     response: Response = jsonify(message=str(err))
@@ -82,48 +175,266 @@ def internal_error(err: Exception) -> Response:
     return response
 
 
-def validate(crate: ROCrate, entities: List["Entity"]) -> List[Any]:
-    if len(entities) > 0:
-        error = CrateValidationError()
-        for entity in entities:
-            try:
-                entity.validate(crate)
-            except EntityError as err:
-                error.add(err)
+def record_phase(phase: str, seconds: float, profiler: Optional[Profiler]) -> None:
+    PHASE_DURATION.observe(seconds, phase=phase)
+    if profiler is not None:
+        profiler.add_phase(phase, seconds)
 
-        if error.has_error():
-            raise error
-    else:
-        crate.validate()
+
+def collect_results(futures: List["Future[None]"]) -> List[Any]:
+    error = CrateValidationError()
+    for future in futures:
+        err = future.exception()
+        if err is None:
+            continue
+        if isinstance(err, EntityError):
+            error.add(err)
+        else:
+            raise err
+
+    if error.has_error():
+        raise error
     return []
 
 
+def validate(
+    crate: ROCrate,
+    entities: List["Entity"],
+    profiler: Optional[Profiler] = None,
+    job_executor: Optional[Executor] = None,
+) -> Union[List[Any], "Future[List[Any]]"]:
+    """
+    Validate the given entities, or all entities in the crate if none are given.
+
+    If an entity is still waiting on an external service after validate_async() (e.g., a sapporo re-execution),
+    a Future of the result is returned instead, so that this worker thread is released in the meantime.
+    Its follow-up work runs in job_executor, the worker pool of the job by default.
+    If a profiler is given, the timings of the validation are recorded to it.
+    """
+    job_executor = job_executor if job_executor is not None else pool_map[BULK]
+    start = perf_counter()
+    targets = entities if len(entities) > 0 else crate.all_entities
+    futures = []
+    with activate(profiler), crate.validation_pass():
+        for entity in targets:
+            check_cancelled()
+            entity_start = perf_counter()
+            with timed(VALIDATE, entity=entity):
+                futures.append(entity.validate_async(crate, job_executor))
+            ENTITY_VALIDATION_DURATION.observe(
+                perf_counter() - entity_start,
+                entity_type=f"{entity.schema_name}.{entity.type}",
+            )
+    pending = [future for future in futures if not future.done()]
+    if len(pending) == 0:
+        record_phase(VALIDATE, perf_counter() - start, profiler)
+        return collect_results(futures)
+
+    result: "Future[List[Any]]" = Future()
+    lock = threading.Lock()
+    remaining = [len(pending)]
+
+    def on_done(_: "Future[None]") -> None:
+        with lock:
+            remaining[0] -= 1
+            if remaining[0] > 0:
+                return
+        record_phase(VALIDATE, perf_counter() - start, profiler)
+        try:
+            result.set_result(collect_results(futures))
+        except BaseException as err:
+            result.set_exception(err)
+
+    for future in pending:
+        future.add_done_callback(on_done)
+    return result
+
+
+def get_job_timeout() -> float:
+    """
+    Get the time limit of a validation job from the `timeout` query parameter, or DG_JOB_TIMEOUT by default.
+    0 means no limit.
+    """
+    timeout: float = DG_CONFIG["DG_JOB_TIMEOUT"]
+    if "timeout" not in request.args:
+        return timeout
+    max_timeout = DG_CONFIG["DG_JOB_TIMEOUT_MAX"]
+    try:
+        timeout = float(request.args["timeout"])
+    except ValueError:
+        timeout = -1.0
+    if not 0 < timeout <= max_timeout:
+        abort(
+            400,
+            f"The timeout must be a number of seconds greater than 0 and at most {max_timeout}.",
+        )
+    return timeout
+
+
+def get_client_id() -> str:
+    """
+    Get the client a request is from, by the DG_CLIENT_ID_HEADER header or else by the remote address.
+    """
+    client_id = request.headers.get(DG_CONFIG["DG_CLIENT_ID_HEADER"], "")
+    if client_id == "":
+        client_id = request.remote_addr or "unknown"
+    return client_id
+
+
+def get_job_priority(crate: ROCrate, entities: List["Entity"]) -> str:
+    """
+    Get the priority class of the validation of the given entities, or all entities in the crate if none are given.
+    """
+    targets = entities if len(entities) > 0 else crate.all_entities
+    # the entities overriding validate_async() wait on an external service, e.g., a sapporo re-execution
+    if any(
+        type(entity).validate_async is not Entity.validate_async for entity in targets
+    ):
+        return WORKFLOW
+    if len(targets) <= DG_CONFIG["DG_FAST_JOB_MAX_ENTITIES"]:
+        return FAST
+    return BULK
+
+
+def reject(status_code: int, message: str, reason: str) -> NoReturn:
+    """
+    Reject a validation request by admission control, telling the client when to retry.
+    """
+    REJECTED_REQUESTS.inc(reason=reason)
+    response: Response = jsonify(message=message)
+    response.status_code = status_code
+    if status_code != 413:
+        response.headers["Retry-After"] = str(DG_CONFIG["DG_RETRY_AFTER"])
+    abort(response)
+
+
+def reject_large_crate() -> NoReturn:
+    reject(
+        413,
+        f"The RO-Crate exceeds the maximum size of {DG_CONFIG['DG_MAX_CRATE_SIZE']} bytes.",
+        "crate_size",
+    )
+
+
+def check_admission(client_id: str) -> None:
+    """
+    Reject a validation request before reading it if the crate is too large, the queue is full
+    or the client has too many queued and running jobs. A limit of 0 means no limit.
+    The limits are checked again by enqueue_job() when the job is queued.
+    """
+    max_size = DG_CONFIG["DG_MAX_CRATE_SIZE"]
+    if max_size > 0 and (request.content_length or 0) > max_size:
+        reject_large_crate()
+    with client_lock:
+        check_job_limits(client_id)
+
+
+def check_job_limits(client_id: str) -> None:
+    # the caller holds client_lock
+    max_queued = DG_CONFIG["DG_MAX_QUEUED_JOBS"]
+    if max_queued > 0 and scheduler.qsize() >= max_queued:
+        reject(
+            503,
+            "Too many validation requests are queued. Please retry later.",
+            "queue_full",
+        )
+    max_jobs = DG_CONFIG["DG_MAX_JOBS_PER_CLIENT"]
+    if max_jobs > 0 and client_jobs.get(client_id, 0) >= max_jobs:
+        reject(
+            429,
+            f"Too many validation requests of the client are queued or running (at most {max_jobs}). Please retry later.",
+            "client_limit",
+        )
+
+
+def enqueue_job(request_id: str, client_id: str, priority: str, job: Any) -> None:
+    """
+    Queue a job of the client, or reject it if the queue or the client has reached its limit in the meantime.
+    The limits are checked and the job is counted and queued at once, so that concurrent requests cannot exceed them.
+    """
+    with client_lock:
+        check_job_limits(client_id)
+        client_map[request_id] = client_id
+        client_jobs[client_id] = client_jobs.get(client_id, 0) + 1
+        scheduler.put(request_id, job, priority, client_id)
+
+
+def remove_client_job(client_id: str, job: "Future[Any]") -> None:
+    with client_lock:
+        client_jobs[client_id] -= 1
+        if client_jobs[client_id] == 0:
+            del client_jobs[client_id]
+
+
 @app_bp.route("/validate", methods=["POST"])
 def request_validation() -> Response:
+    evict_finished_jobs()
     request_id = str(uuid4())
+    client_id = get_client_id()
+    check_admission(client_id)
     try:
         request_body = request.json
+    except RequestEntityTooLarge:
+        reject_large_crate()
     except Exception:
         abort(400, "RO-Crate json file is not found in the request.")
     entity_ids: List[str] = request.args.getlist("entityIds", None)
+    timeout = get_job_timeout()
+    profiler = None
+    if "profile" in request.args or DG_CONFIG["DG_PROFILE_ALL_REQUESTS"]:
+        profiler = Profiler()
 
+    target_entities: List[Entity] = []
+    check_props_start = perf_counter()
     try:
-        crate = ROCrate(deepcopy(request_body))
-        crate.as_jsonld()
+        if entity_ids:
+            # only the entities the validation depends on are instantiated and checked
+            # the loaded dicts are not modified, so the request body is not copied
+            crate: ROCrate = LazyROCrate(request_body)
+            for entity_id in entity_ids:
+                entities = crate.get_by_id(entity_id)
+                if len(entities) == 0:
+                    abort(400, f"Entity ID `{entity_id}` is not found in the crate.")
+                target_entities.extend(entities)
+            closure = crate.get_validation_closure(target_entities)
+            with activate(profiler):
+                crate.check_duplicate_entity(closure)
+                crate.check_props(closure)
+        else:
+            crate = ROCrate(deepcopy(request_body))
+            with activate(profiler):
+                crate.as_jsonld()
     except CrateError as crateerr:
         abort(400, crateerr)
+    finally:
+        record_phase(CHECK_PROPS, perf_counter() - check_props_start, profiler)
+
+    # add job to queue along with the request_id, the time it is queued, its priority class, cancel token and timeout
+    priority = get_job_priority(crate, target_entities)
+    token = CancelToken()
+    enqueue_job(
+        request_id,
+        client_id,
+        priority,
+        (
+            request_id,
+            perf_counter(),
+            priority,
+            token,
+            timeout,
+            validate,
+            crate,
+            target_entities,
+            profiler,
+            pool_map[priority],
+        ),
+    )
 
-    target_entities: List[Entity] = []
-    if entity_ids:
-        for entity_id in entity_ids:
-            target_entities.extend(crate.get_by_id(entity_id))
-            if len(crate.get_by_id(entity_id)) == 0:
-                abort(400, f"Entity ID `{entity_id}` is not found in the crate.")
-
-    # add job to queue along with the request_id
-    job_queue.put((request_id, validate, crate, target_entities))
-
-    request_map[request_id] = {"roCrate": request_body, "entityIds": entity_ids}
+    # the RO-Crate is not kept once the job is queued, as it may be large
+    request_map[request_id] = {"entityIds": entity_ids}
+    token_map[request_id] = token
+    if profiler is not None:
+        profile_map[request_id] = profiler
 
     response: Response = jsonify({"request_id": request_id})
     response.status_code = POST_STATUS_CODE
@@ -132,38 +443,55 @@ def request_validation() -> Response:
 
 @app_bp.route("/<string:request_id>", methods=["GET"])
 def get_results(request_id: str) -> Response:
-    if request_id not in request_map:
-        abort(400, f"Request ID `{request_id}` is not found.")
-
-    req = request_map[request_id]
-
-    # get job future if it exists
+    # get job future if it exists, before the request may be forgotten
     job = job_map.get(request_id, None)
+    req = request_map.get(request_id, None)
+    token = token_map.get(request_id, None)
+    if req is None or token is None:
+        abort(400, f"Request ID `{request_id}` is not found.")
 
     # check status
     status = "QUEUED"
     results = []
 
-    if job is not None:
-        if job.running():
-            status = "RUNNING"
-        elif job.cancelled():
+    if job is not None and job.cancelled():
+        status = "CANCELED"
+    elif job is not None and job.done():
+        # COMPLETE or FAILED
+        try:
+            results = job.result()  # Get the result or exception
+            status = "COMPLETE"
+        except CrateValidationError as err:
+            status = "FAILED"
+            results = result_wrapper(err.errors)
+        except CancelledError:
+            # stopped by the cancel token while running
             status = "CANCELED"
-        elif job.done():
-            # COMPLETE or FAILED
-            try:
-                results = job.result()  # Get the result or exception
-                status = "COMPLETE"
-            except CrateValidationError as err:
-                status = "FAILED"
-                results = result_wrapper(err.errors)
-            except Exception as exc:
-                status = "EXECUTOR_ERROR"
-                results = [{"err_msg": str(exc)}]
-
-    response: Response = jsonify(
-        {"requestId": request_id, "request": req, "status": status, "results": results}
-    )
+        except Exception as exc:
+            status = "EXECUTOR_ERROR"
+            results = [{"err_msg": str(exc)}]
+    elif token.cancelled and not token.timed_out:
+        # the job stops at the next check of the token
+        status = "CANCELING"
+    elif job is not None and job.running():
+        status = "RUNNING"
+
+    body: Dict[str, Any] = {
+        "requestId": request_id,
+        "request": req,
+        "status": status,
+        "results": results,
+    }
+    if "profile" in request.args:
+        # null if the request was not profiled
+        profiler = profile_map.get(request_id, None)
+        body["profile"] = (
+            profiler.report(DG_CONFIG["DG_PROFILE_TOP"])
+            if profiler is not None
+            else None
+        )
+
+    response: Response = jsonify(body)
     response.status_code = GET_STATUS_CODE
 
     return response
@@ -171,12 +499,18 @@ def get_results(request_id: str) -> Response:
 
 @app_bp.route("/<string:request_id>/cancel", methods=["POST"])
 def cancel_validation(request_id: str) -> Response:
-    if request_id not in job_map:
+    job = job_map.get(request_id, None)
+    token = token_map.get(request_id, None)
+    if token is None:
         abort(400, f"Request ID `{request_id}` is not found.")
-    job = job_map[request_id]
-    try_cancel = job.cancel()
-    if not try_cancel:
+    if job is not None and job.done():
         abort(400, "Failed to cancel")
+    # a queued job is cancelled at once, and a running job at the next check of the token
+    token.cancel()
+    if job is None and scheduler.remove(request_id):
+        job = create_job(request_id)
+    if job is not None:
+        job.cancel()
 
     response: Response = jsonify({"request_id": request_id})
     response.status_code = POST_STATUS_CODE
@@ -185,33 +519,165 @@ def cancel_validation(request_id: str) -> Response:
 
 @app_bp.route("/healthcheck", methods=["GET"])
 def check_health() -> Response:
-    response: Response = jsonify({"message": "OK"})
+    # unhealthy while the queue is too long, so that a load balancer stops sending requests before they are rejected
+    queued_jobs = scheduler.qsize()
+    max_queued = DG_CONFIG["DG_HEALTH_MAX_QUEUED_JOBS"]
+    if max_queued > 0 and queued_jobs >= max_queued:
+        response: Response = jsonify(
+            {"message": "Too many queued jobs", "queuedJobs": queued_jobs}
+        )
+        response.status_code = 503
+        response.headers["Retry-After"] = str(DG_CONFIG["DG_RETRY_AFTER"])
+        return response
+    response = jsonify({"message": "OK"})
     response.status_code = GET_STATUS_CODE
     return response
 
 
+@app_bp.route("/metrics", methods=["GET"])
+def get_metrics() -> Response:
+    return Response(
+        REGISTRY.render(), status=GET_STATUS_CODE, content_type=METRICS_CONTENT_TYPE
+    )
+
+
 # --- job ---
 
-def process_jobs() -> None:
+def get_job_status(job: "Future[Any]") -> str:
+    if job.cancelled():
+        return "CANCELED"
+    err = job.exception()
+    if err is None:
+        return "COMPLETE"
+    if isinstance(err, CrateValidationError):
+        return "FAILED"
+    if isinstance(err, CancelledError):
+        return "CANCELED"
+    return "EXECUTOR_ERROR"
+
+
+def record_job(job: "Future[Any]") -> None:
+    JOBS.inc(status=get_job_status(job))
+
+
+def create_job(request_id: str) -> "Future[Any]":
+    """
+    Create the future of the job of a request, once it leaves the queue.
+    """
+    job: "Future[Any]" = Future()
+    job.add_done_callback(record_job)
+    job.add_done_callback(partial(remove_client_job, client_map.pop(request_id)))
+    job.add_done_callback(partial(finish_job, request_id))
+    job_map[request_id] = job  # store the future
+    return job
+
+
+def finish_job(request_id: str, job: "Future[Any]") -> None:
+    with finished_jobs_lock:
+        finished_jobs.append((monotonic(), request_id))
+
+
+def evict_finished_jobs() -> None:
+    """
+    Forget the requests whose jobs finished more than DG_JOB_RECORD_TTL seconds ago, so that the memory does not grow
+    with the number of requests served. A TTL of 0 means the requests are never forgotten.
+    """
+    ttl = DG_CONFIG["DG_JOB_RECORD_TTL"]
+    if ttl <= 0:
+        return
+    now = monotonic()
+    with finished_jobs_lock:
+        while len(finished_jobs) > 0 and now - finished_jobs[0][0] >= ttl:
+            _, request_id = finished_jobs.popleft()
+            for records in (job_map, request_map, profile_map, token_map):
+                records.pop(request_id, None)
+
+
+def run_job(
+    job: "Future[Any]",
+    token: CancelToken,
+    timeout: float,
+    job_func: Callable[..., Any],
+    *job_args: Any,
+) -> None:
+    if token.cancelled:
+        job.cancel()
+    if not job.set_running_or_notify_cancel():
+        return  # canceled while queued
+    if timeout > 0:
+        # the job stops with TimeoutError at the next check of the token after the deadline
+        token.set_deadline(timeout)
+        job.add_done_callback(lambda _: token.close())
+    start = perf_counter()
+    job.add_done_callback(lambda _: JOB_DURATION.observe(perf_counter() - start))
+    try:
+        with cancellable(token):
+            result = job_func(*job_args)
+    except BaseException as err:
+        job.set_exception(err)
+        return
+    if isinstance(result, Future):
+        # the job goes on without occupying this worker, e.g., waiting for a sapporo run
+        chain_future(result, job)
+    else:
+        job.set_result(result)
+
+
+def run_follow_up(
+    future: "Future[Any]", fn: Callable[..., Any], args: Any, kwargs: Any
+) -> None:
+    if not future.set_running_or_notify_cancel():
+        return
+    try:
+        result = fn(*args, **kwargs)
+    except BaseException as err:
+        future.set_exception(err)
+    else:
+        future.set_result(result)
+
+
+def process_jobs(pool: WorkerPool) -> None:
     while True:
-        sleep(0.1)  # wait for 0.1 second
+        pool.free_workers.acquire()  # wait for a free worker
+        if len(pool.follow_ups) > 0:
+            start_worker(pool, run_follow_up, *pool.follow_ups.popleft())
+            continue
         try:
-            job = job_queue.get(timeout=1)  # wait for a job for 1 second
-            request_id, job_func, *job_args = job
-            future = executor.submit(job_func, *job_args)  # submit the job to the executor
-            job_map[request_id] = future  # store the future
+            # wait for a job for 1 second
+            job = scheduler.get(pool.priorities, timeout=1)
         except Empty:
-            pass  # no job was available
+            pool.free_workers.release()
+            continue  # no job was available
+        request_id, queued_at, priority, token, timeout, job_func, *job_args = job
+        JOB_QUEUE_WAIT.observe(perf_counter() - queued_at, priority=priority)
+        future = create_job(request_id)
+        start_worker(pool, run_job, future, token, timeout, job_func, *job_args)
+
+
+def start_worker(pool: WorkerPool, fn: Callable[..., Any], *args: Any) -> None:
+    EXECUTOR_BUSY_WORKERS.inc(pool=pool.name)
+    # submit the work to the executor, and free the worker when it returns
+    worker = pool.executor.submit(fn, *args)
+    worker.add_done_callback(partial(release_worker, pool))
+
+
+def release_worker(pool: WorkerPool, worker: "Future[None]") -> None:
+    EXECUTOR_BUSY_WORKERS.dec(pool=pool.name)
+    pool.free_workers.release()
 
 
 # Start processing jobs
-threading.Thread(target=process_jobs, daemon=True).start()
+for pool in pools:
+    threading.Thread(target=process_jobs, args=(pool,), daemon=True).start()
 
 # --- app ---
 
 
 def create_app() -> Flask:
     app = Flask(__name__)
+    if DG_CONFIG["DG_MAX_CRATE_SIZE"] > 0:
+        # also limits request bodies without Content-Length
+        app.config["MAX_CONTENT_LENGTH"] = DG_CONFIG["DG_MAX_CRATE_SIZE"]
     app.register_blueprint(app_bp)
     logging.basicConfig(level=logging.INFO)
     return app
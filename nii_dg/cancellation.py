@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Cooperative cancellation and deadlines of validations.
+
+A CancelToken is activated in the context of a validation by cancellable(). The validation checks it by check_cancelled()
+between entities and around network calls, and stops with CancelledError once the token is cancelled,
+e.g., by POST /<request_id>/cancel from another thread. Waits that can be stopped early, e.g., the polling of a sapporo run,
+register a callback with add_callback().
+
+A token can also have a deadline. Once it is exceeded, the token is cancelled and the validation stops with TimeoutError.
+Outbound I/O takes its timeout from get_timeout(), so that no request outlives the deadline.
+
+    token = CancelToken()
+    token.set_deadline(60)
+    with cancellable(token):
+        crate.validate()  # raises CancelledError after token.cancel(), or TimeoutError after 60 seconds
+    token.close()
+"""
+
+import contextvars
+import threading
+import time
+from concurrent.futures import CancelledError
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, Optional
+
+_current: "contextvars.ContextVar[Optional[CancelToken]]" = contextvars.ContextVar(
+    "nii_dg_cancel_token", default=None
+)
+
+
+class CancelToken:
+    """
+    A flag to stop a validation, set once by cancel() or when its deadline is exceeded.
+
+    Attributes:
+        timeout (Optional[float]): The time limit in seconds given to set_deadline().
+        timed_out (bool): Whether the token was cancelled by its deadline.
+    """
+
+    def __init__(self) -> None:
+        self._event = threading.Event()
+        self._callbacks: List[Callable[[], Any]] = []
+        self._lock = threading.Lock()
+        self._deadline: Optional[float] = None
+        self._timer: Optional[threading.Timer] = None
+        self.timeout: Optional[float] = None
+        self.timed_out = False
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        """
+        Cancel the validation and call the registered callbacks.
+        """
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        if self._timer is not None:
+            self._timer.cancel()
+        for callback in callbacks:
+            callback()
+
+    def set_deadline(self, timeout: float) -> None:
+        """
+        Cancel the token with TimeoutError after `timeout` seconds from now, unless it is closed before.
+        """
+        self.timeout = timeout
+        self._deadline = time.monotonic() + timeout
+        self._timer = threading.Timer(timeout, self._expire)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _expire(self) -> None:
+        if not self._event.is_set():
+            self.timed_out = True
+            self.cancel()
+
+    def remaining(self) -> Optional[float]:
+        """
+        Get the seconds left until the deadline, or None if there is no deadline.
+        """
+        if self._deadline is None:
+            return None
+        return max(self._deadline - time.monotonic(), 0.0)
+
+    def close(self) -> None:
+        """
+        Stop the timer of the deadline, e.g., once the validation has finished.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+
+    def add_callback(self, callback: Callable[[], Any]) -> None:
+        """
+        Call the callback when the token is cancelled, or now if it already is.
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def exception(self) -> Optional[BaseException]:
+        """
+        Get the exception that stops the validation, or None if the token is not cancelled.
+        """
+        if not self._event.is_set():
+            return None
+        if self.timed_out:
+            return TimeoutError(
+                f"The validation did not finish within {self.timeout} seconds."
+            )
+        return CancelledError()
+
+    def raise_if_cancelled(self) -> None:
+        """
+        Raises:
+            CancelledError: If the token is cancelled.
+            TimeoutError: If the deadline is exceeded.
+        """
+        if self.remaining() == 0:
+            self._expire()
+        err = self.exception()
+        if err is not None:
+            raise err
+
+
+def get_cancel_token() -> Optional[CancelToken]:
+    """
+    Get the cancel token active in the current context, if any.
+    """
+    return _current.get()
+
+
+@contextmanager
+def cancellable(token: Optional[CancelToken]) -> Iterator[Optional[CancelToken]]:
+    """
+    Activate a cancel token in the current context. If None, the current context is left as it is.
+
+    Args:
+        token (Optional[CancelToken]): The token to activate.
+
+    Yields:
+        Optional[CancelToken]: The active token.
+    """
+    if token is None:
+        yield get_cancel_token()
+        return
+    reset = _current.set(token)
+    try:
+        yield token
+    finally:
+        _current.reset(reset)
+
+
+def check_cancelled() -> None:
+    """
+    Stop the validation if the cancel token of the current context is cancelled.
+
+    Raises:
+        CancelledError: If the token is cancelled.
+        TimeoutError: If the deadline of the token is exceeded.
+    """
+    token = _current.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+def get_timeout(default: float) -> float:
+    """
+    Get the timeout of an outbound request, shortened to the time left until the deadline of the current context.
+
+    Args:
+        default (float): The timeout if there is no deadline or it is further away, e.g., DG_CONFIG["DG_HTTP_TIMEOUT"].
+
+    Returns:
+        float: The timeout in seconds.
+
+    Raises:
+        CancelledError: If the token of the current context is cancelled.
+        TimeoutError: If the deadline is already exceeded.
+    """
+    token = _current.get()
+    if token is None:
+        return default
+    token.raise_if_cancelled()
+    remaining = token.remaining()
+    if remaining is None:
+        return default
+    return min(default, remaining)
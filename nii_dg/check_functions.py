@@ -3,12 +3,17 @@
 
 import mimetypes
 import re
+import time
 from pathlib import Path
 from typing import TYPE_CHECKING, Any, Callable, Dict
 from urllib.parse import urlparse
 from urllib.request import Request, urlopen
 
+from nii_dg.cancellation import check_cancelled, get_timeout
 from nii_dg.error import EntityError
+from nii_dg.metrics import URL_CHECK_DURATION
+from nii_dg.profiling import CHECK, HTTP, timed
+from nii_dg.utils import DG_CONFIG
 
 if TYPE_CHECKING:
     from nii_dg.entity import Entity
@@ -34,7 +39,9 @@ def check_entity_values(
     for key, check_func in check_rules.items():
         if key not in entity:
             continue
-        if not check_func(entity[key]):
+        with timed(CHECK, f"{key}({check_func.__name__})", entity):
+            valid = check_func(entity[key])
+        if not valid:
             error.add(key, f"The value '{entity[key]}' is invalid format.")
 
     return error
@@ -239,10 +246,24 @@ def is_url_accessible(url: str) -> bool:
 
     Returns:
         bool: True if the URL is accessible, False otherwise.
+
+    Raises:
+        CancelledError: If the validation is cancelled before or while the URL is accessed.
+        TimeoutError: If the deadline of the validation is exceeded.
     """
+    timeout = get_timeout(DG_CONFIG["DG_HTTP_TIMEOUT"])
+    start = time.perf_counter()
     try:
         req = Request(url, method="HEAD")
-        res = urlopen(req)
-        return res.status < 400  # type: ignore
+        with timed(HTTP, url):
+            res = urlopen(req, timeout=timeout)
+        accessible: bool = res.status < 400  # type: ignore
     except Exception:
-        return False
+        accessible = False
+    URL_CHECK_DURATION.observe(
+        time.perf_counter() - start,
+        result="accessible" if accessible else "inaccessible",
+    )
+    # the result does not matter if the validation was cancelled or timed out while waiting
+    check_cancelled()
+    return accessible
@@ -5,13 +5,17 @@
 Defines the Entity class and its subclasses used in the nii_dg package.
 """
 
+import inspect
 from collections.abc import MutableMapping
-from typing import TYPE_CHECKING, Any, Dict, Type
+from concurrent.futures import Executor, Future
+from typing import (TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple,
+                    Type)
 
 import yaml
 
 from nii_dg.const import RO_CRATE_SPEC
 from nii_dg.error import EntityError
+from nii_dg.profiling import CHECK, timed
 from nii_dg.utils import (NOW, EntityDef, generate_ctx,
                           is_instance_of_expected_type)
 
@@ -23,6 +27,52 @@ else:
     TypedMutableMapping = MutableMapping
 
 
+class PropList(List[Any]):
+    """
+    A list value of a prop of an Entity, which notifies the observers of the entity when it is modified in place,
+    e.g., by entity["hasPart"].append(file), as setting the prop does.
+
+    A copy of the list is a plain list, which is not bound to the entity.
+    """
+
+    def __init__(self, entity: "Entity", key: str, items: Any = ()) -> None:
+        super().__init__(items)
+        self._entity = entity
+        self._key = key
+
+    def __reduce_ex__(self, protocol: Any) -> Tuple[Any, ...]:
+        return (list, (list(self),))
+
+
+def _notifying(name: str) -> Callable[..., Any]:
+    method = getattr(list, name)
+
+    def wrapper(self: PropList, *args: Any, **kwargs: Any) -> Any:
+        result = method(self, *args, **kwargs)
+        self._entity._notify(self._key)
+        return result
+
+    wrapper.__name__ = name
+    return wrapper
+
+
+for _name in (
+    "append",
+    "extend",
+    "insert",
+    "remove",
+    "pop",
+    "clear",
+    "sort",
+    "reverse",
+    "__setitem__",
+    "__delitem__",
+    "__iadd__",
+    "__imul__",
+):
+    setattr(PropList, _name, _notifying(_name))
+
+
 class Entity(TypedMutableMapping):
     """
     Represents an Entity that can be included in an RO-Crate.
@@ -43,6 +93,7 @@ class Entity(TypedMutableMapping):
             schema_name (str): The name of the schema that defines the Entity, e.g. "base".
             entity_def (EntityDef): The definition of the Entity.
         """
+        self._observers: List[Callable[["Entity", str], None]] = []
         self.data = {
             "@id": id_,
             "@type": self.entity_name,
@@ -68,25 +119,37 @@ class Entity(TypedMutableMapping):
         """
         if key.startswith("@"):
             raise KeyError("The key must not start with '@'.")
+        if type(value) is list:
+            value = PropList(self, key, value)
         self.data[key] = value
+        self._notify(key)
 
     def _set_special_item(self, key: str, value: Any) -> None:
         """
         Set a special item, which key starts with '@' (e.g. "@id", "@type", "@context").
 
+        Changing "@id" changes the hash of the entity (see __hash__()), so the entity must not be in a set or a dict key at that time.
+
         Args:
             key (str): The key of the special item.
             value (Any): The value of the special item.
         """
         self.data[key] = value
+        self._notify(key)
 
     def __getitem__(self, key: str) -> Any:
-        return self.data[key]
+        value: Any = self.data[key]
+        if type(value) is list and not key.startswith("@"):
+            # e.g., a list loaded as is by ROCrate.add_records(), so that modifying it in place is observed
+            value = PropList(self, key, value)
+            self.data[key] = value
+        return value
 
     def __delitem__(self, key: str) -> None:
         if key.startswith("@"):
             raise KeyError("The key must not start with '@'.")
         del self.data[key]
+        self._notify(key)
 
     def __iter__(self) -> Any:
         return iter(self.data)
@@ -94,6 +157,63 @@ class Entity(TypedMutableMapping):
     def __len__(self) -> int:
         return len(self.data)
 
+    def __getstate__(self) -> Dict[str, Any]:
+        # a copy of the Entity is not observed by the observers of the original, e.g., the crate
+        state = self.__dict__.copy()
+        state["_observers"] = []
+        return state
+
+    def add_observer(self, observer: Callable[["Entity", str], None]) -> None:
+        """
+        Register a function called with (entity, key) after a prop is set or deleted, e.g., to keep an index up to date.
+
+        Args:
+            observer (Callable[[Entity, str], None]): The function to be called.
+        """
+        self._observers.append(observer)
+
+    def remove_observer(self, observer: Callable[["Entity", str], None]) -> None:
+        """
+        Unregister a function registered with add_observer().
+
+        Args:
+            observer (Callable[[Entity, str], None]): The function to be unregistered.
+        """
+        if observer in self._observers:
+            self._observers.remove(observer)
+
+    def _notify(self, key: str) -> None:
+        for observer in list(self._observers):
+            observer(self, key)
+
+    def __eq__(self, other: object) -> bool:
+        """
+        Entities are equal if they have the same @id and @context, i.e., they are the same node of the RO-Crate.
+
+        An Entity is also equal to a reference to it, i.e., a {"@id": ...} dict, with an optional "@context".
+        The props are not compared, so comparing or looking up entities is O(1) regardless of their size.
+        """
+        if self is other:
+            return True
+        if isinstance(other, Entity):
+            return self.id == other.id and self.context == other.context
+        if isinstance(other, dict):
+            return (
+                other.get("@id") == self.id
+                and other.get("@context", self.context) == self.context
+            )
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        """
+        Hash the @id, consistently with __eq__().
+
+        The @id is mutable, e.g., by _set_special_item(), and an entity renamed while it is in a set or is a dict key
+        is no longer found there. Remove the entity before changing its @id and add it again afterwards.
+        """
+        # @context is not hashed, since a loaded @context may be a list or a dict
+        return hash(self.id)
+
     def __repr__(self) -> str:
         if isinstance(self, DefaultEntity):
             return f"<{self.type} {self.id}>"
@@ -120,6 +240,56 @@ class Entity(TypedMutableMapping):
         """Return the name of the Entity."""
         return self.__class__.__name__
 
+    @classmethod
+    def get_entity_def(cls) -> EntityDef:
+        """
+        Return the default EntityDef of the class, i.e., the default value of `entity_def` in its constructor.
+
+        Raises:
+            NotImplementedError: If the class does not have a default EntityDef.
+
+        Returns:
+            EntityDef: The definition of the Entity.
+        """
+        param = inspect.signature(cls.__init__).parameters.get("entity_def")
+        if param is None or param.default is inspect.Parameter.empty:
+            raise NotImplementedError(
+                f"{cls.__name__} does not have a default entity definition."
+            )
+        return param.default  # type: ignore
+
+    @classmethod
+    def get_schema_name(cls) -> str:
+        """
+        Return the default schema name of the class, i.e., the default value of `schema_name` in its constructor.
+
+        Raises:
+            NotImplementedError: If the class does not have a default schema name.
+
+        Returns:
+            str: The name of the schema, e.g. "base".
+        """
+        param = inspect.signature(cls.__init__).parameters.get("schema_name")
+        if param is None or param.default is inspect.Parameter.empty:
+            raise NotImplementedError(
+                f"{cls.__name__} does not have a default schema name."
+            )
+        return param.default  # type: ignore
+
+    @classmethod
+    def get_queried_types(cls) -> List[Type["Entity"]]:
+        """
+        Return the entity classes whose entities validate() looks up in the crate, e.g., with crate.get_by_type().
+
+        The entities referenced in the props are not included, as they are found from the props.
+        Subclasses whose validate() looks up other entities override this method,
+        so that only the entities a validation depends on need to be checked, see ROCrate.get_validation_closure().
+
+        Returns:
+            List[Type[Entity]]: The entity classes.
+        """
+        return []
+
     @classmethod
     def from_jsonld(cls: Type["Entity"], jsonld: Dict[str, Any]) -> "Entity":
         """
@@ -257,9 +427,12 @@ class Entity(TypedMutableMapping):
                 "This method must be implemented in subclasses of Entity in schema modules."
             )
 
-        self._check_unexpected_props()
-        self._check_required_props()
-        self._check_prop_types()
+        with timed(CHECK, "_check_unexpected_props", self):
+            self._check_unexpected_props()
+        with timed(CHECK, "_check_required_props", self):
+            self._check_required_props()
+        with timed(CHECK, "_check_prop_types", self):
+            self._check_prop_types()
 
     def validate(self, crate: "ROCrate") -> None:
         """
@@ -278,6 +451,49 @@ class Entity(TypedMutableMapping):
                 "This method must be implemented in subclasses of Entity in schema modules."
             )
 
+    def validate_async(self, crate: "ROCrate", executor: Executor) -> "Future[None]":
+        """
+        Start the validation of the Entity and return a Future of its outcome.
+
+        By default, validate() is called in the calling thread and a finished Future is returned.
+        Subclasses whose validation waits on an external service (e.g., a workflow re-execution) override this method,
+        so that the calling worker thread is released while waiting and the remaining work is submitted to the executor.
+
+        Args:
+            crate (ROCrate): The RO-Crate containing the Entity.
+            executor (Executor): The executor to run follow-up work in.
+
+        Returns:
+            Future[None]: A Future that raises EntityError if there is an error in the Entity.
+        """
+        future: "Future[None]" = Future()
+        try:
+            self.validate(crate)
+            future.set_result(None)
+        except BaseException as err:
+            future.set_exception(err)
+
+        return future
+
+
+def get_ref_id(value: Any) -> Optional[str]:
+    """
+    Return the @id of a reference held in a prop.
+
+    A reference is either an Entity (set in Python) or a {"@id": ...} dict (loaded from JSON-LD).
+
+    Args:
+        value (Any): The value of the prop.
+
+    Returns:
+        Optional[str]: The referenced @id, or None if the value is not a reference.
+    """
+    if isinstance(value, Entity):
+        return value.id
+    if isinstance(value, dict) and isinstance(value.get("@id"), str):
+        return value["@id"]  # type: ignore
+    return None
+
 
 class DefaultEntity(Entity):
     """
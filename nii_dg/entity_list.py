@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Implementation of the entity lists of an RO-Crate, which remove entities by identity in O(1).
+"""
+
+from typing import Any, Iterable, Iterator, List, Set, Tuple, TypeVar
+
+from nii_dg.entity import Entity
+
+E = TypeVar("E", bound=Entity)
+
+
+class EntityList(List[E]):
+    """
+    A list of entities, e.g., the DataEntities of an RO-Crate, with an O(1) removal by identity.
+
+    discard() only marks the entity as removed, and the list drops the marked entities at its next access,
+    in a single pass in the original order. So removing k entities one by one takes O(k + n) instead of O(k * n).
+    Otherwise it behaves as a list, e.g., the RootDataEntity holds the DataEntities of the crate as its hasPart.
+    """
+
+    def __init__(self, entities: Iterable[E] = ()) -> None:
+        super().__init__(entities)
+        # id(entity) of the removed entities, which are still in the underlying list
+        self._removed: Set[int] = set()
+
+    def discard(self, entity: E) -> None:
+        """
+        Remove all occurrences of an entity, compared by identity. Unlike remove(), this does not scan the list.
+
+        Args:
+            entity (E): The entity to be removed. It must be in the list.
+        """
+        self._removed.add(id(entity))
+
+    def contains(self, entity: E) -> bool:
+        """
+        Check if the entity itself is in the list, unlike the `in` operator that compares the entities by equality.
+
+        Args:
+            entity (E): The entity to be checked.
+
+        Returns:
+            bool: True if the entity is in the list.
+        """
+        self._compact()
+        return any(ent is entity for ent in list.__iter__(self))
+
+    def _compact(self) -> None:
+        if len(self._removed) == 0:
+            return
+        removed = self._removed
+        self._removed = set()
+        list.__setitem__(
+            self, slice(None), [e for e in list.__iter__(self) if id(e) not in removed]
+        )
+
+    def append(self, entity: E) -> None:
+        # an entity appended again after it was removed is not dropped with the removed one
+        if id(entity) in self._removed:
+            self._compact()
+        super().append(entity)
+
+    def extend(self, entities: Iterable[E]) -> None:
+        entities = list(entities)
+        if any(id(entity) in self._removed for entity in entities):
+            self._compact()
+        super().extend(entities)
+
+    def __iter__(self) -> Iterator[E]:
+        self._compact()
+        return super().__iter__()
+
+    def __reversed__(self) -> Iterator[E]:
+        self._compact()
+        return super().__reversed__()
+
+    def __len__(self) -> int:
+        self._compact()
+        return super().__len__()
+
+    def __contains__(self, value: object) -> bool:
+        self._compact()
+        return super().__contains__(value)
+
+    def __getitem__(self, index: Any) -> Any:
+        self._compact()
+        return super().__getitem__(index)
+
+    def __setitem__(self, index: Any, value: Any) -> None:
+        self._compact()
+        super().__setitem__(index, value)
+
+    def __delitem__(self, index: Any) -> None:
+        self._compact()
+        super().__delitem__(index)
+
+    def __eq__(self, other: object) -> bool:
+        self._compact()
+        if isinstance(other, EntityList):
+            other._compact()
+        return super().__eq__(other)
+
+    def __ne__(self, other: object) -> bool:
+        return not self == other
+
+    def __add__(self, other: Any) -> Any:
+        if not isinstance(other, list):
+            return NotImplemented
+        return self.copy() + list(other)
+
+    def __radd__(self, other: Any) -> Any:
+        # e.g., default_entities + data_entities, which would read the underlying list of data_entities directly
+        if not isinstance(other, list):
+            return NotImplemented
+        return list(other) + self.copy()
+
+    def __iadd__(self, other: Any) -> Any:
+        self.extend(other)
+        return self
+
+    def __mul__(self, n: Any) -> Any:
+        self._compact()
+        return super().__mul__(n)
+
+    def __rmul__(self, n: Any) -> Any:
+        self._compact()
+        return super().__rmul__(n)
+
+    def __imul__(self, n: Any) -> Any:
+        self._compact()
+        return super().__imul__(n)
+
+    def __repr__(self) -> str:
+        self._compact()
+        return super().__repr__()
+
+    def __reduce_ex__(self, protocol: Any) -> Tuple[Any, ...]:
+        # copied and pickled with the removed entities dropped
+        self._compact()
+        return (self.__class__, (list(list.__iter__(self)),))
+
+    def index(self, *args: Any) -> int:
+        self._compact()
+        return super().index(*args)
+
+    def count(self, value: Any) -> int:
+        self._compact()
+        return super().count(value)
+
+    def copy(self) -> List[E]:
+        self._compact()
+        return super().copy()
+
+    def insert(self, index: Any, entity: E) -> None:
+        self._compact()
+        super().insert(index, entity)
+
+    def pop(self, *args: Any) -> E:
+        self._compact()
+        return super().pop(*args)
+
+    def remove(self, value: E) -> None:
+        self._compact()
+        super().remove(value)
+
+    def clear(self) -> None:
+        self._removed.clear()
+        super().clear()
+
+    def sort(self, *args: Any, **kwargs: Any) -> None:
+        self._compact()
+        super().sort(*args, **kwargs)
+
+    def reverse(self) -> None:
+        self._compact()
+        super().reverse()
@@ -12,7 +12,7 @@ This module contains the following error classes:
 - CrateValidationError: Error class for 'validate()' method in the RO-Crate.
 """
 
-from typing import TYPE_CHECKING, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 
 if TYPE_CHECKING:
     from nii_dg.entity import Entity
@@ -97,12 +97,14 @@ class CrateValidationError(CrateError):
     Error class for 'validate()' method in the RO-Crate.
 
     This error is raised during the Data Governance validation time, during the validation performed by the 'validate()' method of the ROCrate class.
+    If the validation is profiled, e.g., by 'validate(profile=True)', the profile report is attached as `profile`.
     """
 
     def __init__(self, errors: Optional[List[EntityError]] = None):
         if errors is None:
             errors = []
         self.errors = errors
+        self.profile: Optional[Dict[str, Any]] = None
 
     def __str__(self) -> str:
         error_msg = "\n".join([f"- {e}" for e in self.errors])
@@ -0,0 +1,585 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Generation of synthetic RO-Crates of a given size and shape for each schema.
+
+The crates are valid, i.e., they pass check_props() and validate() as long as the URLs in them are accessible,
+unless a ratio of invalid files is given.
+The same schema, size, shape and seed always produce the same crate, and write_crate() streams it to a file,
+so crates larger than the memory can be generated for load testing.
+"""
+
+import argparse
+import json
+import random
+import sys
+from typing import IO, Any, Callable, Dict, Iterator, List, Optional
+
+from nii_dg.const import RO_CRATE_CONTEXT
+from nii_dg.entity import DataEntity, Entity, ROCrateMetadata, RootDataEntity
+from nii_dg.ro_crate import ROCrate
+from nii_dg.schema import amed, base, cao, ginfork, meti, sapporo
+
+FILES_PER_DATASET = 100
+FILES_PER_DMP = 1000
+
+EXAMPLE_URL = "https://example.com"
+SAPPORO_LOCATION = f"{EXAMPLE_URL}/sapporo/"
+# fixed instead of the current time, so that the output depends on the seed only
+DATE_PUBLISHED = "2023-01-01T00:00:00.000+00:00"
+
+
+class CrateShape:
+    """
+    The shape of a synthetic crate.
+
+    Args:
+        files_per_dataset (int): The number of files in a directory (base, ginfork).
+        files_per_dmp (int): The number of files per DMP, e.g., 1 for as many DMPs as files (amed, cao, meti).
+        depth (int): The depth of the Dataset tree that holds the files, e.g., 1 for flat directories (base, ginfork).
+        invalid_ratio (float): The ratio of File entities made invalid, by removing the name or breaking the contentSize.
+    """
+
+    def __init__(
+        self,
+        files_per_dataset: int = FILES_PER_DATASET,
+        files_per_dmp: int = FILES_PER_DMP,
+        depth: int = 1,
+        invalid_ratio: float = 0.0,
+    ) -> None:
+        if files_per_dataset < 1 or files_per_dmp < 1 or depth < 1:
+            raise ValueError(
+                "files_per_dataset, files_per_dmp and depth must be positive."
+            )
+        if not 0.0 <= invalid_ratio <= 1.0:
+            raise ValueError("invalid_ratio must be between 0 and 1.")
+        self.files_per_dataset = files_per_dataset
+        self.files_per_dmp = files_per_dmp
+        self.depth = depth
+        self.invalid_ratio = invalid_ratio
+
+
+def get_content_size(rng: random.Random) -> str:
+    """
+    Get a random file size between 1B and 100KB.
+    """
+    return f"{rng.randint(1, 100_000)}B"
+
+
+def get_dir_path(top: str, depth: int) -> List[str]:
+    """
+    Get the @id of the Datasets from a top directory down to its sub-directory at the given depth.
+
+    e.g., get_dir_path("data_0/", 3) returns ["data_0/", "data_0/level_1/", "data_0/level_1/level_2/"].
+    """
+    path = [top]
+    for level in range(1, depth):
+        path.append(f"{path[-1]}level_{level}/")
+    return path
+
+
+def get_dir_name(dir_id: str) -> str:
+    return dir_id.rstrip("/").split("/")[-1]
+
+
+def generate_base(
+    n_entities: int, rng: random.Random, shape: CrateShape
+) -> Iterator[Entity]:
+    """
+    Files in Dataset trees of `depth` levels with `files_per_dataset` files at the bottom, with a Person and an Organization.
+    """
+    org = base.Organization(
+        f"{EXAMPLE_URL}/organization", {"name": "Example Organization"}
+    )
+    person = base.Person(
+        f"{EXAMPLE_URL}/person",
+        {"name": "Example Person", "affiliation": org, "email": "person@example.com"},
+    )
+    yield from [org, person]
+
+    # the directories are followed by the files in them
+    per_dir = shape.depth + shape.files_per_dataset
+    for i in range(n_entities - 2):
+        dir_index, index = divmod(i, per_dir)
+        dir_path = get_dir_path(f"data_{dir_index}/", shape.depth)
+        if index < shape.depth:
+            yield base.Dataset(dir_path[index], {"name": get_dir_name(dir_path[index])})
+        else:
+            yield base.File(
+                f"{dir_path[-1]}file_{i}.txt",
+                {
+                    "name": f"file_{i}.txt",
+                    "contentSize": get_content_size(rng),
+                    "encodingFormat": "text/plain",
+                },
+            )
+
+
+def generate_amed(
+    n_entities: int, rng: random.Random, shape: CrateShape
+) -> Iterator[Entity]:
+    """
+    Files assigned to a DMP per `files_per_dmp` files, with a DMPMetadata.
+    """
+    org = base.HostingInstitution(
+        f"{EXAMPLE_URL}/organization",
+        {"name": "Example Organization", "address": "Tokyo Japan"},
+    )
+    person = base.Person(
+        f"{EXAMPLE_URL}/person",
+        {"name": "Example Person", "affiliation": org, "email": "person@example.com"},
+    )
+    repo = base.RepositoryObject(
+        f"{EXAMPLE_URL}/repository", {"name": "Example Repository"}
+    )
+    n_dmps = max(1, n_entities // (shape.files_per_dmp + 1))
+    dmps = [
+        amed.DMP(
+            f"#dmp:{i + 1}",
+            {
+                "dataNumber": i + 1,
+                "name": f"dataset {i + 1}",
+                "description": f"Synthetic dataset {i + 1}.",
+                "keyword": "synthetic",
+                "accessRights": "Restricted Open Sharing",
+                "gotInformedConsent": "unknown",
+                "contentSize": "1GB",
+            },
+        )
+        for i in range(n_dmps)
+    ]
+    dmp_metadata = amed.DMPMetadata(
+        props={
+            "about": {"@id": "./"},
+            "funder": org,
+            "funding": "Example Program",
+            "chiefResearcher": person,
+            "creator": [person],
+            "hostingInstitution": org,
+            "dataManager": person,
+            "repository": repo,
+            "hasPart": dmps,
+        }
+    )
+    yield from [org, person, repo, dmp_metadata, *dmps]
+
+    for i in range(n_entities - 4 - n_dmps):
+        yield amed.File(
+            f"file_{i}.txt",
+            {
+                "name": f"file_{i}.txt",
+                "contentSize": get_content_size(rng),
+                "dmpDataNumber": dmps[i % n_dmps],
+            },
+        )
+
+
+def generate_cao(
+    n_entities: int, rng: random.Random, shape: CrateShape
+) -> Iterator[Entity]:
+    """
+    Files assigned to a DMP per `files_per_dmp` files, with a DMPMetadata.
+    """
+    org = base.HostingInstitution(
+        f"{EXAMPLE_URL}/organization",
+        {"name": "Example Organization", "address": "Tokyo Japan"},
+    )
+    person = cao.Person(
+        f"{EXAMPLE_URL}/person",
+        {"name": "Example Person", "affiliation": org, "email": "person@example.com"},
+    )
+    repo = base.RepositoryObject(
+        f"{EXAMPLE_URL}/repository", {"name": "Example Repository"}
+    )
+    n_dmps = max(1, n_entities // (shape.files_per_dmp + 1))
+    dmps = [
+        cao.DMP(
+            f"#dmp:{i + 1}",
+            {
+                "dataNumber": i + 1,
+                "name": f"dataset {i + 1}",
+                "description": f"Synthetic dataset {i + 1}.",
+                "creator": [person],
+                "keyword": "synthetic",
+                "accessRights": "metadata only access",
+                "hostingInstitution": org,
+                "dataManager": person,
+                "contentSize": "1GB",
+            },
+        )
+        for i in range(n_dmps)
+    ]
+    dmp_metadata = cao.DMPMetadata(
+        props={
+            "about": {"@id": "./"},
+            "funder": org,
+            "keyword": "synthetic",
+            "repository": repo,
+            "hasPart": dmps,
+        }
+    )
+    yield from [org, person, repo, dmp_metadata, *dmps]
+
+    for i in range(n_entities - 4 - n_dmps):
+        yield cao.File(
+            f"file_{i}.txt",
+            {
+                "name": f"file_{i}.txt",
+                "contentSize": get_content_size(rng),
+                "dmpDataNumber": dmps[i % n_dmps],
+            },
+        )
+
+
+def generate_meti(
+    n_entities: int, rng: random.Random, shape: CrateShape
+) -> Iterator[Entity]:
+    """
+    Files assigned to a DMP per `files_per_dmp` files, with a DMPMetadata.
+    """
+    org = base.HostingInstitution(
+        f"{EXAMPLE_URL}/organization",
+        {"name": "Example Organization", "address": "Tokyo Japan"},
+    )
+    repo = base.RepositoryObject(
+        f"{EXAMPLE_URL}/repository", {"name": "Example Repository"}
+    )
+    n_dmps = max(1, n_entities // (shape.files_per_dmp + 1))
+    dmps = [
+        meti.DMP(
+            f"#dmp:{i + 1}",
+            {
+                "dataNumber": i + 1,
+                "name": f"dataset {i + 1}",
+                "description": f"Synthetic dataset {i + 1}.",
+                "hostingInstitution": org,
+                "wayOfManage": "commissioned",
+                "accessRights": "metadata only access",
+                "reasonForConcealment": "Synthetic data.",
+                "creator": [org],
+                "contentSize": "1GB",
+            },
+        )
+        for i in range(n_dmps)
+    ]
+    dmp_metadata = meti.DMPMetadata(
+        props={
+            "about": {"@id": "./"},
+            "funder": org,
+            "repository": repo,
+            "hasPart": dmps,
+        }
+    )
+    yield from [org, repo, dmp_metadata, *dmps]
+
+    for i in range(n_entities - 3 - n_dmps):
+        yield meti.File(
+            f"file_{i}.txt",
+            {
+                "name": f"file_{i}.txt",
+                "contentSize": get_content_size(rng),
+                "dmpDataNumber": dmps[i % n_dmps],
+            },
+        )
+
+
+def generate_ginfork(
+    n_entities: int, rng: random.Random, shape: CrateShape
+) -> Iterator[Entity]:
+    """
+    Experiment packages with the required directories, each of which is a Dataset tree of `depth` levels, with a GinMonitoring.
+    """
+    structure = "with_code"
+    sub_dirs = ginfork.REQUIRED_DIRECTORIES[structure]
+    # an experiment has its directory, a tree under each required directory and the files at the bottom
+    n_dirs = 1 + len(sub_dirs) * shape.depth
+    per_experiment = n_dirs + len(sub_dirs) * shape.files_per_dataset
+    n_experiments = max(1, (n_entities - 1) // per_experiment)
+    experiments = [f"experiment_{i}/" for i in range(n_experiments)]
+    yield ginfork.GinMonitoring(
+        props={
+            "about": {"@id": "./"},
+            "contentSize": "1TB",
+            "workflowIdentifier": "basic",
+            "datasetStructure": structure,
+            "experimentPackageList": experiments,
+        }
+    )
+
+    n_files = max(0, n_entities - 1 - n_experiments * n_dirs)
+    for i, experiment in enumerate(experiments):
+        yield base.Dataset(experiment, {"name": get_dir_name(experiment)})
+        dir_paths = [
+            get_dir_path(f"{experiment}{sub_dir}/", shape.depth) for sub_dir in sub_dirs
+        ]
+        for dir_path in dir_paths:
+            for dir_id in dir_path:
+                yield base.Dataset(dir_id, {"name": get_dir_name(dir_id)})
+        start = n_files * i // n_experiments
+        stop = n_files * (i + 1) // n_experiments
+        for j in range(start, stop):
+            yield ginfork.File(
+                f"{dir_paths[j % len(sub_dirs)][-1]}file_{j}.txt",
+                {
+                    "name": f"file_{j}.txt",
+                    "contentSize": get_content_size(rng),
+                    "experimentPackageFlag": True,
+                },
+            )
+
+
+def generate_sapporo(
+    n_entities: int, rng: random.Random, shape: CrateShape
+) -> Iterator[Entity]:
+    """
+    Output files of a SapporoRun in a single Dataset.
+    """
+    n_files = n_entities - 2
+    outputs = sapporo.Dataset(
+        "outputs/",
+        {
+            "name": "outputs",
+            "hasPart": [{"@id": f"outputs/file_{i}.txt"} for i in range(n_files)],
+        },
+    )
+    yield sapporo.SapporoRun(
+        props={
+            "workflow_engine_name": "cwltool",
+            "workflow_url": f"{EXAMPLE_URL}/workflow.cwl",
+            "sapporo_location": SAPPORO_LOCATION,
+            "state": "COMPLETE",
+            "outputs": outputs,
+        }
+    )
+    yield outputs
+    for i in range(n_files):
+        yield sapporo.File(f"outputs/file_{i}.txt", {"name": f"file_{i}.txt"})
+
+
+GENERATORS: Dict[str, Callable[[int, random.Random, CrateShape], Iterator[Entity]]] = {
+    "base": generate_base,
+    "amed": generate_amed,
+    "cao": generate_cao,
+    "meti": generate_meti,
+    "ginfork": generate_ginfork,
+    "sapporo": generate_sapporo,
+}
+
+SCHEMAS = list(GENERATORS)
+
+
+def make_invalid(
+    entities: Iterator[Entity], ratio: float, seed: int
+) -> Iterator[Entity]:
+    """
+    Make a ratio of the File entities invalid, alternately by removing the required name and by breaking the contentSize.
+    """
+    # another generator, so that the valid values do not depend on the ratio
+    rng = random.Random(f"invalid:{seed}")
+    n_invalid = 0
+    for entity in entities:
+        if entity.entity_name == "File" and rng.random() < ratio:
+            if n_invalid % 2 == 0:
+                del entity["name"]
+            else:
+                entity["contentSize"] = "unknown size"
+            n_invalid += 1
+        yield entity
+
+
+def generate_entities(
+    schema: str,
+    n_entities: int,
+    seed: int = 0,
+    shape: Optional[CrateShape] = None,
+) -> Iterator[Entity]:
+    """
+    Generate the entities of a synthetic crate one by one, except for the RootDataEntity and ROCrateMetadata.
+
+    Args:
+        schema (str): The schema of the crate, one of SCHEMAS.
+        n_entities (int): The number of entities, e.g., 1000. Each schema has a few fixed entities, so the number is at least that.
+        seed (int): The seed of the random values, such as file sizes.
+        shape (Optional[CrateShape]): The shape of the crate. The default is CrateShape().
+
+    Returns:
+        Iterator[Entity]: The entities.
+
+    Raises:
+        ValueError: If the schema is not supported.
+    """
+    if schema not in GENERATORS:
+        raise ValueError(f"Invalid schema: {schema}. Use one of {SCHEMAS}.")
+    shape = shape or CrateShape()
+
+    entities = GENERATORS[schema](n_entities, random.Random(seed), shape)
+    if shape.invalid_ratio > 0:
+        entities = make_invalid(entities, shape.invalid_ratio, seed)
+    return entities
+
+
+def generate_root(schema: str) -> RootDataEntity:
+    return RootDataEntity(
+        props={"name": f"synthetic {schema} crate", "datePublished": DATE_PUBLISHED}
+    )
+
+
+def generate_crate(
+    schema: str, n_entities: int, seed: int = 0, shape: Optional[CrateShape] = None
+) -> ROCrate:
+    """
+    Generate a synthetic crate by ROCrate() and ROCrate.add().
+
+    Args:
+        schema (str): The schema of the crate, one of SCHEMAS.
+        n_entities (int): The number of entities, except for the RootDataEntity and ROCrateMetadata.
+        seed (int): The seed of the random values, such as file sizes.
+        shape (Optional[CrateShape]): The shape of the crate.
+
+    Returns:
+        ROCrate: The generated crate.
+    """
+    crate = ROCrate()
+    crate.root["name"] = f"synthetic {schema} crate"
+    crate.root["datePublished"] = DATE_PUBLISHED
+    crate.add(*generate_entities(schema, n_entities, seed, shape))
+
+    return crate
+
+
+def generate_jsonld(
+    schema: str, n_entities: int, seed: int = 0, shape: Optional[CrateShape] = None
+) -> Dict[str, Any]:
+    """
+    Generate the JSON-LD of a synthetic crate.
+
+    Unlike ROCrate.as_jsonld(), the props of the entities are not checked, so that invalid crates can be generated.
+
+    Args:
+        schema (str): The schema of the crate, one of SCHEMAS.
+        n_entities (int): The number of entities, except for the RootDataEntity and ROCrateMetadata.
+        seed (int): The seed of the random values, such as file sizes.
+        shape (Optional[CrateShape]): The shape of the crate.
+
+    Returns:
+        Dict[str, Any]: The JSON-LD, as accepted by ROCrate(jsonld).
+    """
+    crate = generate_crate(schema, n_entities, seed, shape)
+
+    return {
+        "@context": RO_CRATE_CONTEXT,
+        "@graph": [entity.as_jsonld() for entity in crate.iter_entities()],
+    }
+
+
+def write_crate(
+    f: IO[str],
+    schema: str,
+    n_entities: int,
+    seed: int = 0,
+    shape: Optional[CrateShape] = None,
+) -> None:
+    """
+    Write the JSON-LD of a synthetic crate to a file, one entity at a time.
+
+    The output is the same as ROCrate.dump() of generate_crate(), but the crate is not held in memory.
+    Instead, the entities are generated three times, as the @graph lists the RootDataEntity with the @id of all
+    DataEntities first, then the DataEntities, and then the ContextualEntities.
+
+    Args:
+        f (IO[str]): The file to write to.
+        schema (str): The schema of the crate, one of SCHEMAS.
+        n_entities (int): The number of entities, except for the RootDataEntity and ROCrateMetadata.
+        seed (int): The seed of the random values, such as file sizes.
+        shape (Optional[CrateShape]): The shape of the crate.
+    """
+
+    def write_entity(jsonld: Dict[str, Any]) -> None:
+        f.write(",\n    " + json.dumps(jsonld, indent=2).replace("\n", "\n    "))
+
+    f.write('{\n  "@context": ' + json.dumps(RO_CRATE_CONTEXT) + ',\n  "@graph": [')
+
+    # the hasPart of the RootDataEntity is written in place of a placeholder
+    root_jsonld = generate_root(schema).as_jsonld()
+    root_jsonld["hasPart"] = "hasPart"
+    root_head, root_tail = (
+        json.dumps(root_jsonld, indent=2)
+        .replace("\n", "\n    ")
+        .split('"hasPart": "hasPart"')
+    )
+    f.write("\n    " + root_head + '"hasPart": [')
+    n_parts = 0
+    for entity in generate_entities(schema, n_entities, seed, shape):
+        if isinstance(entity, DataEntity):
+            part = json.dumps({"@id": entity.id}, indent=2)
+            f.write(("," if n_parts > 0 else "") + "\n        ")
+            f.write(part.replace("\n", "\n        "))
+            n_parts += 1
+    f.write(("\n      " if n_parts > 0 else "") + "]" + root_tail)
+
+    write_entity(ROCrateMetadata().as_jsonld())
+    for entity in generate_entities(schema, n_entities, seed, shape):
+        if isinstance(entity, DataEntity):
+            write_entity(entity.as_jsonld())
+    for entity in generate_entities(schema, n_entities, seed, shape):
+        if not isinstance(entity, DataEntity):
+            write_entity(entity.as_jsonld())
+    f.write("\n  ]\n}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Generate a synthetic RO-Crate and write it as JSON-LD."
+    )
+    parser.add_argument("schema", help="The schema of the crate", choices=SCHEMAS)
+    parser.add_argument(
+        "n_entities", help="The number of entities in the crate", type=int
+    )
+    parser.add_argument(
+        "--seed", help="The seed of the random values (default: 0)", type=int, default=0
+    )
+    parser.add_argument(
+        "--files-per-dataset",
+        help=f"The number of files in a directory (default: {FILES_PER_DATASET})",
+        type=int,
+        default=FILES_PER_DATASET,
+    )
+    parser.add_argument(
+        "--files-per-dmp",
+        help=f"The number of files per DMP (default: {FILES_PER_DMP})",
+        type=int,
+        default=FILES_PER_DMP,
+    )
+    parser.add_argument(
+        "--depth",
+        help="The depth of the directory trees (default: 1)",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--invalid-ratio",
+        help="The ratio of File entities made invalid (default: 0)",
+        type=float,
+        default=0.0,
+    )
+    parser.add_argument(
+        "--output", help="The file to write to (default: stdout)", default=None
+    )
+    args = parser.parse_args()
+
+    shape = CrateShape(
+        files_per_dataset=args.files_per_dataset,
+        files_per_dmp=args.files_per_dmp,
+        depth=args.depth,
+        invalid_ratio=args.invalid_ratio,
+    )
+    if args.output is None:
+        write_crate(sys.stdout, args.schema, args.n_entities, args.seed, shape)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            write_crate(f, args.schema, args.n_entities, args.seed, shape)
+
+
+if __name__ == "__main__":
+    main()
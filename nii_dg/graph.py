@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Implementation of the reference graph between the entities of an RO-Crate.
+"""
+
+from collections import deque
+from typing import Any, Dict, Iterable, List, Set, Tuple, Union
+from urllib.parse import urlparse
+
+from nii_dg.entity import Entity, get_ref_id
+
+# (referencing entity, prop, referenced @id)
+Reference = Tuple[Entity, str, str]
+
+
+class ReferenceGraph:
+    """
+    The references between the entities of an RO-Crate, indexed in both directions.
+
+    The nodes are the entities of the crate, and each reference in a prop, i.e., an Entity or a {"@id": ...} dict, is an edge to an @id.
+    The graph is updated incrementally: by the crate as entities are added or removed, and by the entities as their props are set or deleted.
+    A list value modified in place, e.g., by entity["hasPart"].append(file), is observed as well, as the entity holds it as a PropList.
+    Other values modified in place, e.g., a {"@id": ...} dict, are not observed. Call refresh() for the entity afterwards.
+
+    Entities are tracked by identity, so entities with the same @id (e.g., in different contexts) are separate nodes.
+    """
+
+    def __init__(self, entities: Iterable[Entity] = ()) -> None:
+        """
+        Initialize the graph.
+
+        Args:
+            entities (Iterable[Entity]): The entities to be added to the graph.
+        """
+        self._members: Dict[int, Entity] = {}
+        self._by_id: Dict[str, Dict[int, Entity]] = {}
+        # id(entity) -> the @id it is indexed by in _by_id
+        self._ids: Dict[int, str] = {}
+        # id(entity) -> prop -> referenced @id -> number of references, kept in order
+        self._out: Dict[int, Dict[str, Dict[str, int]]] = {}
+        # referenced @id -> id(entity) -> props
+        self._in: Dict[str, Dict[int, Set[str]]] = {}
+        for entity in entities:
+            self.add(entity)
+
+    def __contains__(self, entity: object) -> bool:
+        return id(entity) in self._members
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def add(self, entity: Entity) -> None:
+        """
+        Add an entity and the references in its props to the graph.
+
+        Args:
+            entity (Entity): The entity to be added.
+        """
+        key = id(entity)
+        if key in self._members:
+            return
+        self._members[key] = entity
+        self._ids[key] = entity.data["@id"]
+        self._by_id.setdefault(entity.data["@id"], {})[key] = entity
+        self._out[key] = {}
+        for prop, val in entity.data.items():
+            # only entities, dicts and lists can hold references; most values are str
+            if type(val) is not str and not prop.startswith("@"):
+                self._index_value(key, prop, val)
+        entity.add_observer(self._on_change)
+
+    def clear(self) -> None:
+        """
+        Remove all entities from the graph, e.g., when the entities of the crate are replaced.
+        """
+        for entity in self._members.values():
+            entity.remove_observer(self._on_change)
+        self._members.clear()
+        self._by_id.clear()
+        self._ids.clear()
+        self._out.clear()
+        self._in.clear()
+
+    def remove(self, entity: Entity) -> None:
+        """
+        Remove an entity and its references from the graph. The references to the entity are kept, as they are held by other entities.
+
+        Args:
+            entity (Entity): The entity to be removed.
+        """
+        key = id(entity)
+        if key not in self._members:
+            return
+        entity.remove_observer(self._on_change)
+        for prop in list(self._out[key]):
+            self._unindex_prop(entity, prop)
+        del self._out[key]
+        del self._members[key]
+        self._unindex_id(key, self._ids.pop(key))
+
+    def refresh(self, entity: Entity) -> None:
+        """
+        Re-index the references of an entity, e.g., after a prop value was mutated in place.
+
+        Args:
+            entity (Entity): The entity to be re-indexed.
+        """
+        key = id(entity)
+        if key not in self._members:
+            return
+        for prop in list(self._out[key]):
+            self._unindex_prop(entity, prop)
+        for prop in entity.keys():
+            self._index_prop(entity, prop)
+
+    def link(self, entity: Entity, prop: str, *ref_ids: str) -> None:
+        """
+        Add references, e.g., after DataEntities were appended to the hasPart list of the RootDataEntity.
+
+        Args:
+            entity (Entity): The referencing entity.
+            prop (str): The prop holding the references.
+            *ref_ids (str): The referenced @ids.
+        """
+        key = id(entity)
+        if key not in self._members:
+            return
+        counts = self._out[key].setdefault(prop, {})
+        for ref_id in ref_ids:
+            counts[ref_id] = counts.get(ref_id, 0) + 1
+            self._in.setdefault(ref_id, {}).setdefault(key, set()).add(prop)
+
+    def unlink(self, entity: Entity, prop: str, ref_id: str) -> None:
+        """
+        Remove a single reference added with link().
+
+        Args:
+            entity (Entity): The referencing entity.
+            prop (str): The prop holding the reference.
+            ref_id (str): The referenced @id.
+        """
+        key = id(entity)
+        ref_ids = self._out.get(key, {}).get(prop, {})
+        if ref_id not in ref_ids:
+            return
+        ref_ids[ref_id] -= 1
+        if ref_ids[ref_id] == 0:
+            del ref_ids[ref_id]
+            self._discard_in(ref_id, key, prop)
+        if len(ref_ids) == 0:
+            del self._out[key][prop]
+
+    def get(self, id_: str) -> List[Entity]:
+        """
+        Get the entities with the given @id.
+
+        Args:
+            id_ (str): The @id.
+
+        Returns:
+            List[Entity]: The entities with the @id, in the order they were added.
+        """
+        return list(self._by_id.get(id_, {}).values())
+
+    def references(self, entity: Entity) -> Dict[str, List[str]]:
+        """
+        Get the @ids referenced by an entity.
+
+        Args:
+            entity (Entity): The referencing entity.
+
+        Returns:
+            Dict[str, List[str]]: The referenced @ids per prop.
+        """
+        return {
+            prop: list(ref_ids)
+            for prop, ref_ids in self._out.get(id(entity), {}).items()
+        }
+
+    def referrers(self, target: Union[Entity, str]) -> List[Tuple[Entity, str]]:
+        """
+        Get the entities referencing an @id, i.e., the reverse references.
+
+        Args:
+            target (Union[Entity, str]): The referenced entity or @id.
+
+        Returns:
+            List[Tuple[Entity, str]]: The pairs of (referencing entity, prop).
+        """
+        ref_id = target.id if isinstance(target, Entity) else target
+        return [
+            (self._members[key], prop)
+            for key, props in self._in.get(ref_id, {}).items()
+            for prop in sorted(props)
+        ]
+
+    def walk(self, start: Entity, reverse: bool = False) -> List[Entity]:
+        """
+        Get the entities reachable from an entity by following references, in breadth-first order.
+
+        Args:
+            start (Entity): The entity to start from. It is included in the result.
+            reverse (bool): If True, follow the references backwards, i.e., get the entities that depend on `start`.
+
+        Returns:
+            List[Entity]: The reachable entities.
+        """
+        seen = {id(start)}
+        result = [start]
+        queue = deque([start])
+        while len(queue) > 0:
+            entity = queue.popleft()
+            if reverse:
+                nexts = [ent for ent, _ in self.referrers(entity)]
+            else:
+                nexts = [
+                    ent
+                    for ref_ids in self._out.get(id(entity), {}).values()
+                    for ref_id in ref_ids
+                    for ent in self._by_id.get(ref_id, {}).values()
+                ]
+            for ent in nexts:
+                if id(ent) not in seen:
+                    seen.add(id(ent))
+                    result.append(ent)
+                    queue.append(ent)
+
+        return result
+
+    def dangling(self, removed: Iterable[Entity] = ()) -> List[Reference]:
+        """
+        Get the references to @ids that no entity in the graph has.
+
+        References to absolute URIs, e.g., {"@id": "https://w3id.org/ro/crate/1.1"}, may point to web resources outside the crate,
+        so they are only reported if they would be left dangling by removing the given entities.
+
+        Args:
+            removed (Iterable[Entity]): If given, only the references that would be left dangling by removing these entities are returned.
+
+        Returns:
+            List[Reference]: The dangling references as (referencing entity, prop, referenced @id).
+        """
+        # dicts as ordered sets, so that the references are returned in the order of the removed entities
+        removed_keys = dict.fromkeys(id(entity) for entity in removed)
+        if len(removed_keys) == 0:
+            ref_ids = dict.fromkeys(
+                ref_id
+                for ref_id in self._in
+                if ref_id not in self._by_id and urlparse(ref_id).scheme == ""
+            )
+        else:
+            ref_ids = {}
+            for key in removed_keys:
+                entity_id = self._ids.get(key)
+                if entity_id is None or entity_id in ref_ids:
+                    continue
+                if all(k in removed_keys for k in self._by_id[entity_id]):
+                    ref_ids[entity_id] = None
+
+        return [
+            (self._members[key], prop, ref_id)
+            for ref_id in ref_ids
+            for key, props in self._in.get(ref_id, {}).items()
+            if key not in removed_keys
+            for prop in sorted(props)
+        ]
+
+    def _on_change(self, entity: Entity, prop: str) -> None:
+        key = id(entity)
+        if key not in self._members:
+            return
+        if prop == "@id":
+            self._reindex_id(entity)
+            return
+        self._unindex_prop(entity, prop)
+        self._index_prop(entity, prop)
+
+    def _reindex_id(self, entity: Entity) -> None:
+        key = id(entity)
+        old_id = self._ids[key]
+        new_id = entity.data["@id"]
+        if old_id == new_id:
+            return
+        self._unindex_id(key, old_id)
+        self._ids[key] = new_id
+        self._by_id.setdefault(new_id, {})[key] = entity
+        # references holding the entity itself, e.g., the hasPart of the root,
+        # follow it to the new @id; {"@id": ...} dicts keep the old one
+        for ref_key, props in list(self._in.get(old_id, {}).items()):
+            for prop in list(props):
+                self._unindex_prop(self._members[ref_key], prop)
+                self._index_prop(self._members[ref_key], prop)
+
+    def _unindex_id(self, key: int, id_: str) -> None:
+        same_id = self._by_id[id_]
+        del same_id[key]
+        if len(same_id) == 0:
+            del self._by_id[id_]
+
+    def _index_prop(self, entity: Entity, prop: str) -> None:
+        if prop.startswith("@") or prop not in entity.data:
+            return
+        self._index_value(id(entity), prop, entity.data[prop])
+
+    def _index_value(self, key: int, prop: str, val: Any) -> None:
+        if not isinstance(val, (dict, list, Entity)):
+            return
+        ref_ids: Dict[str, int] = {}
+        for item in val if isinstance(val, list) else [val]:
+            ref_id = get_ref_id(item)
+            if ref_id is not None:
+                ref_ids[ref_id] = ref_ids.get(ref_id, 0) + 1
+        if len(ref_ids) == 0:
+            return
+
+        self._out[key][prop] = ref_ids
+        for ref_id in ref_ids:
+            self._in.setdefault(ref_id, {}).setdefault(key, set()).add(prop)
+
+    def _unindex_prop(self, entity: Entity, prop: str) -> None:
+        key = id(entity)
+        for ref_id in self._out[key].pop(prop, {}):
+            self._discard_in(ref_id, key, prop)
+
+    def _discard_in(self, ref_id: str, key: int, prop: str) -> None:
+        referrers = self._in.get(ref_id)
+        if referrers is None or key not in referrers:
+            return
+        referrers[key].discard(prop)
+        if len(referrers[key]) == 0:
+            del referrers[key]
+        if len(referrers) == 0:
+            del self._in[ref_id]
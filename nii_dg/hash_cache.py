@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Persistent cache of file hashes, so re-packaging a project only re-hashes new or modified files.
+"""
+
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from nii_dg.utils import compute_sha256
+
+HASH_CACHE_VERSION = 1
+
+# (st_size, st_mtime_ns, st_ino)
+FileKey = Tuple[int, int, int]
+
+
+def file_key(stat: os.stat_result) -> FileKey:
+    """
+    Return the part of a stat result that identifies a version of a file.
+
+    Args:
+        stat (os.stat_result): The stat result of the file.
+
+    Returns:
+        FileKey: A tuple of (size, mtime in nanoseconds, inode).
+    """
+    return (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+
+class HashCache:
+    """
+    A cache of SHA256 hashes keyed on the absolute path, size, mtime and inode of files.
+
+    An entry is only reused if none of size, mtime and inode has changed, so an edited, replaced or
+    re-created file is always re-hashed. The cache is thread-safe and can be shared by hashing workers.
+
+    Attributes:
+        path (Optional[Path]): The JSON file the cache is loaded from and saved to. If None, the cache lives only in memory.
+        hits (int): The number of lookups answered from the cache.
+        misses (int): The number of lookups that required hashing the file.
+    """
+
+    def __init__(self, path: Optional[Union[str, Path]] = None) -> None:
+        """
+        Initialize the cache, loading existing entries from `path` if the file exists.
+
+        Args:
+            path (Optional[Union[str, Path]]): The JSON file backing the cache.
+        """
+        self.path = Path(path).expanduser().resolve() if path is not None else None
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[str, Tuple[FileKey, str]] = {}
+        self._lock = threading.Lock()
+        if self.path is not None and self.path.exists():
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __enter__(self) -> "HashCache":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.save()
+
+    def load(self) -> None:
+        """
+        Load the entries from the backing file. Entries of an unknown cache version are ignored.
+        """
+        if self.path is None:
+            return
+        with self.path.open("r", encoding="utf-8") as f:
+            data = json.load(f)
+        if not isinstance(data, dict) or data.get("version") != HASH_CACHE_VERSION:
+            return
+        entries: Dict[str, List[Union[int, str]]] = data.get("entries", {})
+        with self._lock:
+            for file_path, (size, mtime_ns, ino, sha256) in entries.items():
+                self._entries[file_path] = (
+                    (int(size), int(mtime_ns), int(ino)),
+                    str(sha256),
+                )
+
+    def save(self) -> None:
+        """
+        Save the entries to the backing file. The file is replaced atomically.
+        """
+        if self.path is None:
+            return
+        with self._lock:
+            entries = {
+                file_path: [*key, sha256]
+                for file_path, (key, sha256) in self._entries.items()
+            }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=".hash_cache_")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"version": HASH_CACHE_VERSION, "entries": entries}, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def get(
+        self, file_path: Union[str, Path], stat: Optional[os.stat_result] = None
+    ) -> Optional[str]:
+        """
+        Return the cached hash of a file if the file has not changed since it was hashed.
+
+        Args:
+            file_path (Union[str, Path]): The path to the file.
+            stat (Optional[os.stat_result]): The stat result of the file, if already known.
+
+        Returns:
+            Optional[str]: The cached hex digest, or None if there is no valid entry.
+        """
+        abs_path = str(Path(file_path).resolve())
+        if stat is None:
+            stat = os.stat(abs_path)
+        with self._lock:
+            entry = self._entries.get(abs_path)
+        if entry is None or entry[0] != file_key(stat):
+            return None
+        return entry[1]
+
+    def set(
+        self,
+        file_path: Union[str, Path],
+        sha256: str,
+        stat: Optional[os.stat_result] = None,
+    ) -> None:
+        """
+        Store the hash of a file.
+
+        Args:
+            file_path (Union[str, Path]): The path to the file.
+            sha256 (str): The hex digest of the file.
+            stat (Optional[os.stat_result]): The stat result of the file taken before hashing it.
+        """
+        abs_path = str(Path(file_path).resolve())
+        if stat is None:
+            stat = os.stat(abs_path)
+        with self._lock:
+            self._entries[abs_path] = (file_key(stat), sha256)
+
+    def sha256(
+        self, file_path: Union[str, Path], stat: Optional[os.stat_result] = None
+    ) -> str:
+        """
+        Return the hash of a file, computing and caching it if there is no valid entry.
+
+        Args:
+            file_path (Union[str, Path]): The path to the file.
+            stat (Optional[os.stat_result]): The stat result of the file, if already known.
+
+        Returns:
+            str: The hex digest of the file.
+        """
+        if stat is None:
+            stat = os.stat(file_path)
+        cached = self.get(file_path, stat)
+        if cached is not None:
+            with self._lock:
+                self.hits += 1
+            return cached
+
+        sha256 = compute_sha256(file_path)
+        with self._lock:
+            self.misses += 1
+        self.set(file_path, sha256, stat)
+        return sha256
+
+    def verify(self, file_path: Union[str, Path], expected_sha256: str) -> bool:
+        """
+        Check a file against an expected hash, re-hashing it only if it has changed since it was last hashed.
+
+        Args:
+            file_path (Union[str, Path]): The path to the file.
+            expected_sha256 (str): The expected hex digest, e.g., the `sha256` value of a File entity.
+
+        Returns:
+            bool: True if the hash of the file matches, False otherwise.
+        """
+        return self.sha256(file_path).lower() == expected_sha256.lower()
+
+    def prune(self) -> int:
+        """
+        Remove the entries of files that no longer exist.
+
+        Returns:
+            int: The number of removed entries.
+        """
+        with self._lock:
+            missing = [p for p in self._entries if not os.path.exists(p)]
+            for p in missing:
+                del self._entries[p]
+        return len(missing)
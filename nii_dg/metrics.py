@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Counters, gauges and histograms of the validation service, exposed in the Prometheus text format.
+
+The metrics are kept in this process and rendered on each scrape of GET /metrics,
+so no metrics service or client library is required.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    300.0,
+)
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if value == float("-inf"):
+        return "-Inf"
+    return repr(float(value))
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    if len(labels) == 0:
+        return ""
+    pairs = []
+    for name, value in labels.items():
+        value = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Metric:
+    """
+    A metric with a value for each combination of label values.
+
+    Args:
+        name (str): The name of the metric, e.g., "nii_dg_jobs_total".
+        help_ (str): The description of the metric.
+        label_names (Sequence[str]): The names of the labels.
+    """
+
+    type_ = "untyped"
+
+    def __init__(self, name: str, help_: str, label_names: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help_
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.label_names):
+            raise ValueError(
+                f"The labels of {self.name} must be {list(self.label_names)}, got {list(labels)}."
+            )
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _labels(self, values: LabelValues) -> Dict[str, str]:
+        return dict(zip(self.label_names, values))
+
+    def samples(self) -> List[Sample]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_}"]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """
+    A value that only increases, e.g., the number of requests.
+    """
+
+    type_ = "counter"
+
+    def __init__(self, name: str, help_: str, label_names: Sequence[str] = ()) -> None:
+        super().__init__(name, help_, label_names)
+        self._values: Dict[LabelValues, float] = {}
+        if len(self.label_names) == 0:
+            self._values[()] = 0.0
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._label_values(labels), 0.0)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [(self.name, self._labels(k), v) for k, v in self._values.items()]
+
+
+class Gauge(Metric):
+    """
+    A value that goes up and down, e.g., the number of busy workers.
+
+    If a function is set by set_function(), the value is read from it on each scrape, e.g., the length of a queue.
+    """
+
+    type_ = "gauge"
+
+    def __init__(self, name: str, help_: str, label_names: Sequence[str] = ()) -> None:
+        super().__init__(name, help_, label_names)
+        self._values: Dict[LabelValues, float] = {}
+        self._function: Optional[Callable[[], float]] = None
+        if len(self.label_names) == 0:
+            self._values[()] = 0.0
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """
+        Read the value of a gauge without labels from a function on each scrape.
+        """
+        self._function = function
+
+    def get(self, **labels: str) -> float:
+        if self._function is not None:
+            return float(self._function())
+        with self._lock:
+            return self._values.get(self._label_values(labels), 0.0)
+
+    def samples(self) -> List[Sample]:
+        if self._function is not None:
+            return [(self.name, {}, float(self._function()))]
+        with self._lock:
+            return [(self.name, self._labels(k), v) for k, v in self._values.items()]
+
+
+class Histogram(Metric):
+    """
+    The distribution of observed values, e.g., durations in seconds, counted in cumulative buckets.
+
+    Args:
+        buckets (Sequence[float]): The upper bounds of the buckets. The +Inf bucket is added.
+    """
+
+    type_ = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help_, label_names)
+        self.buckets = [*sorted(buckets), float("inf")]
+        # the counts of each bucket (not cumulative), the sum and the count
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            if key not in self._values:
+                self._values[key] = ([0] * len(self.buckets), [0.0, 0.0])
+            counts, total = self._values[key]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            total[0] += value
+            total[1] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """
+        Observe the time spent in the context in seconds.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def get_count(self, **labels: str) -> int:
+        with self._lock:
+            values = self._values.get(self._label_values(labels))
+            return 0 if values is None else int(values[1][1])
+
+    def samples(self) -> List[Sample]:
+        samples: List[Sample] = []
+        with self._lock:
+            for key, (counts, total) in self._values.items():
+                labels = self._labels(key)
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    samples.append(
+                        (
+                            f"{self.name}_bucket",
+                            {**labels, "le": format_value(bound)},
+                            cumulative,
+                        )
+                    )
+                samples.append((f"{self.name}_sum", labels, total[0]))
+                samples.append((f"{self.name}_count", labels, total[1]))
+        return samples
+
+
+class Registry:
+    """
+    The metrics rendered together, e.g., by GET /metrics.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered.")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """
+        Render all metrics in the Prometheus text format (version 0.0.4).
+        """
+        return "".join(metric.render() + "\n" for metric in self._metrics.values())
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help_: str, label_names: Sequence[str] = ()) -> Counter:
+    metric = Counter(name, help_, label_names)
+    REGISTRY.register(metric)
+    return metric
+
+
+def gauge(name: str, help_: str, label_names: Sequence[str] = ()) -> Gauge:
+    metric = Gauge(name, help_, label_names)
+    REGISTRY.register(metric)
+    return metric
+
+
+def histogram(
+    name: str,
+    help_: str,
+    label_names: Sequence[str] = (),
+    buckets: Sequence[float] = DEFAULT_BUCKETS,
+) -> Histogram:
+    metric = Histogram(name, help_, label_names, buckets)
+    REGISTRY.register(metric)
+    return metric
+
+
+# --- metrics of the library and the REST API server ---
+
+HTTP_REQUESTS = counter(
+    "nii_dg_http_requests_total",
+    "The number of HTTP requests handled by the API server.",
+    ["method", "endpoint", "status"],
+)
+HTTP_REQUEST_DURATION = histogram(
+    "nii_dg_http_request_duration_seconds",
+    "The time to handle an HTTP request.",
+    ["method", "endpoint"],
+)
+JOB_QUEUE_LENGTH = gauge(
+    "nii_dg_job_queue_length",
+    "The number of validation jobs waiting in the job queue.",
+)
+JOB_QUEUE_WAIT = histogram(
+    "nii_dg_job_queue_wait_seconds",
+    "The time from accepting a validation request until its job starts running, by the priority class of the job.",
+    ["priority"],
+)
+JOBS = counter(
+    "nii_dg_jobs_total",
+    "The number of finished validation jobs.",
+    ["status"],
+)
+JOB_DURATION = histogram(
+    "nii_dg_job_duration_seconds",
+    "The time from the start of a validation job until it finishes.",
+)
+EXECUTOR_WORKERS = gauge(
+    "nii_dg_executor_workers",
+    "The number of worker threads of each worker pool of jobs.",
+    ["pool"],
+)
+EXECUTOR_BUSY_WORKERS = gauge(
+    "nii_dg_executor_busy_workers",
+    "The number of worker threads of each worker pool of jobs that are running a job.",
+    ["pool"],
+)
+PHASE_DURATION = histogram(
+    "nii_dg_phase_duration_seconds",
+    "The time spent in each phase of a validation request: check_props before queueing, and validate in the job.",
+    ["phase"],
+)
+ENTITY_VALIDATION_DURATION = histogram(
+    "nii_dg_entity_validation_duration_seconds",
+    "The time to validate an entity, by its schema and type, e.g., amed.DMP.",
+    ["entity_type"],
+)
+REJECTED_REQUESTS = counter(
+    "nii_dg_rejected_requests_total",
+    "The number of validation requests rejected by admission control, by reason: crate_size, queue_full or client_limit.",
+    ["reason"],
+)
+CACHE_REQUESTS = counter(
+    "nii_dg_cache_requests_total",
+    "The number of look-ups of the in-process caches, e.g., the entity indexes of a validation pass, by hit or miss.",
+    ["cache", "result"],
+)
+URL_CHECK_DURATION = histogram(
+    "nii_dg_url_check_duration_seconds",
+    "The latency of the outbound HTTP requests that check if a URL is accessible.",
+    ["result"],
+)
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Timing instrumentation of check_props(), validate(), the check rules of check_entity_values() and outbound HTTP calls.
+
+A Profiler collects the timings measured in the context it is activated in by profile(), e.g., of a crate being validated.
+Instrumented code calls timed() around the measured work, which does nothing but look up a context variable
+when no profiler is active.
+
+    with profile() as profiler:
+        crate.validate()
+    profiler.summary()
+
+report() summarizes them for a user, e.g., ROCrate.validate(profile=True) and GET /<request_id>?profile.
+"""
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from types import TracebackType
+from typing import (TYPE_CHECKING, Any, Callable, ContextManager, Dict,
+                    Iterator, List, Optional, Tuple, Type)
+
+if TYPE_CHECKING:
+    from nii_dg.entity import Entity
+
+# the kinds of timings
+CHECK_PROPS = (
+    "check_props"  # Entity.check_props(), named by the entity class, e.g., "base.File"
+)
+VALIDATE = "validate"  # Entity.validate(), named by the entity class
+CHECK = "check"  # a part of them, e.g., "base.File:_check_prop_types" or "base.File:contentSize(is_content_size)"
+HTTP = "http"  # an outbound HTTP call, named by the URL
+KINDS = [CHECK_PROPS, VALIDATE, CHECK, HTTP]
+
+DEFAULT_TOP = 10
+
+# called with the kind, the name, the entity (if any) and the elapsed seconds of each timing
+Callback = Callable[[str, str, Optional["Entity"], float], None]
+
+_current: "contextvars.ContextVar[Optional[Profiler]]" = contextvars.ContextVar(
+    "nii_dg_profiler", default=None
+)
+_null_timer: ContextManager[None] = nullcontext()
+
+
+def get_entity_class_name(entity: "Entity") -> str:
+    return f"{entity.schema_name}.{entity.type}"
+
+
+class TimingStats:
+    """
+    The count, total and maximum of the timings of the same name.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"count": self.count, "total": self.total, "max": self.max}
+
+
+class Timer:
+    """
+    Measure the time spent in the context and record it to a profiler.
+    """
+
+    def __init__(
+        self,
+        profiler: "Profiler",
+        kind: str,
+        name: Optional[str],
+        entity: Optional["Entity"],
+    ) -> None:
+        self.profiler = profiler
+        self.kind = kind
+        self.name = name
+        self.entity = entity
+        self.start = 0.0
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        seconds = time.perf_counter() - self.start
+        self.profiler.record(self.kind, self.name, seconds, self.entity)
+
+
+class Profiler:
+    """
+    Aggregate the timings of a crate by kind and name, and by entity.
+
+    Args:
+        callbacks (Optional[List[Callback]]): Called with each timing as it is recorded, e.g., to log slow checks.
+
+    Attributes:
+        stats (Dict[Tuple[str, str], TimingStats]): The timings by kind and name.
+        entity_stats (Dict[Tuple[str, str], TimingStats]): The check_props and validate timings by entity class name and @id.
+        phases (Dict[str, float]): The wall-clock time of each phase of the validation, e.g., "check_props" and "validate".
+    """
+
+    def __init__(self, callbacks: Optional[List[Callback]] = None) -> None:
+        self.callbacks: List[Callback] = list(callbacks or [])
+        self.stats: Dict[Tuple[str, str], TimingStats] = {}
+        self.entity_stats: Dict[Tuple[str, str], TimingStats] = {}
+        self.phases: Dict[str, float] = {}
+        # validate_async() may finish an entity in an executor thread
+        self._lock = threading.Lock()
+
+    def add_callback(self, callback: Callback) -> None:
+        self.callbacks.append(callback)
+
+    def record(
+        self,
+        kind: str,
+        name: Optional[str],
+        seconds: float,
+        entity: Optional["Entity"] = None,
+    ) -> None:
+        """
+        Record a timing.
+
+        Args:
+            kind (str): One of KINDS.
+            name (Optional[str]): The name of the timing. If None, the entity class name is used.
+                The name of a check is prefixed with the entity class name, e.g., "base.File:_check_prop_types".
+            seconds (float): The elapsed time.
+            entity (Optional[Entity]): The entity the timing belongs to.
+        """
+        if name is None:
+            if entity is None:
+                raise ValueError("Either the name or the entity is required.")
+            name = get_entity_class_name(entity)
+        elif kind == CHECK and entity is not None:
+            name = f"{get_entity_class_name(entity)}:{name}"
+        with self._lock:
+            self.stats.setdefault((kind, name), TimingStats()).add(seconds)
+            if entity is not None and kind in (CHECK_PROPS, VALIDATE):
+                key = (get_entity_class_name(entity), entity.id)
+                self.entity_stats.setdefault(key, TimingStats()).add(seconds)
+        for callback in self.callbacks:
+            callback(kind, name, entity, seconds)
+
+    def timer(
+        self, kind: str, name: Optional[str] = None, entity: Optional["Entity"] = None
+    ) -> Timer:
+        return Timer(self, kind, name, entity)
+
+    def add_phase(self, phase: str, seconds: float) -> None:
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        Get the timings by kind and name.
+
+        Returns:
+            Dict[str, Dict[str, Dict[str, Any]]]: e.g., {"validate": {"base.File": {"count": 2, "total": 0.1, "max": 0.06}}}
+        """
+        with self._lock:
+            summary: Dict[str, Dict[str, Dict[str, Any]]] = {kind: {} for kind in KINDS}
+            for (kind, name), stats in self.stats.items():
+                summary.setdefault(kind, {})[name] = stats.as_dict()
+        return summary
+
+    def report(self, top: int = DEFAULT_TOP) -> Dict[str, Any]:
+        """
+        Get a timing breakdown of the validation, in seconds.
+
+        Args:
+            top (int): The number of the slowest entities, URLs and checks to report.
+
+        Returns:
+            Dict[str, Any]: The report with the following keys:
+
+                - total: the total time of the phases
+                - phases: the time of each phase, e.g., {"check_props": 0.2, "validate": 1.5}
+                - entityClasses: the number of entities and the time spent in their check_props() and validate() by entity class
+                - slowestEntities: the entities that took the longest, e.g., [{"entityId": "file_1.txt", "entityClass": "base.File", "time": 0.1}]
+                - slowestUrls: the URLs accessed that took the longest, e.g., [{"url": "https://example.com", "count": 1, "total": 0.5, "max": 0.5}]
+                - slowestChecks: the checks that took the longest in total, e.g., [{"check": "base.File:_check_prop_types", "count": 2, "total": 0.1, "max": 0.06}]
+        """
+        with self._lock:
+            phases = dict(self.phases)
+            entity_classes: Dict[str, Dict[str, Any]] = {}
+            for entity_class, _ in self.entity_stats:
+                class_stats = entity_classes.setdefault(
+                    entity_class, {"count": 0, "checkProps": 0.0, "validate": 0.0}
+                )
+                class_stats["count"] += 1
+            for (kind, name), stats in self.stats.items():
+                if kind in (CHECK_PROPS, VALIDATE) and name in entity_classes:
+                    key = "checkProps" if kind == CHECK_PROPS else "validate"
+                    entity_classes[name][key] += stats.total
+            entities = sorted(
+                self.entity_stats.items(), key=lambda item: item[1].total, reverse=True
+            )[:top]
+            urls = sorted(
+                [
+                    (name, stats)
+                    for (kind, name), stats in self.stats.items()
+                    if kind == HTTP
+                ],
+                key=lambda item: item[1].max,
+                reverse=True,
+            )[:top]
+            checks = sorted(
+                [
+                    (name, stats)
+                    for (kind, name), stats in self.stats.items()
+                    if kind == CHECK
+                ],
+                key=lambda item: item[1].total,
+                reverse=True,
+            )[:top]
+
+        return {
+            "total": sum(phases.values()),
+            "phases": phases,
+            "entityClasses": entity_classes,
+            "slowestEntities": [
+                {
+                    "entityId": entity_id,
+                    "entityClass": entity_class,
+                    "time": stats.total,
+                }
+                for (entity_class, entity_id), stats in entities
+            ],
+            "slowestUrls": [{"url": url, **stats.as_dict()} for url, stats in urls],
+            "slowestChecks": [
+                {"check": check, **stats.as_dict()} for check, stats in checks
+            ],
+        }
+
+
+def get_profiler() -> Optional[Profiler]:
+    """
+    Get the profiler active in the current context, if any.
+    """
+    return _current.get()
+
+
+def activate(profiler: Optional[Profiler]) -> ContextManager[Optional[Profiler]]:
+    """
+    Activate the profiler in the current context if it is given, or do nothing.
+    """
+    return profile(profiler) if profiler is not None else nullcontext()
+
+
+@contextmanager
+def profile(profiler: Optional[Profiler] = None) -> Iterator[Profiler]:
+    """
+    Activate a profiler in the current context, so that the instrumented code records its timings to it.
+
+    Args:
+        profiler (Optional[Profiler]): The profiler to activate. If None, a new one is created.
+
+    Yields:
+        Profiler: The active profiler.
+    """
+    profiler = profiler if profiler is not None else Profiler()
+    token = _current.set(profiler)
+    try:
+        yield profiler
+    finally:
+        _current.reset(token)
+
+
+def timed(
+    kind: str, name: Optional[str] = None, entity: Optional["Entity"] = None
+) -> ContextManager[None]:
+    """
+    Measure the time spent in the context if a profiler is active.
+
+    Args:
+        kind (str): One of KINDS.
+        name (Optional[str]): The name of the timing. If None, the entity class name is used.
+        entity (Optional[Entity]): The entity the timing belongs to.
+
+    Returns:
+        ContextManager[None]: A timer, or a shared no-op context manager if no profiler is active.
+    """
+    profiler = _current.get()
+    if profiler is None:
+        return _null_timer
+    return profiler.timer(kind, name, entity)
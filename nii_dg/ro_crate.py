@@ -5,18 +5,199 @@
 Implementation of the RO-Crate class.
 """
 
+import copy
 import json
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Type, Union
+from typing import (Any, Callable, Deque, Dict, Hashable, Iterable, Iterator,
+                    List, Optional, Tuple, Type, TypeVar, Union)
 
+from nii_dg.cancellation import check_cancelled
 from nii_dg.const import RO_CRATE_CONTEXT
 from nii_dg.entity import (ContextualEntity, DataEntity, DefaultEntity, Entity,
-                           ROCrateMetadata, RootDataEntity)
+                           ROCrateMetadata, RootDataEntity, get_ref_id)
+from nii_dg.entity_list import EntityList
 from nii_dg.error import (CrateCheckPropsError, CrateError,
                           CrateValidationError, EntityError)
+from nii_dg.graph import ReferenceGraph
+from nii_dg.metrics import CACHE_REQUESTS
 from nii_dg.module_info import GH_REPO
-from nii_dg.utils import (DG_CONFIG, import_custom_class,
-                          import_external_class, parse_ctx)
+from nii_dg.profiling import CHECK_PROPS, VALIDATE, Profiler, activate, timed
+from nii_dg.store import get_context_key
+from nii_dg.table import (columns_to_format, columns_to_rows,
+                          entities_to_columns, format_to_columns)
+from nii_dg.utils import (DG_CONFIG, convert_file_size, get_entity_type_names,
+                          import_custom_class, import_external_class,
+                          parse_content_size, parse_ctx)
+
+T = TypeVar("T")
+
+
+def build_records(
+    entity_class: Type[Entity], rows: Iterable[Dict[str, Any]]
+) -> List[Entity]:
+    """
+    Create entities of a class from rows of props, without calling __init__ and __setitem__ for each of them.
+
+    The class is instantiated once to get its @type, @context and default props, and the other entities are copied from it.
+
+    Args:
+        entity_class (Type[Entity]): The class of the entities.
+        rows (Iterable[Dict[str, Any]]): The props of each entity, including "@id".
+
+    Returns:
+        List[Entity]: The created entities.
+
+    Raises:
+        ValueError: If a row does not have "@id".
+    """
+    template = entity_class("", {})  # type: ignore
+    state = {k: v for k, v in template.__dict__.items() if k != "data"}
+    mutable_defaults = [
+        k for k, v in template.data.items() if isinstance(v, (list, dict))
+    ]
+    entities: List[Entity] = []
+    for row in rows:
+        if "@id" not in row:
+            raise ValueError("Each row must have an '@id' key.")
+        entity = entity_class.__new__(entity_class)
+        entity.__dict__.update(state)
+        entity._observers = []
+        data = template.data.copy()
+        for key in mutable_defaults:
+            data[key] = copy.copy(data[key])
+        data.update(row)
+        entity.data = data
+        entities.append(entity)
+
+    return entities
+
+
+def check_crate_jsonld(jsonld: Dict[str, Any]) -> None:
+    """
+    Check the top-level keys of the JSON-LD data of an RO-Crate.
+
+    Args:
+        jsonld (Dict[str, Any]): The JSON-LD data.
+
+    Raises:
+        TypeError: If the JSON-LD data is not a dictionary.
+        ValueError: If the JSON-LD data does not have the RO-Crate context or the '@graph' key.
+    """
+    if not isinstance(jsonld, dict):
+        raise TypeError("The JSON-LD data must be a dictionary.")
+    if "@context" not in jsonld:
+        raise ValueError("The JSON-LD data must have a '@context' key.")
+    if jsonld["@context"] != RO_CRATE_CONTEXT:
+        raise ValueError("The JSON-LD data must have the RO-Crate context.")
+    if "@graph" not in jsonld:
+        raise ValueError("The JSON-LD data must have a '@graph' key.")
+
+
+def get_id_and_type(jsonld: Dict[str, Any]) -> Tuple[str, Any]:
+    """
+    Get the '@id' and '@type' of an entity in the JSON-LD data.
+
+    Raises:
+        ValueError: If the entity does not have '@id' or '@type'.
+    """
+    id_ = jsonld.get("@id")
+    if id_ is None:
+        raise ValueError("The JSON-LD data must have an '@id' key for each entity.")
+    type_ = jsonld.get("@type")
+    if type_ is None:
+        raise ValueError("The JSON-LD data must have an '@type' key for each entity.")
+
+    return id_, type_
+
+
+def get_entity_class(jsonld: Dict[str, Any]) -> Type[Entity]:
+    """
+    Get the class of an entity in the JSON-LD data from its '@context' and '@type'.
+
+    Args:
+        jsonld (Dict[str, Any]): The JSON-LD object of the entity.
+
+    Returns:
+        Type[Entity]: The class of the entity.
+
+    Raises:
+        ValueError: If the context is not supported or the entity type is not found.
+    """
+    ctx = jsonld.get("@context", RO_CRATE_CONTEXT)
+    type_ = jsonld["@type"]
+    gh_repo, gh_ref, schema = parse_ctx(ctx)
+    entity_class = None
+    if DG_CONFIG["DG_USE_EXTERNAL_CTX"]:
+        if gh_repo != GH_REPO:
+            if DG_CONFIG["DG_ALLOW_OTHER_GH_REPO"] is False:
+                raise ValueError(
+                    f"The context {ctx} which is generated by {gh_repo} is not supported."
+                )
+        entity_class = import_external_class(gh_repo, gh_ref, schema, type_)
+    else:
+        entity_class = import_custom_class(f"nii_dg.schema.{schema}", type_)
+    if entity_class is None:
+        raise ValueError(f"Entity type {type_} is not found.")
+
+    return entity_class  # type: ignore
+
+
+class FileSizeIndex:
+    """
+    Total size of files grouped by the @id of the entity they reference, e.g., the DMP of each file.
+
+    The contentSize of each file is parsed once when the index is built,
+    so looking up the total of a referenced entity does not scan the files again.
+
+    Attributes:
+        sizes (Dict[str, int]): The total size in bytes per referenced @id.
+    """
+
+    def __init__(self, entities: Iterable[Entity], ref_prop: str) -> None:
+        """
+        Build the index.
+
+        Args:
+            entities (Iterable[Entity]): The file entities to be indexed.
+            ref_prop (str): The prop of the files that references the grouping entity, e.g., "dmpDataNumber".
+        """
+        self.sizes: Dict[str, int] = {}
+        self._errors: Dict[str, str] = {}
+        for entity in entities:
+            ref_id = get_ref_id(entity.get(ref_prop))
+            if ref_id is None:
+                continue
+            try:
+                if "contentSize" not in entity:
+                    raise ValueError(f"contentSize is not defined for {entity}")
+                size = parse_content_size(entity["contentSize"])
+            except ValueError as e:
+                self._errors.setdefault(ref_id, str(e))
+                continue
+            self.sizes[ref_id] = self.sizes.get(ref_id, 0) + size
+
+    def total_size(self, ref_id: str, size_unit: str) -> float:
+        """
+        Get the total size of the files referencing the given @id.
+
+        Args:
+            ref_id (str): The @id of the referenced entity.
+            size_unit (str): The unit of the result. e.g., "B", "KB", "MB", "GB", "TB", "PB"
+
+        Returns:
+            float: The total size in the specified unit, as utils.sum_file_size() returns.
+
+        Raises:
+            ValueError: If the contentSize of one of the files is not defined or invalid.
+        """
+        if ref_id in self._errors:
+            raise ValueError(self._errors[ref_id])
+
+        return convert_file_size(self.sizes.get(ref_id, 0), size_unit)
 
 
 class ROCrate:
@@ -40,8 +221,9 @@ class ROCrate:
     Attributes:
         root (RootDataEntity): The RootDataEntity of the RO-Crate.
         default_entities (List[DefaultEntity]): The DefaultEntity list of the RO-Crate.
-        data_entities (List[DataEntity]): The DataEntity list of the RO-Crate.
-        contextual_entities (List[ContextualEntity]): The ContextualEntity list of the RO-Crate.
+        data_entities (EntityList[DataEntity]): The DataEntity list of the RO-Crate, also the hasPart of the RootDataEntity.
+        contextual_entities (EntityList[ContextualEntity]): The ContextualEntity list of the RO-Crate.
+        graph (ReferenceGraph): The references between the entities of the RO-Crate, e.g., to find the entities referencing an entity.
     """
 
     def __init__(self, jsonld: Optional[Dict[str, Any]] = None) -> None:
@@ -54,70 +236,211 @@ class ROCrate:
         Raises:
             TypeError: If the entity type is not supported.
         """
+        self._validation_cache: Optional[Dict[Hashable, Any]] = None
+        self._cache_lock = threading.RLock()
         if jsonld is not None:
             self.from_jsonld(jsonld)
         else:
             self.root = RootDataEntity()
             self.default_entities: List[DefaultEntity] = [self.root, ROCrateMetadata()]
-            self.data_entities: List[DataEntity] = []
-            self.contextual_entities: List[ContextualEntity] = []
+            self.data_entities: EntityList[DataEntity] = EntityList()
+            self.contextual_entities: EntityList[ContextualEntity] = EntityList()
+            self._link_entities()
 
+    def _link_entities(self) -> None:
+        """
+        Link the DataEntities to the RootDataEntity and build the reference graph, after the entity lists are set.
+        """
         self.root["hasPart"] = self.data_entities
+        old_graph: Optional[ReferenceGraph] = getattr(self, "graph", None)
+        if old_graph is not None:
+            old_graph.clear()
+        self.graph = ReferenceGraph(self.all_entities)
 
     def add(self, *entities: Entity) -> None:
         """
         Add entities to the RO-Crate.
 
         Args:
-            *entities (Entity): The entities to be added to the RO-Crate.
+            *entities (Entity): The entities to be added to the RO-Crate. An entity already in the RO-Crate is not added again.
 
         Raises:
             TypeError: If the entity type is not supported.
         """
         for entity in entities:
+            if entity in self.graph:
+                # looked up by identity, so that the hasPart of the RootDataEntity does not list a DataEntity twice
+                continue
             if isinstance(entity, DefaultEntity):
                 self.default_entities.append(entity)
             elif isinstance(entity, DataEntity):
                 self.data_entities.append(entity)
+                self.graph.link(self.root, "hasPart", entity.id)
             elif isinstance(entity, ContextualEntity):
                 self.contextual_entities.append(entity)
             else:
                 raise TypeError(
                     "'Entity' class is not supported to be added directly. Please use 'DefaultEntity', 'DataEntity', or 'ContextualEntity' instead."
                 )
+            self.graph.add(entity)
+
+    def add_records(
+        self, entity_class: Type[Entity], rows: Iterable[Dict[str, Any]]
+    ) -> List[Entity]:
+        """
+        Create entities of a class from rows of props and add them to the RO-Crate, e.g., a File for each row of a CSV inventory.
+
+        The class is instantiated once to get its @type, @context and default props.
+        The other entities are created from it without calling __init__ and __setitem__ for each prop,
+        so that the rows are used as they are, as in from_jsonld(). The props are checked later by check_props() as usual.
+
+        Args:
+            entity_class (Type[Entity]): The class of the entities, a subclass of DataEntity or ContextualEntity.
+            rows (Iterable[Dict[str, Any]]): The props of each entity, including "@id".
+
+        Returns:
+            List[Entity]: The created entities.
+
+        Raises:
+            TypeError: If the class is not a subclass of DataEntity or ContextualEntity.
+            ValueError: If a row does not have "@id".
+        """
+        if not issubclass(entity_class, (DataEntity, ContextualEntity)):
+            raise TypeError(
+                "Only subclasses of 'DataEntity' or 'ContextualEntity' can be added as records."
+            )
+
+        entities = build_records(entity_class, rows)
+        for ent in entities:
+            self.graph.add(ent)
+        if issubclass(entity_class, DataEntity):
+            self.data_entities.extend(entities)  # type: ignore
+            self.graph.link(self.root, "hasPart", *[ent.id for ent in entities])
+        else:
+            self.contextual_entities.extend(entities)  # type: ignore
+
+        return entities
+
+    def to_table(
+        self, entity_class: Type[Entity], table_format: str = "columns"
+    ) -> Any:
+        """
+        Export the entities of a class as a columnar table, e.g., to filter or aggregate files.
+
+        The table has a column for "@id" and for each prop of the EntityDef of the class.
+        References to other entities are exported as their @id, and missing props as None.
+
+        Args:
+            entity_class (Type[Entity]): The class of the entities, e.g., nii_dg.schema.amed.File.
+            table_format (str): "columns" for a dict of lists, "numpy" for a dict of NumPy arrays, or "pandas" for a DataFrame.
+
+        Returns:
+            Any: The table in the given format.
 
-    def remove(self, *entities: Entity) -> None:
+        Raises:
+            ValueError: If the table format is not supported.
+            ImportError: If NumPy or pandas is required but not installed.
+        """
+        columns = entities_to_columns(self.get_by_type(entity_class), entity_class)
+        return columns_to_format(columns, table_format)
+
+    def from_table(self, entity_class: Type[Entity], table: Any) -> List[Entity]:
+        """
+        Import entities of a class from a columnar table, as exported by to_table(), and add them to the RO-Crate.
+
+        Args:
+            entity_class (Type[Entity]): The class of the entities.
+            table (Any): A dict of lists or NumPy arrays, or a pandas DataFrame, with an "@id" column.
+                Empty cells (None or NaN) are omitted, and the @id values in reference props become {"@id": ...} references.
+
+        Returns:
+            List[Entity]: The created entities.
+
+        Raises:
+            ValueError: If there is no "@id" column or the columns have different lengths.
+        """
+        columns = format_to_columns(table)
+        return self.add_records(entity_class, columns_to_rows(columns, entity_class))
+
+    def remove(self, *entities: Entity, check_references: bool = False) -> None:
         """
         Removes entities from the RO-Crate.
 
         Args:
             *entities: The entities to be removed from the RO-Crate.
+            check_references (bool): If True, refuse to remove the entities if other entities of the crate still reference them.
 
         Raises:
-            ValueError: If the entity is not included in the RO-Crate or is a DefaultEntity.
+            ValueError: If the entity is not included in the RO-Crate or is a DefaultEntity,
+                or if check_references is True and the removal would leave dangling references.
             TypeError: If the entity type is not supported.
 
         Note:
             There are three types of entities that can be removed: DefaultEntity, DataEntity, and ContextualEntity.
             If an unsupported entity is given, a TypeError is raised.
             If the entity is not included in the RO-Crate, a ValueError is raised.
+            Entities are looked up by identity, and all of them are checked before any is removed.
+            Removing an entity takes O(1), as the entity lists drop the removed entities lazily at their next access.
         """
+        if check_references:
+            dangling = [
+                (ent, prop, ref_id)
+                for ent, prop, ref_id in self.graph.dangling(removed=entities)
+                # the RootDataEntity drops the removed DataEntities from its hasPart
+                if not (ent is self.root and prop == "hasPart")
+            ]
+            if len(dangling) > 0:
+                refs = ", ".join(
+                    f"{ent}.{prop} -> {ref_id}" for ent, prop, ref_id in dangling
+                )
+                raise ValueError(f"The entities are still referenced: {refs}")
+
+        removed: Dict[int, Entity] = {}
         for entity in entities:
-            if entity not in self.all_entities:
+            if entity not in self.graph and not self._contains(entity):
+                # looked up by identity, e.g., an equal copy of an entity is not found
                 raise ValueError(f"Entity {entity} is not included in the RO-Crate.")
 
             if isinstance(entity, DefaultEntity):
                 raise ValueError(
                     f"Entity {entity} is a DefaultEntity and cannot be removed."
                 )
-            elif isinstance(entity, DataEntity):
-                self.data_entities.remove(entity)
-            elif isinstance(entity, ContextualEntity):
-                self.contextual_entities.remove(entity)
-            else:
+            elif not isinstance(entity, (DataEntity, ContextualEntity)):
                 raise TypeError(
                     "'Entity' class is not supported to be removed directly. Please use 'DefaultEntity', 'DataEntity', or 'ContextualEntity' instead."
                 )
+            removed[id(entity)] = entity
+
+        for entity in removed.values():
+            if isinstance(entity, DataEntity):
+                self.data_entities.discard(entity)
+                if entity in self.graph:
+                    self.graph.unlink(self.root, "hasPart", entity.id)
+            else:
+                self.contextual_entities.discard(entity)  # type: ignore
+            self.graph.remove(entity)
+
+    def _contains(self, entity: Entity) -> bool:
+        """
+        Check if the entity itself is in the entity lists, e.g., appended to data_entities directly instead of by add().
+        Unlike the reference graph, this scans the list.
+        """
+        if isinstance(entity, DataEntity):
+            return self.data_entities.contains(entity)
+        if isinstance(entity, ContextualEntity):
+            return self.contextual_entities.contains(entity)
+        return any(ent is entity for ent in self.default_entities)
+
+    def iter_entities(self) -> Iterator[Entity]:
+        """
+        Iterate over all entities in the RO-Crate, in the order of all_entities.
+
+        Unlike all_entities, a storage backend may yield the entities one by one without holding all of them in memory.
+
+        Returns:
+            Iterator[Entity]: The entities.
+        """
+        return iter(self.all_entities)
 
     @property
     def all_entities(self) -> List[Entity]:
@@ -139,6 +462,8 @@ class ROCrate:
         Returns:
             A list of entities with the specified ID.
         """
+        if self._validation_cache is not None:
+            return list(self.get_entity_index("id").get(id_, []))
         return [entity for entity in self.all_entities if entity.id == id_]
 
     def get_by_type(self, type_: Type[Entity]) -> List[Entity]:
@@ -151,7 +476,9 @@ class ROCrate:
         Returns:
             A list of entities with the specified type.
         """
-        return [entity for entity in self.all_entities if type(entity) == type_]
+        if self._validation_cache is not None:
+            return list(self.get_entity_index("type").get(type_, []))
+        return [entity for entity in self.all_entities if type(entity) is type_]
 
     def get_by_id_and_type(self, id_: str, type_: Type[Entity]) -> List[Entity]:
         """
@@ -164,12 +491,222 @@ class ROCrate:
         Returns:
             A list of entities with the specified ID and type.
         """
+        if self._validation_cache is not None:
+            return [entity for entity in self.get_by_id(id_) if type(entity) is type_]
         return [
             entity
             for entity in self.all_entities
-            if entity.id == id_ and type(entity) == type_
+            if entity.id == id_ and type(entity) is type_
         ]
 
+    def get_validation_closure(self, entities: Iterable[Entity]) -> List[Entity]:
+        """
+        Get the entities that the validation of the given entities depends on.
+
+        These are the given entities, the entities their validate() looks up (see Entity.get_queried_types()),
+        and the entities referenced in the props of all of them, transitively.
+        The references of DefaultEntities are not followed, as the RootDataEntity references all DataEntities.
+
+        Args:
+            entities (Iterable[Entity]): The entities to be validated.
+
+        Returns:
+            List[Entity]: The entities, in breadth-first order from the given ones.
+        """
+        closure: Dict[int, Entity] = {}
+        queue: Deque[Entity] = deque()
+
+        def visit(entity: Entity) -> None:
+            if id(entity) not in closure:
+                closure[id(entity)] = entity
+                queue.append(entity)
+
+        for entity in entities:
+            visit(entity)
+            for type_ in type(entity).get_queried_types():
+                for queried in self.get_by_type(type_):
+                    visit(queried)
+
+        while len(queue) > 0:
+            entity = queue.popleft()
+            if isinstance(entity, DefaultEntity):
+                continue
+            for key, val in entity.items():
+                if key.startswith("@"):
+                    continue
+                for item in val if isinstance(val, list) else [val]:
+                    ref_id = get_ref_id(item)
+                    if ref_id is not None:
+                        for referenced in self.get_by_id(ref_id):
+                            visit(referenced)
+
+        return list(closure.values())
+
+    def resolve_references(self) -> None:
+        """
+        Replace the {"@id": ...} references in the props of all entities with the referenced entities of the crate.
+
+        References loaded from JSON-LD are dicts. Once they are resolved, validators can follow them without looking up the crate,
+        and check_props() also checks the type of the referenced entities.
+        Only the props whose expected type is an entity, e.g., "DMP" or "List[File]", are resolved.
+        If several entities have the referenced @id, the one of the expected type is chosen, preferring the "@context" of the reference if given,
+        and then the context of the referencing entity.
+
+        Raises:
+            CrateCheckPropsError: If there are references to entities that are not included in the crate.
+                All of them are reported at once, and all other references are resolved nonetheless.
+        """
+        index: Dict[str, List[Entity]] = {}
+        for entity in self.all_entities:
+            index.setdefault(entity.id, []).append(entity)
+
+        crate_error = CrateCheckPropsError()
+        for entity in self.all_entities:
+            error = EntityError(entity)
+            for key, val in list(entity.items()):
+                prop_def = entity.entity_def["props"].get(key)
+                if key.startswith("@") or prop_def is None:
+                    continue
+                type_names = get_entity_type_names(prop_def["expected_type"])
+                if len(type_names) == 0:
+                    continue
+
+                dangling = []
+                resolved = []
+                for item in val if isinstance(val, list) else [val]:
+                    if isinstance(item, dict) and "@id" in item:
+                        target = self._resolve_reference(
+                            index, item, type_names, entity
+                        )
+                        if target is None:
+                            dangling.append(item["@id"])
+                        else:
+                            item = target
+                    resolved.append(item)
+                if isinstance(val, list):
+                    val[:] = resolved  # in place, e.g., hasPart may be shared
+                else:
+                    entity[key] = resolved[0]
+
+                if len(dangling) > 0:
+                    error.add(
+                        key,
+                        f"The referenced entities are not found in the crate: {dangling}.",
+                    )
+
+            if error.has_error():
+                crate_error.add(error)
+
+        if crate_error.has_error():
+            raise crate_error
+
+    @staticmethod
+    def _resolve_reference(
+        index: Dict[str, List[Entity]],
+        ref: Dict[str, Any],
+        type_names: List[str],
+        referrer: Entity,
+    ) -> Optional[Entity]:
+        """
+        Resolve a {"@id": ...} reference with the @id index of the crate.
+
+        Returns:
+            Optional[Entity]: The referenced entity, or None if it is not found.
+        """
+        candidates = index.get(ref["@id"], [])
+        if len(candidates) == 0:
+            return None
+
+        for narrow in (
+            lambda e: any(cls.__name__ in type_names for cls in type(e).__mro__),
+            lambda e: e.context == ref.get("@context", e.context),
+            lambda e: e.context == referrer.context,
+        ):
+            candidates = [e for e in candidates if narrow(e)] or candidates
+
+        return candidates[0]
+
+    @contextmanager
+    def validation_pass(self) -> Iterator[None]:
+        """
+        Share derived data between the entities validated within this context, e.g., a FileSizeIndex.
+
+        The crate must not be modified within the context. Nested passes reuse the outermost one.
+        """
+        if self._validation_cache is not None:
+            yield
+            return
+
+        self._validation_cache = {}
+        try:
+            yield
+        finally:
+            self._validation_cache = None
+
+    def cached(self, key: Hashable, build: Callable[[], T]) -> T:
+        """
+        Get a value derived from the crate, building it once per validation pass.
+
+        Outside of a validation pass, the value is built on every call.
+        It is safe to call from several threads, e.g., from the follow-up work of an entity while the pass is closing.
+
+        Args:
+            key (Hashable): The key of the value.
+            build (Callable[[], T]): The function to build the value.
+
+        Returns:
+            T: The value.
+        """
+        # the pass may be closed by another thread, so the cache is read once
+        cache = self._validation_cache
+        if cache is None:
+            return build()
+        cache_name = str(key[0]) if isinstance(key, tuple) else str(key)
+        with self._cache_lock:
+            if key in cache:
+                CACHE_REQUESTS.inc(cache=cache_name, result="hit")
+            else:
+                CACHE_REQUESTS.inc(cache=cache_name, result="miss")
+                cache[key] = build()
+            return cache[key]  # type: ignore
+
+    def get_entity_index(self, key: str) -> Dict[Hashable, List[Entity]]:
+        """
+        Group all entities by their @id or type, so that get_by_id() and get_by_type() do not scan the crate within a validation pass.
+
+        Args:
+            key (str): "id" or "type".
+
+        Returns:
+            Dict[Hashable, List[Entity]]: The entities of each @id or type, in the order of iter_entities().
+        """
+
+        def build() -> Dict[Hashable, List[Entity]]:
+            index: Dict[Hashable, List[Entity]] = {}
+            for entity in self.iter_entities():
+                index.setdefault(entity.id if key == "id" else type(entity), []).append(
+                    entity
+                )
+            return index
+
+        return self.cached(("entity_index", key), build)
+
+    def get_file_size_index(self, type_: Type[Entity], ref_prop: str) -> FileSizeIndex:
+        """
+        Get the total size of the entities of the given type, grouped by the @id they reference in `ref_prop`.
+
+        Args:
+            type_ (Type[Entity]): The type of the file entities, e.g., amed.File.
+            ref_prop (str): The prop referencing the grouping entity, e.g., "dmpDataNumber".
+
+        Returns:
+            FileSizeIndex: The index, shared within a validation pass.
+        """
+        return self.cached(
+            ("file_size_index", type_, ref_prop),
+            lambda: FileSizeIndex(self.get_by_type(type_), ref_prop),
+        )
+
     def from_jsonld(self, jsonld: Dict[str, Any]) -> None:
         """
         Deserialize an RO-Crate from JSON-LD.
@@ -183,52 +720,22 @@ class ROCrate:
             ValueError: If a required RootDataEntity and ROCrateMetadata entity is not found.
             ValueError: If an entity type is not found.
         """
-        if not isinstance(jsonld, dict):
-            raise TypeError("The JSON-LD data must be a dictionary.")
-        if "@context" not in jsonld:
-            raise ValueError("The JSON-LD data must have a '@context' key.")
-        if jsonld["@context"] != RO_CRATE_CONTEXT:
-            raise ValueError("The JSON-LD data must have the RO-Crate context.")
-        if "@graph" not in jsonld:
-            raise ValueError("The JSON-LD data must have a '@graph' key.")
+        check_crate_jsonld(jsonld)
 
         root_data_entity = None
         metadata_entity = None
         self.default_entities = []
-        self.data_entities = []
-        self.contextual_entities = []
+        self.data_entities = EntityList()
+        self.contextual_entities = EntityList()
 
         for entity in jsonld["@graph"]:
-            id_ = entity.get("@id")
-            if id_ is None:
-                raise ValueError(
-                    "The JSON-LD data must have an '@id' key for each entity."
-                )
-            type_ = entity.get("@type")
-            if type_ is None:
-                raise ValueError(
-                    "The JSON-LD data must have an '@type' key for each entity."
-                )
-
+            id_, type_ = get_id_and_type(entity)
             if id_ == "./" and type_ == "Dataset":
                 root_data_entity = RootDataEntity.from_jsonld(entity)
             elif id_ == "ro-crate-metadata.json" and type_ == "CreativeWork":
                 metadata_entity = ROCrateMetadata.from_jsonld(entity)
             else:
-                ctx = entity.get("@context", RO_CRATE_CONTEXT)
-                gh_repo, gh_ref, schema = parse_ctx(ctx)
-                entity_class = None
-                if DG_CONFIG["DG_USE_EXTERNAL_CTX"]:
-                    if gh_repo != GH_REPO:
-                        if DG_CONFIG["DG_ALLOW_OTHER_GH_REPO"] is False:
-                            raise ValueError(
-                                f"The context {ctx} which is generated by {gh_repo} is not supported."
-                            )
-                    entity_class = import_external_class(gh_repo, gh_ref, schema, type_)
-                else:
-                    entity_class = import_custom_class(f"nii_dg.schema.{schema}", type_)
-                if entity_class is None:
-                    raise ValueError(f"Entity type {type_} is not found.")
+                entity_class = get_entity_class(entity)
                 entity_instance = entity_class.from_jsonld(entity)
                 if isinstance(entity_instance, DataEntity):
                     self.data_entities.append(entity_instance)
@@ -244,6 +751,7 @@ class ROCrate:
 
         self.root = root_data_entity  # type: ignore
         self.default_entities = [self.root, metadata_entity]  # type: ignore
+        self._link_entities()
 
     def as_jsonld(self) -> Dict[str, Any]:
         """
@@ -257,20 +765,35 @@ class ROCrate:
 
         return {
             "@context": RO_CRATE_CONTEXT,
-            "@graph": [entity.as_jsonld() for entity in self.all_entities],
+            "@graph": [entity.as_jsonld() for entity in self.iter_entities()],
         }
 
     def dump(self, path: Union[str, Path]) -> None:
         """
         Dump the RO-Crate to a file.
 
+        The entities are written one by one, so the whole JSON-LD is not built in memory.
+        The output is the same as json.dump(crate.as_jsonld(), f, indent=2).
+
         Args:
             path (str): The path to the file to dump the RO-Crate to.
         """
-        with Path(path).resolve().open("w", encoding="utf-8") as f:
-            json.dump(self.as_jsonld(), f, indent=2)
+        self.check_duplicate_entity()
+        self.check_props()
 
-    def check_duplicate_entity(self) -> None:
+        with Path(path).resolve().open("w", encoding="utf-8") as f:
+            f.write(
+                '{\n  "@context": ' + json.dumps(RO_CRATE_CONTEXT) + ',\n  "@graph": ['
+            )
+            for i, entity in enumerate(self.iter_entities()):
+                entity_json = json.dumps(entity.as_jsonld(), indent=2)
+                f.write(("," if i > 0 else "") + "\n    ")
+                f.write(entity_json.replace("\n", "\n    "))
+            f.write("\n  ]\n}")
+
+    def check_duplicate_entity(
+        self, entities: Optional[Iterable[Entity]] = None
+    ) -> None:
         """
         Check for duplicate entities in the RO-Crate.
 
@@ -280,29 +803,44 @@ class ROCrate:
         However, if two entities have the same '@id' value and '@context' value, and both have 'name' property with different values, it becomes unclear which one is correct.
         Therefore, this case ('@id' and '@context' are same) is considered as an error and an exception is raised.
 
+        Args:
+            entities (Optional[Iterable[Entity]]): If given, only the @ids of these entities are checked, e.g., those of a validation closure.
+
         Raises:
             CrateError: If there are duplicate entities in the RO-Crate.
         """
-        id_ctx = [(entity.id, entity.context) for entity in self.all_entities]
-        dup_id_ctx = [
-            id_ctx[i] for i in range(len(id_ctx)) if id_ctx.count(id_ctx[i]) > 1
-        ]
+        if entities is None:
+            id_ctx = [(entity.id, entity.context) for entity in self.all_entities]
+        else:
+            id_ctx = [
+                (entity.id, entity.context)
+                for id_ in dict.fromkeys(entity.id for entity in entities)
+                for entity in self.get_by_id(id_)
+            ]
+        # a loaded @context may be a list or a dict, so it is counted as a string
+        keys = [(id_, get_context_key({"@context": ctx})) for id_, ctx in id_ctx]
+        counts = Counter(keys)
+        dup_id_ctx = [id_ctx[i] for i, key in enumerate(keys) if counts[key] > 1]
         if len(dup_id_ctx) > 0:
             raise CrateError(
                 f"Duplicate entities are found in the RO-Crate: {dup_id_ctx}"
             )
 
-    def check_props(self) -> None:
+    def check_props(self, entities: Optional[Iterable[Entity]] = None) -> None:
         """
         Check the properties of all entities in the RO-Crate.
 
+        Args:
+            entities (Optional[Iterable[Entity]]): If given, only these entities are checked, e.g., those of a validation closure.
+
         Raises:
             CrateCheckPropsError: If there are errors in the properties of the entities.
         """
         crate_error = CrateCheckPropsError()
-        for entity in self.all_entities:
+        for entity in self.iter_entities() if entities is None else entities:
             try:
-                entity.check_props()
+                with timed(CHECK_PROPS, entity=entity):
+                    entity.check_props()
             except EntityError as e:
                 crate_error.add(e)
             except Exception as e:
@@ -311,21 +849,40 @@ class ROCrate:
         if crate_error.has_error():
             raise crate_error
 
-    def validate(self) -> None:
+    def validate(self, profile: bool = False) -> Optional[Dict[str, Any]]:
         """
         Validate the RO-Crate.
 
+        Args:
+            profile (bool): If True, measure the time spent in the validation.
+
+        Returns:
+            Optional[Dict[str, Any]]: If `profile` is True, the profile report, i.e., the total time, the time per entity class,
+                and the slowest entities, URLs and checks. See nii_dg.profiling.Profiler.report().
+
         Raises:
-            CrateValidationError: If there are errors in the entities in the RO-Crate.
+            CrateValidationError: If there are errors in the entities in the RO-Crate. The profile report is attached as `profile`.
+            CancelledError: If the cancel token of the current context is cancelled. See nii_dg.cancellation.
         """
+        profiler = Profiler() if profile else None
         crate_error = CrateValidationError()
-        for entity in self.all_entities:
-            try:
-                entity.validate(self)
-            except EntityError as e:
-                crate_error.add(e)
-            except Exception as e:
-                raise e
-
+        start = time.perf_counter()
+        with activate(profiler), self.validation_pass():
+            for entity in self.iter_entities():
+                check_cancelled()
+                try:
+                    with timed(VALIDATE, entity=entity):
+                        entity.validate(self)
+                except EntityError as e:
+                    crate_error.add(e)
+                except Exception as e:
+                    raise e
+
+        report = None
+        if profiler is not None:
+            profiler.add_phase(VALIDATE, time.perf_counter() - start)
+            report = profiler.report(DG_CONFIG["DG_PROFILE_TOP"])
         if crate_error.has_error():
+            crate_error.profile = report
             raise crate_error
+        return report
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Build File and Dataset entities from a directory tree.
+
+The files are hashed in a thread pool with chunked reads (hashlib releases the GIL while digesting),
+so packaging a large results directory is bound by disk I/O rather than by a single Python thread.
+"""
+
+import argparse
+import json
+import mimetypes
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type, Union
+
+from nii_dg.check_functions import is_encoding_format
+from nii_dg.entity import Entity
+from nii_dg.hash_cache import HashCache
+from nii_dg.schema.base import Dataset, File
+from nii_dg.utils import compute_sha256, import_custom_class
+
+
+def walk_directory(
+    root_dir: Path,
+) -> Tuple[List[Path], List[Tuple[Path, os.stat_result]]]:
+    """
+    Walk a directory tree and collect its sub-directories and regular files.
+
+    Args:
+        root_dir (Path): The directory to walk.
+
+    Returns:
+        Tuple[List[Path], List[Tuple[Path, os.stat_result]]]: The sub-directories and the pairs of (file path, stat result), both in sorted order.
+    """
+    dirs: List[Path] = []
+    files: List[Tuple[Path, os.stat_result]] = []
+    stack = [root_dir]
+    while len(stack) > 0:
+        current = stack.pop()
+        sub_dirs = []
+        with os.scandir(current) as it:
+            for entry in sorted(it, key=lambda e: e.name):
+                if entry.is_dir(follow_symlinks=False):
+                    sub_dirs.append(Path(entry.path))
+                elif entry.is_file():
+                    files.append((Path(entry.path), entry.stat()))
+        dirs.extend(sub_dirs)
+        stack.extend(reversed(sub_dirs))
+
+    return sorted(dirs), sorted(files, key=lambda f: f[0])
+
+
+def guess_encoding_format(path: Path) -> Optional[str]:
+    """
+    Guess the MIME type of a file from its name.
+
+    Args:
+        path (Path): The path to the file.
+
+    Returns:
+        Optional[str]: The MIME type if it is a valid encoding format, None otherwise.
+    """
+    mime_type, _ = mimetypes.guess_type(path.name)
+    if mime_type is None or not is_encoding_format(mime_type):
+        return None
+    return mime_type
+
+
+def scan_directory(
+    root_dir: Union[str, Path],
+    file_class: Optional[Type[Entity]] = None,
+    dataset_class: Optional[Type[Entity]] = None,
+    base_dir: Optional[Union[str, Path]] = None,
+    file_props: Optional[Dict[str, Any]] = None,
+    with_datasets: bool = True,
+    with_sha256: bool = True,
+    max_workers: Optional[int] = None,
+    hash_cache: Optional[HashCache] = None,
+    verify_filter: Optional[Callable[[Path], bool]] = None,
+) -> List[Entity]:
+    """
+    Scan a directory tree and build File and Dataset entities for it.
+
+    Each File gets `name`, `contentSize` and, if the schema defines them, `encodingFormat` and `sha256`.
+    Each Dataset gets `name` and, if the schema defines it, `hasPart` listing the files directly under it.
+
+    Args:
+        root_dir (Union[str, Path]): The directory to scan.
+        file_class (Optional[Type[Entity]]): The File class to instantiate. Defaults to nii_dg.schema.base.File.
+        dataset_class (Optional[Type[Entity]]): The Dataset class to instantiate. Defaults to nii_dg.schema.base.Dataset.
+        base_dir (Optional[Union[str, Path]]): The directory the @id values are relative to, e.g., the RO-Crate root. Defaults to root_dir.
+            If it differs from root_dir, root_dir itself is also returned as a Dataset.
+        file_props (Optional[Dict[str, Any]]): Additional props set on every File, e.g., {"dmpDataNumber": dmp}.
+        with_datasets (bool): Whether to build Dataset entities for the directories. Defaults to True.
+        with_sha256 (bool): Whether to compute the sha256 of the files. Defaults to True.
+        max_workers (Optional[int]): The number of hashing threads. Defaults to the ThreadPoolExecutor default.
+        hash_cache (Optional[HashCache]): If given, unchanged files reuse their cached hash and only new or modified files are hashed.
+        verify_filter (Optional[Callable[[Path], bool]]): If given, the files for which it returns False get neither `contentSize` nor `sha256`,
+            so they are not hashed, e.g., reports that differ on every run and cannot be verified. Defaults to all files.
+
+    Returns:
+        List[Entity]: The Dataset entities followed by the File entities, in path order.
+
+    Raises:
+        NotADirectoryError: If root_dir is not a directory.
+        ValueError: If root_dir is not under base_dir.
+    """
+    file_cls: Type[Entity] = file_class or File
+    dataset_cls: Type[Entity] = dataset_class or Dataset
+
+    root_path = Path(root_dir).resolve()
+    if not root_path.is_dir():
+        raise NotADirectoryError(f"{root_dir} is not a directory.")
+    base_path = Path(base_dir).resolve() if base_dir is not None else root_path
+    if root_path != base_path and base_path not in root_path.parents:
+        raise ValueError(f"{root_dir} is not under {base_dir}.")
+
+    dirs, files = walk_directory(root_path)
+    if not with_datasets:
+        dirs = []
+    elif root_path != base_path:
+        dirs.insert(0, root_path)
+
+    file_props_def = file_cls.get_entity_def()["props"]
+    use_sha256 = with_sha256 and "sha256" in file_props_def
+    use_encoding_format = "encodingFormat" in file_props_def
+
+    verified = [verify_filter is None or verify_filter(p) for p, _ in files]
+    hashes: List[Optional[str]] = [None] * len(files)
+    if use_sha256:
+        targets = [f for f, verify in zip(files, verified) if verify]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            if hash_cache is None:
+                target_hashes = executor.map(compute_sha256, [p for p, _ in targets])
+            else:
+                target_hashes = executor.map(lambda f: hash_cache.sha256(*f), targets)
+            it = iter(list(target_hashes))
+        hashes = [next(it) if verify else None for verify in verified]
+
+    file_entities: Dict[Path, List[Entity]] = {}
+    for (path, stat), verify, sha256 in zip(files, verified, hashes):
+        props: Dict[str, Any] = {"name": path.name}
+        if verify:
+            props["contentSize"] = f"{stat.st_size}B"
+        if use_encoding_format:
+            encoding_format = guess_encoding_format(path)
+            if encoding_format is not None:
+                props["encodingFormat"] = encoding_format
+        if sha256 is not None:
+            props["sha256"] = sha256
+        if file_props is not None:
+            props.update(file_props)
+        file_ent = file_cls(path.relative_to(base_path).as_posix(), props)  # type: ignore
+        file_entities.setdefault(path.parent, []).append(file_ent)
+
+    dataset_entities: List[Entity] = []
+    for path in dirs:
+        props = {"name": path.name}
+        if "hasPart" in dataset_cls.get_entity_def()["props"]:
+            props["hasPart"] = list(file_entities.get(path, []))
+        dataset_entities.append(
+            dataset_cls(path.relative_to(base_path).as_posix() + "/", props)  # type: ignore
+        )
+
+    return [
+        *dataset_entities,
+        *[ent for path in sorted(file_entities) for ent in file_entities[path]],
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Scan a directory and print the File/Dataset entities as JSON-LD."
+    )
+    parser.add_argument("root_dir", help="The directory to scan.")
+    parser.add_argument(
+        "--schema",
+        help="The schema module of the File/Dataset classes (default: base)",
+        default="base",
+    )
+    parser.add_argument(
+        "--base-dir",
+        help="The directory the @id values are relative to (default: root_dir)",
+        default=None,
+    )
+    parser.add_argument(
+        "--workers",
+        help="The number of hashing threads",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--no-sha256", help="Do not compute sha256", action="store_true"
+    )
+    parser.add_argument(
+        "--hash-cache",
+        help="The JSON file to cache the sha256 of unchanged files in across runs",
+        default=None,
+    )
+    args = parser.parse_args()
+
+    file_class = import_custom_class(f"nii_dg.schema.{args.schema}", "File")
+    dataset_class = import_custom_class(f"nii_dg.schema.{args.schema}", "Dataset")
+    if file_class is None:
+        raise ValueError(f"Schema {args.schema} does not define File.")
+
+    hash_cache = HashCache(args.hash_cache) if args.hash_cache else None
+    entities = scan_directory(
+        args.root_dir,
+        file_class=file_class,
+        dataset_class=dataset_class,
+        base_dir=args.base_dir,
+        with_sha256=not args.no_sha256,
+        max_workers=args.workers,
+        hash_cache=hash_cache,
+    )
+    if hash_cache is not None:
+        hash_cache.save()
+    print(json.dumps([ent.as_jsonld() for ent in entities], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Scheduling of validation jobs by priority class and client.
+
+Jobs are queued by their priority class, e.g., "fast" for small requests, and within a class by the client that submitted them.
+get() returns a job of the first class in the given order that has any, taking turns between the clients of the class,
+so that a client submitting many jobs does not delay the jobs of other clients.
+
+    scheduler = JobScheduler()
+    scheduler.put("request-1", job, "bulk", "client-a")
+    scheduler.get(["fast", "bulk"], timeout=1)  # -> job
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from queue import Empty
+from typing import Any, Deque, Dict, Optional, Sequence, Tuple
+
+
+class JobScheduler:
+    """
+    A thread-safe queue of jobs by priority class and client.
+    """
+
+    def __init__(self) -> None:
+        # priority class -> client -> (key, job)
+        self._queues: Dict[str, "OrderedDict[str, Deque[Tuple[str, Any]]]"] = {}
+        self._size = 0
+        self._wakeups = 0
+        self._cond = threading.Condition()
+
+    def put(self, key: str, job: Any, priority: str, client: str) -> None:
+        """
+        Queue a job.
+
+        Args:
+            key (str): The key to remove the job by, e.g., the request ID.
+            job (Any): The job.
+            priority (str): The priority class of the job.
+            client (str): The client that submitted the job.
+        """
+        with self._cond:
+            clients = self._queues.setdefault(priority, OrderedDict())
+            clients.setdefault(client, deque()).append((key, job))
+            self._size += 1
+            self._cond.notify_all()
+
+    def _pop(self, priorities: Sequence[str]) -> Optional[Any]:
+        for priority in priorities:
+            clients = self._queues.get(priority)
+            if not clients:
+                continue
+            # the client at the head takes one job and goes to the end of the line
+            client, jobs = next(iter(clients.items()))
+            _, job = jobs.popleft()
+            if len(jobs) > 0:
+                clients.move_to_end(client)
+            else:
+                del clients[client]
+            self._size -= 1
+            return job
+        return None
+
+    def get(self, priorities: Sequence[str], timeout: Optional[float] = None) -> Any:
+        """
+        Take the next job of the given priority classes.
+
+        Args:
+            priorities (Sequence[str]): The priority classes to take a job of, in the order of priority.
+            timeout (Optional[float]): The seconds to wait for a job. If None, wait until a job is queued.
+
+        Returns:
+            Any: The job.
+
+        Raises:
+            queue.Empty: If no job is queued within the timeout, or wake() is called in the meantime.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            wakeups = self._wakeups
+            while True:
+                job = self._pop(priorities)
+                if job is not None:
+                    return job
+                remaining = None if deadline is None else deadline - time.monotonic()
+                timed_out = remaining is not None and remaining <= 0
+                if timed_out or self._wakeups != wakeups:
+                    raise Empty
+                self._cond.wait(remaining)
+
+    def wake(self) -> None:
+        """
+        Make the waiting get() calls return early with queue.Empty, e.g., when their caller has other work to do.
+        """
+        with self._cond:
+            self._wakeups += 1
+            self._cond.notify_all()
+
+    def remove(self, key: str) -> bool:
+        """
+        Remove a queued job, e.g., when it is cancelled.
+
+        Returns:
+            bool: True if the job was queued, False if it was already taken or never queued.
+        """
+        with self._cond:
+            for clients in self._queues.values():
+                for client, jobs in clients.items():
+                    for item in jobs:
+                        if item[0] == key:
+                            jobs.remove(item)
+                            if len(jobs) == 0:
+                                del clients[client]
+                            self._size -= 1
+                            return True
+        return False
+
+    def qsize(self, priority: Optional[str] = None, client: Optional[str] = None) -> int:
+        """
+        Get the number of queued jobs, optionally only of a priority class and/or a client.
+        """
+        with self._cond:
+            if priority is None and client is None:
+                return self._size
+            return sum(
+                len(jobs)
+                for queue_priority, clients in self._queues.items()
+                if priority is None or queue_priority == priority
+                for queue_client, jobs in clients.items()
+                if client is None or queue_client == client
+            )
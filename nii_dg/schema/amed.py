@@ -2,14 +2,14 @@
 # coding: utf-8
 
 from pathlib import Path
-from typing import TYPE_CHECKING, Any, Dict
+from typing import TYPE_CHECKING, Any, Dict, List, Type
 
 from nii_dg.check_functions import (check_entity_values, is_absolute_path,
                                     is_iso8601, is_url, is_url_accessible)
-from nii_dg.entity import ContextualEntity, EntityDef
+from nii_dg.entity import ContextualEntity, Entity, EntityDef
 from nii_dg.error import EntityError
 from nii_dg.schema.base import File as BaseFile
-from nii_dg.utils import load_schema_file, sum_file_size
+from nii_dg.utils import load_schema_file
 
 if TYPE_CHECKING:
     from nii_dg.ro_crate import ROCrate
@@ -51,6 +51,10 @@ class DMPMetadata(ContextualEntity):
         if error.has_error():
             raise error
 
+    @classmethod
+    def get_queried_types(cls) -> List[Type[Entity]]:
+        return [DMP]
+
     def validate(self, crate: "ROCrate") -> None:
         super().validate(crate)
 
@@ -113,6 +117,10 @@ class DMP(ContextualEntity):
         if error.has_error():
             raise error
 
+    @classmethod
+    def get_queried_types(cls) -> List[Type[Entity]]:
+        return [DMPMetadata, File]
+
     def validate(self, crate: "ROCrate") -> None:
         super().validate(crate)
 
@@ -165,12 +173,9 @@ class DMP(ContextualEntity):
             )
 
         if "contentSize" in self:
-            target_files = []
-            for ent in crate.get_by_type(File):
-                if ent["dmpDataNumber"] == self:
-                    target_files.append(ent)
-
-            sum_size = sum_file_size(self["contentSize"][-2:], target_files)
+            sum_size = crate.get_file_size_index(File, "dmpDataNumber").total_size(
+                self.id, self["contentSize"][-2:]
+            )
 
             if self["contentSize"] != "over100GB" and sum_size > int(
                 self["contentSize"][:-2]
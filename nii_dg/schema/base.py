@@ -5,6 +5,7 @@ from pathlib import Path
 from typing import TYPE_CHECKING, Any, Dict, List
 from urllib.request import urlopen
 
+from nii_dg.cancellation import get_timeout
 from nii_dg.check_functions import (check_entity_values, is_absolute_path,
                                     is_content_size, is_email,
                                     is_encoding_format, is_iso8601, is_orcid,
@@ -12,7 +13,8 @@ from nii_dg.check_functions import (check_entity_values, is_absolute_path,
                                     is_sha256, is_url, is_url_accessible)
 from nii_dg.entity import ContextualEntity, DataEntity, EntityDef
 from nii_dg.error import EntityError
-from nii_dg.utils import load_schema_file
+from nii_dg.profiling import HTTP, timed
+from nii_dg.utils import DG_CONFIG, load_schema_file
 
 if TYPE_CHECKING:
     from nii_dg.ro_crate import ROCrate
@@ -127,8 +129,13 @@ class Organization(ContextualEntity):
 
         Raises:
             urllib.error.HTTPError: If the ROR API returns an error.
+            CancelledError: If the validation is cancelled.
+            TimeoutError: If the deadline of the validation is exceeded.
         """
-        with urlopen(f"https://api.ror.org/organizations/{ror_id}") as res:
+        url = f"https://api.ror.org/organizations/{ror_id}"
+        with timed(HTTP, url), urlopen(
+            url, timeout=get_timeout(DG_CONFIG["DG_HTTP_TIMEOUT"])
+        ) as res:
             json = res.read().decode("utf-8")
             name_list = [json["name"]]
             name_list.extend(json["aliases"])
@@ -2,16 +2,16 @@
 # coding: utf-8
 
 from pathlib import Path
-from typing import TYPE_CHECKING, Any, Dict
+from typing import TYPE_CHECKING, Any, Dict, List, Type
 
 from nii_dg.check_functions import (check_entity_values, is_absolute_path,
                                     is_iso8601, is_orcid, is_url,
                                     is_url_accessible)
-from nii_dg.entity import ContextualEntity, EntityDef
+from nii_dg.entity import ContextualEntity, Entity, EntityDef
 from nii_dg.error import EntityError
 from nii_dg.schema.base import File as BaseFile
 from nii_dg.schema.base import Person as BasePerson
-from nii_dg.utils import load_schema_file, sum_file_size
+from nii_dg.utils import load_schema_file
 
 if TYPE_CHECKING:
     from nii_dg.ro_crate import ROCrate
@@ -47,6 +47,10 @@ class DMPMetadata(ContextualEntity):
         if error.has_error():
             raise error
 
+    @classmethod
+    def get_queried_types(cls) -> List[Type[Entity]]:
+        return [DMP]
+
     def validate(self, crate: "ROCrate") -> None:
         super().validate(crate)
 
@@ -96,6 +100,10 @@ class DMP(ContextualEntity):
         if error.has_error():
             raise error
 
+    @classmethod
+    def get_queried_types(cls) -> List[Type[Entity]]:
+        return [DMPMetadata, File]
+
     def validate(self, crate: "ROCrate") -> None:
         super().validate(crate)
 
@@ -139,12 +147,9 @@ class DMP(ContextualEntity):
             error.add("license", "This property is required, but not found.")
 
         if "contentSize" in self:
-            target_files = []
-            for ent in crate.get_by_type(File):
-                if ent["dmpDataNumber"] == self:
-                    target_files.append(ent)
-
-            sum_size = sum_file_size(self["contentSize"][-2:], target_files)
+            sum_size = crate.get_file_size_index(File, "dmpDataNumber").total_size(
+                self.id, self["contentSize"][-2:]
+            )
 
             if self["contentSize"] != "over100GB" and sum_size > int(
                 self["contentSize"][:-2]
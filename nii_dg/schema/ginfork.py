@@ -2,10 +2,10 @@
 # coding: utf-8
 
 from pathlib import Path
-from typing import TYPE_CHECKING, Any, Dict
+from typing import TYPE_CHECKING, Any, Dict, List, Type
 
 from nii_dg.check_functions import is_absolute_path, is_url
-from nii_dg.entity import ContextualEntity, EntityDef
+from nii_dg.entity import ContextualEntity, Entity, EntityDef
 from nii_dg.error import EntityError
 from nii_dg.schema.base import Dataset
 from nii_dg.schema.base import File as BaseFile
@@ -43,6 +43,10 @@ class GinMonitoring(ContextualEntity):
     def check_props(self) -> None:
         super().check_props()
 
+    @classmethod
+    def get_queried_types(cls) -> List[Type[Entity]]:
+        return [File, Dataset]
+
     def validate(self, crate: "ROCrate") -> None:
         super().validate(crate)
 
@@ -2,14 +2,14 @@
 # coding: utf-8
 
 from pathlib import Path
-from typing import TYPE_CHECKING, Any, Dict
+from typing import TYPE_CHECKING, Any, Dict, List, Type
 
 from nii_dg.check_functions import (check_entity_values, is_absolute_path,
                                     is_iso8601, is_url)
-from nii_dg.entity import ContextualEntity, EntityDef
+from nii_dg.entity import ContextualEntity, Entity, EntityDef, get_ref_id
 from nii_dg.error import EntityError
 from nii_dg.schema.base import File as BaseFile
-from nii_dg.utils import load_schema_file, sum_file_size
+from nii_dg.utils import load_schema_file
 
 if TYPE_CHECKING:
     from nii_dg.ro_crate import ROCrate
@@ -45,6 +45,10 @@ class DMPMetadata(ContextualEntity):
         if error.has_error():
             raise error
 
+    @classmethod
+    def get_queried_types(cls) -> List[Type[Entity]]:
+        return [DMP]
+
     def validate(self, crate: "ROCrate") -> None:
         super().validate(crate)
 
@@ -56,10 +60,8 @@ class DMPMetadata(ContextualEntity):
                 "The value of this property MUST be the RootDataEntity of this crate.",
             )
         if len(self["hasPart"]) != len(crate.get_by_type(DMP)):
-            diff = []
-            for dmp in crate.get_by_type(DMP):
-                if dmp not in self["hasPart"]:
-                    diff.append(dmp)
+            part_ids = {get_ref_id(part) for part in self["hasPart"]}
+            diff = [dmp for dmp in crate.get_by_type(DMP) if dmp.id not in part_ids]
             error.add(
                 "hasPart", f"There is an omission of DMP entity in the list: {diff}."
             )
@@ -94,6 +96,10 @@ class DMP(ContextualEntity):
         if error.has_error():
             raise error
 
+    @classmethod
+    def get_queried_types(cls) -> List[Type[Entity]]:
+        return [DMPMetadata, File]
+
     def validate(self, crate: "ROCrate") -> None:
         super().validate(crate)
 
@@ -153,12 +159,9 @@ class DMP(ContextualEntity):
             error.add("contactPoint", "This property is required, but not found.")
 
         if "contentSize" in self:
-            target_files = []
-            for ent in crate.get_by_type(File):
-                if ent["dmpDataNumber"] == self:
-                    target_files.append(ent)
-
-            sum_size = sum_file_size(self["contentSize"][-2:], target_files)
+            sum_size = crate.get_file_size_index(File, "dmpDataNumber").total_size(
+                self.id, self["contentSize"][-2:]
+            )
 
             if self["contentSize"] != "over100GB" and sum_size > int(
                 self["contentSize"][:-2]
@@ -6,23 +6,32 @@ This schema is for validation of workflow execution using sapporo-service.
 For more information about sapporo-service, please see https://github.com/sapporo-wes/sapporo-service
 """
 
-import hashlib
+import contextvars
+import heapq
+import itertools
 import json
 import logging
-import tempfile
+import socket
+import threading
 import time
+from concurrent.futures import (CancelledError, Executor, Future,
+                                ThreadPoolExecutor, as_completed)
+from http.client import (HTTPConnection, HTTPException, HTTPResponse,
+                         HTTPSConnection)
 from pathlib import Path
-from typing import TYPE_CHECKING, Any, Dict, List
-from urllib.parse import urlencode
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Type
+from urllib.parse import quote, urlencode, urljoin, urlparse
 from urllib.request import Request, urlopen
 
+from nii_dg.cancellation import check_cancelled, get_cancel_token, get_timeout
 from nii_dg.check_functions import (check_entity_values, is_absolute_path,
                                     is_relative_path, is_url)
 from nii_dg.entity import ContextualEntity, Entity, EntityDef
 from nii_dg.error import EntityError
+from nii_dg.profiling import HTTP, timed
 from nii_dg.schema.base import Dataset as BaseDataset
 from nii_dg.schema.base import File as BaseFile
-from nii_dg.utils import load_schema_file
+from nii_dg.utils import DG_CONFIG, chain_future, hash_stream, load_schema_file
 
 if TYPE_CHECKING:
     from nii_dg.ro_crate import ROCrate
@@ -34,6 +43,9 @@ SCHEMA_DEF = load_schema_file(SCHEMA_FILE_PATH)
 
 flask_log = logging.getLogger("flask.app")
 
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+MAX_REDIRECTS = 5
+
 
 class File(BaseFile):
     def __init__(
@@ -59,6 +71,10 @@ class File(BaseFile):
         if error.has_error():
             raise error
 
+    @classmethod
+    def get_queried_types(cls) -> List[Type[Entity]]:
+        return [SapporoRun]
+
     def validate(self, crate: "ROCrate") -> None:
         super().validate(crate)
 
@@ -101,6 +117,10 @@ class Dataset(BaseDataset):
         if error.has_error():
             raise error
 
+    @classmethod
+    def get_queried_types(cls) -> List[Type[Entity]]:
+        return [SapporoRun]
+
     def validate(self, crate: "ROCrate") -> None:
         super().validate(crate)
 
@@ -172,7 +192,9 @@ class SapporoRun(ContextualEntity):
         # remove trailing slash from endpoint
         request = Request(f"{endpoint.rstrip('/')}/runs", data=data)  # type: ignore
 
-        with urlopen(request) as response:
+        with timed(HTTP, request.full_url), urlopen(
+            request, timeout=get_timeout(DG_CONFIG["DG_HTTP_TIMEOUT"])
+        ) as response:
             result = json.load(response)
         if "run_id" not in result:
             raise ValueError(result)
@@ -183,60 +205,101 @@ class SapporoRun(ContextualEntity):
     def get_run_status(cls, endpoint: str, run_id: str) -> str:
         request = Request(f"{endpoint.rstrip('/')}/runs/{run_id}/status")
 
-        with urlopen(request) as response:
+        with timed(HTTP, request.full_url), urlopen(
+            request, timeout=get_timeout(DG_CONFIG["DG_HTTP_TIMEOUT"])
+        ) as response:
             result = json.load(response)
         if "state" not in result:
             raise ValueError(result)
 
         return result["state"]  # type: ignore
 
-    @classmethod
-    def sleep(cls, iter_num: int) -> None:
-        """\
-        Up to 1 minute, every 10 seconds: 10 * 6
-        Up to 5 minutes, every 30 seconds: 10 * 6 + 30 * 8
-        Up to 60 minutes, every 1 minute: 10 * 6 + 30 * 8 + 60 * 55
-        Beyond that, every 2 minutes
-        """
-        if iter_num < 6:
-            time.sleep(10)
-        elif iter_num < 15:
-            time.sleep(30)
-        elif iter_num < 69:
-            time.sleep(60)
-        else:
-            time.sleep(120)
-
     @classmethod
     def get_run_log(cls, endpoint: str, run_id: str) -> Dict[str, Any]:
         request = Request(f"{endpoint.rstrip('/')}/runs/{run_id}")
 
-        with urlopen(request) as response:
+        with timed(HTTP, request.full_url), urlopen(
+            request, timeout=get_timeout(DG_CONFIG["DG_HTTP_TIMEOUT"])
+        ) as response:
             result = json.load(response)
 
         return result  # type: ignore
 
-    def validate(self, crate: "ROCrate") -> None:
-        super().validate(crate)
-
+    def start_run(self) -> str:
+        """\
+        Re-execute the workflow on sapporo and return the run ID.
+        """
         error = EntityError(self)
-
-        endpoint = self["sapporo_location"]
         run_request = self.generate_run_request_json(self)
+        check_cancelled()
         try:
-            run_id = self.execute_wf(run_request, endpoint)
+            return self.execute_wf(run_request, self["sapporo_location"])
         except Exception as err:
             error.add("sapporo_location", f"Failed to execute workflow: {err}.")
             raise error from None
 
-        status = self.get_run_status(endpoint, run_id)
-        iter_num = 0
+    def validate(self, crate: "ROCrate") -> None:
+        super().validate(crate)
+
+        run_id = self.start_run()
+        try:
+            status = self.watch_run(run_id).result()
+        except CancelledError:
+            check_cancelled()  # raises TimeoutError if the deadline is exceeded
+            raise
+        self.check_run(crate, run_id, status)
+
+    def watch_run(self, run_id: str) -> "Future[str]":
+        """\
+        Track the run by the run poller. The returned Future is cancelled when the validation is cancelled.
+        """
+        watch = get_run_poller().watch(self["sapporo_location"], run_id)
+        token = get_cancel_token()
+        if token is not None:
+            token.add_callback(watch.cancel)
+        return watch
+
+    def validate_async(self, crate: "ROCrate", executor: Executor) -> "Future[None]":
+        """\
+        Re-execute the workflow and return immediately.
+        The run is tracked by the run poller without occupying a thread, and once it finishes,
+        its outputs are checked in `executor`.
+        """
+        result: "Future[None]" = Future()
+        try:
+            super().validate(crate)
+            run_id = self.start_run()
+        except BaseException as err:
+            result.set_exception(err)
+            return result
+        # check the run in the context of the caller, e.g., with its profiler
+        context = contextvars.copy_context()
+        token = get_cancel_token()
+
+        def on_finished(watch: "Future[str]") -> None:
+            if watch.cancelled():
+                # TimeoutError if the deadline is exceeded
+                err = token.exception() if token is not None else None
+                result.set_exception(err or CancelledError())
+                return
+            err = watch.exception()
+            if err is not None:
+                result.set_exception(err)
+                return
+            check = executor.submit(
+                context.run, self.check_run, crate, run_id, watch.result()
+            )
+            chain_future(check, result)
+
+        self.watch_run(run_id).add_done_callback(on_finished)
+        return result
 
-        while status in RUNNING:
-            self.sleep(iter_num)
-            status = self.get_run_status(endpoint, run_id)
-            flask_log.debug(f"Status of sapporo run {run_id} is {status}.")
-            iter_num += 1
+    def check_run(self, crate: "ROCrate", run_id: str, status: str) -> None:
+        """\
+        Compare the finished run with the state and outputs recorded in this entity.
+        """
+        error = EntityError(self)
+        endpoint = self["sapporo_location"]
 
         prev_status = self["state"]
         if status != prev_status:
@@ -273,43 +336,390 @@ class SapporoRun(ContextualEntity):
             elif isinstance(ent, File):
                 outputs_entities.append(ent)
 
+        check_cancelled()
         run_log = self.get_run_log(endpoint, run_id)
         file_names = [output["file_name"] for output in run_log["outputs"]]
-        with tempfile.TemporaryDirectory() as tmp_dir:
-            tmp_dir_path = Path(tmp_dir)
-            for file_name in file_names:
-                file_path = tmp_dir_path.joinpath(file_name)
-                file_path.parent.mkdir(parents=True, exist_ok=True)
-                with urlopen(
-                    f"{endpoint.rstrip('/')}/runs/{run_id}/data/outputs/{file_name}"
-                ) as response:
-                    with open(file_path, "wb") as f:
-                        f.write(response.read())
-                prev_file_entities = [
-                    ent for ent in outputs_entities if file_name == ent["name"]
-                ]
-                if len(prev_file_entities) == 0:
+        outputs_dir = DG_CONFIG["DG_SAPPORO_OUTPUTS_DIR"]
+        # the first entity of each name, looked up for each output of the run
+        outputs_by_name: Dict[str, Entity] = {}
+        for ent in outputs_entities:
+            outputs_by_name.setdefault(ent["name"], ent)
+        targets: Dict[str, Entity] = {}
+        for file_name in file_names:
+            if file_name not in outputs_by_name:
+                error.add(
+                    "outputs",
+                    f"The file {file_name} is included in the result of re-execution, but this crate does not have File entity with @id {file_name}.",
+                )
+                raise error
+            prev_file_ent = outputs_by_name[file_name]
+            if "contentSize" in prev_file_ent or "sha256" in prev_file_ent:
+                targets[file_name] = prev_file_ent
+
+        dests: Dict[str, Optional[Path]] = {}
+        for file_name in targets:
+            dests[file_name] = None
+            if outputs_dir:
+                dests[file_name] = get_output_path(outputs_dir, run_id, file_name)
+                if dests[file_name] is None:
                     error.add(
                         "outputs",
-                        f"The file {file_name} is included in the result of re-execution, but this crate does not have File entity with @id {file_name}.",
+                        f"The file {file_name} of the run {run_id} cannot be saved, as its path is outside DG_SAPPORO_OUTPUTS_DIR.",
                     )
-                    raise error
-                prev_file_ent = prev_file_entities[0]
-
-                if "contentSize" in prev_file_ent:
-                    content_size = f"{file_path.stat().st_size}B"
-                    if content_size != prev_file_ent["contentSize"]:
-                        error.add(
-                            "outputs",
-                            "The file size of {file_name}, {content_size}, does not match the `contentSize` value in {prev_file_ent}.",
-                        )
-                if "sha256" in prev_file_ent:
-                    sha256 = hashlib.sha256(file_path.read_bytes()).hexdigest()
-                    if sha256 != prev_file_ent["sha256"]:
-                        error.add(
-                            "outputs",
-                            "The hash of {file_name} does not match the `sha256` value in {prev_file_ent}.",
-                        )
+        if error.has_error():
+            raise error
+
+        fail_fast = DG_CONFIG["DG_SAPPORO_FAIL_FAST"]
+        token = get_cancel_token()
+        futures: Dict["Future[Tuple[int, str]]", str] = {}
+        with OutputDownloader(
+            endpoint, run_id, get_timeout(DG_CONFIG["DG_HTTP_TIMEOUT"])
+        ) as downloader:
+            executor = ThreadPoolExecutor(
+                max_workers=DG_CONFIG["DG_SAPPORO_DOWNLOAD_WORKERS"]
+            )
+            try:
+                if token is not None:
+                    # the running downloads are aborted and the others are skipped
+                    token.add_callback(downloader.cancel)
+                for file_name in targets:
+                    future = executor.submit(
+                        downloader.fetch, file_name, dests[file_name]
+                    )
+                    futures[future] = file_name
+                self._verify_outputs(futures, targets, error, fail_fast)
+            finally:
+                # stop the downloads left, e.g., after the first mismatch, without waiting for them
+                downloader.cancel()
+                for future in futures:
+                    future.cancel()
+                executor.shutdown(wait=False)
 
         if error.has_error():
             raise error
+
+    def _verify_outputs(
+        self,
+        futures: Dict["Future[Tuple[int, str]]", str],
+        targets: Dict[str, Entity],
+        error: EntityError,
+        fail_fast: bool,
+    ) -> None:
+        """\
+        Compare the size and hash of each output with its File entity as soon as its download finishes.
+        """
+        for future in as_completed(futures):
+            check_cancelled()
+            file_name = futures[future]
+            prev_file_ent = targets[file_name]
+            try:
+                size, sha256 = future.result()
+            except CancelledError:
+                check_cancelled()  # raises TimeoutError if the deadline is exceeded
+                raise
+
+            if "contentSize" in prev_file_ent:
+                content_size = f"{size}B"
+                if content_size != prev_file_ent["contentSize"]:
+                    error.add(
+                        "outputs",
+                        f"The file size of {file_name}, {content_size}, does not match the `contentSize` value in {prev_file_ent}.",
+                    )
+            if "sha256" in prev_file_ent:
+                if sha256 != prev_file_ent["sha256"]:
+                    error.add(
+                        "outputs",
+                        f"The hash of {file_name} does not match the `sha256` value in {prev_file_ent}.",
+                    )
+
+            if fail_fast and error.has_error():
+                return
+
+
+class PollingBackoff:
+    """\
+    Adaptive polling interval for sapporo runs.
+    The interval starts at `initial` seconds and grows by `factor` at every poll that sees the same state,
+    up to `maximum` seconds. It is reset to `initial` whenever the state changes, e.g., QUEUED -> RUNNING.
+    Defaults are taken from DG_SAPPORO_POLL_INITIAL, DG_SAPPORO_POLL_MAX and DG_SAPPORO_POLL_FACTOR.
+    """
+
+    def __init__(
+        self,
+        initial: Optional[float] = None,
+        maximum: Optional[float] = None,
+        factor: Optional[float] = None,
+    ) -> None:
+        self.initial = (
+            initial if initial is not None else DG_CONFIG["DG_SAPPORO_POLL_INITIAL"]
+        )
+        self.maximum = (
+            maximum if maximum is not None else DG_CONFIG["DG_SAPPORO_POLL_MAX"]
+        )
+        self.factor = (
+            factor if factor is not None else DG_CONFIG["DG_SAPPORO_POLL_FACTOR"]
+        )
+
+    def next_interval(self, interval: Optional[float], state_changed: bool) -> float:
+        if interval is None or state_changed:
+            return float(self.initial)
+        return float(min(interval * self.factor, self.maximum))
+
+
+class WatchedRun:
+    def __init__(self, endpoint: str, run_id: str) -> None:
+        self.endpoint = endpoint
+        self.run_id = run_id
+        self.future: "Future[str]" = Future()
+        self.status: Optional[str] = None
+        self.interval: Optional[float] = None
+
+
+class RunPoller:
+    """\
+    Tracks many sapporo runs from a single timer thread.
+
+    `watch()` returns a Future that is resolved with the final state of the run.
+    No thread is blocked while a run is executing; the status requests are made by a small pool only when a poll is due.
+    Cancelling the returned Future stops watching the run.
+    """
+
+    def __init__(
+        self,
+        backoff: Optional[PollingBackoff] = None,
+        max_workers: Optional[int] = None,
+    ) -> None:
+        self.backoff = backoff
+        self.max_workers: int = (
+            max_workers
+            if max_workers is not None
+            else DG_CONFIG["DG_SAPPORO_POLL_WORKERS"]
+        )
+        self._heap: List[Tuple[float, int, WatchedRun]] = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._runs: Dict[int, WatchedRun] = {}
+
+    def watch(self, endpoint: str, run_id: str) -> "Future[str]":
+        """\
+        Start tracking a run; the first status request is made immediately.
+        """
+        run = WatchedRun(endpoint, run_id)
+        with self._cond:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="sapporo-poller"
+                )
+                threading.Thread(target=self._loop, daemon=True).start()
+            self._runs[id(run)] = run
+        run.future.add_done_callback(lambda _: self._forget(run))
+        self._schedule(run, 0.0)
+        return run.future
+
+    def tracked_runs(self) -> int:
+        """\
+        Return the number of runs that are being tracked.
+        """
+        with self._cond:
+            return len(self._runs)
+
+    def _forget(self, run: WatchedRun) -> None:
+        with self._cond:
+            self._runs.pop(id(run), None)
+
+    def _schedule(self, run: WatchedRun, delay: float) -> None:
+        with self._cond:
+            heapq.heappush(
+                self._heap, (time.monotonic() + delay, next(self._counter), run)
+            )
+            self._cond.notify()
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                while len(self._heap) == 0 or self._heap[0][0] > time.monotonic():
+                    timeout = (
+                        self._heap[0][0] - time.monotonic() if self._heap else None
+                    )
+                    self._cond.wait(timeout)
+                _, _, run = heapq.heappop(self._heap)
+                executor = self._executor
+            if not run.future.done():
+                executor.submit(self._poll, run)  # type: ignore
+
+    def _poll(self, run: WatchedRun) -> None:
+        try:
+            status = SapporoRun.get_run_status(run.endpoint, run.run_id)
+        except BaseException as err:
+            if not run.future.done():
+                run.future.set_exception(err)
+            return
+        flask_log.debug(f"Status of sapporo run {run.run_id} is {status}.")
+
+        if status not in RUNNING:
+            if not run.future.done():
+                run.future.set_result(status)
+            return
+
+        backoff = self.backoff or PollingBackoff()
+        run.interval = backoff.next_interval(run.interval, status != run.status)
+        run.status = status
+        self._schedule(run, run.interval)
+
+
+_run_poller: Optional[RunPoller] = None
+_run_poller_lock = threading.Lock()
+
+
+def get_run_poller() -> RunPoller:
+    """\
+    Return the RunPoller shared by all sapporo runs.
+    It is created on first use, so importing this module starts no threads.
+    """
+    global _run_poller
+    with _run_poller_lock:
+        if _run_poller is None:
+            _run_poller = RunPoller()
+        return _run_poller
+
+
+def get_output_path(outputs_dir: str, run_id: str, file_name: str) -> Optional[Path]:
+    """\
+    Return the path to save an output of a run, i.e., `{outputs_dir}/{run_id}/{file_name}`.
+    Both run_id and file_name are given by the sapporo server, so None is returned
+    if they lead outside the directory of the run, e.g., by `..`, an absolute path or a symlink.
+    """
+    base_dir = Path(outputs_dir).resolve()
+    run_dir = base_dir.joinpath(run_id).resolve()
+    dest = run_dir.joinpath(file_name).resolve()
+    try:
+        if run_dir.relative_to(base_dir) == Path(".") or dest == run_dir:
+            return None
+        dest.relative_to(run_dir)
+    except ValueError:
+        return None
+    return dest
+
+
+class OutputDownloader:
+    """\
+    Downloads the outputs of a sapporo run over keep-alive HTTP connections, one per worker thread,
+    so concurrent downloads do not pay a TCP/TLS handshake per file.
+    """
+
+    def __init__(
+        self, endpoint: str, run_id: str, timeout: Optional[float] = None
+    ) -> None:
+        parsed = urlparse(endpoint)
+        # the timeout of each blocking socket operation
+        self.timeout = timeout if timeout is not None else DG_CONFIG["DG_HTTP_TIMEOUT"]
+        self.scheme = parsed.scheme
+        self.netloc = parsed.netloc
+        self.base_path = f"{parsed.path.rstrip('/')}/runs/{quote(run_id)}/data/outputs"
+        self._local = threading.local()
+        self._connections: List[HTTPConnection] = []
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+
+    def __enter__(self) -> "OutputDownloader":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def _connection(self, renew: bool = False) -> HTTPConnection:
+        conn: Optional[HTTPConnection] = getattr(self._local, "conn", None)
+        if conn is not None and renew:
+            conn.close()
+            conn = None
+        if conn is None:
+            if self.scheme == "https":
+                conn = HTTPSConnection(self.netloc, timeout=self.timeout)
+            else:
+                conn = HTTPConnection(self.netloc, timeout=self.timeout)
+            self._local.conn = conn
+            with self._lock:
+                if self._cancelled.is_set():
+                    conn.close()
+                    raise CancelledError()
+                self._connections.append(conn)
+        return conn
+
+    def _request(self, path: str) -> HTTPResponse:
+        try:
+            conn = self._connection()
+            conn.request("GET", path)
+            return conn.getresponse()
+        except (ConnectionError, HTTPException):
+            # the server may have closed the idle keep-alive connection; retry once on a new one
+            conn = self._connection(renew=True)
+            conn.request("GET", path)
+            return conn.getresponse()
+
+    def _open(self, file_name: str) -> HTTPResponse:
+        """\
+        Request an output file, following redirects. A redirect to the same server reuses the keep-alive connection,
+        and one to another server, e.g., a pre-signed URL of an object storage, is opened by urlopen().
+        """
+        path = f"{self.base_path}/{quote(file_name)}"
+        for _ in range(MAX_REDIRECTS + 1):
+            response = self._request(path)
+            location = response.getheader("Location")
+            if response.status not in REDIRECT_STATUSES or location is None:
+                break
+            response.read()
+            url = urljoin(f"{self.scheme}://{self.netloc}{path}", location)
+            parsed = urlparse(url)
+            if (parsed.scheme, parsed.netloc) != (self.scheme, self.netloc):
+                return urlopen(url, timeout=self.timeout)  # type: ignore
+            path = f"{parsed.path}?{parsed.query}" if parsed.query else parsed.path
+        if response.status != 200:
+            response.read()
+            raise ValueError(
+                f"Failed to download {file_name}: {response.status} {response.reason}"
+            )
+        return response
+
+    def fetch(self, file_name: str, dest: Optional[Path] = None) -> Tuple[int, str]:
+        """\
+        Stream an output file, computing its size and sha256 while downloading.
+        The file is written to `dest` only if it is given.
+        """
+        if self._cancelled.is_set():
+            raise CancelledError()
+        try:
+            with self._open(file_name) as response:
+                if dest is None:
+                    result = hash_stream(response)  # type: ignore
+                else:
+                    dest.parent.mkdir(parents=True, exist_ok=True)
+                    with dest.open("wb") as f:
+                        result = hash_stream(response, sink=f)  # type: ignore
+        except (OSError, HTTPException) as err:
+            if self._cancelled.is_set():
+                raise CancelledError() from err
+            raise
+        if self._cancelled.is_set():
+            # the download may have been cut short by cancel()
+            raise CancelledError()
+        return result
+
+    def cancel(self) -> None:
+        """\
+        Abort the running downloads and make the others raise CancelledError.
+        """
+        self._cancelled.set()
+        self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            for conn in self._connections:
+                if conn.sock is not None:
+                    # a read blocked in another thread returns at once
+                    try:
+                        conn.sock.shutdown(socket.SHUT_RDWR)
+                    except OSError:
+                        pass
+                conn.close()
+            self._connections.clear()
@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Storage backends holding the entities of an RO-Crate as JSON-LD objects, outside of Entity instances.
+
+A stored entity has a key, a kind, a schema name and a JSON-LD object, where the key is assigned in insertion order
+and the kind tells DefaultEntity, DataEntity and ContextualEntity apart.
+The records are indexed by @id, @type and schema, so an RO-Crate can look up entities without instantiating all of them.
+"""
+
+import json
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+KIND_DEFAULT = 0
+KIND_DATA = 1
+KIND_CONTEXTUAL = 2
+
+# (key, kind, JSON-LD)
+Record = Tuple[int, int, Dict[str, Any]]
+
+
+def get_context_key(jsonld: Dict[str, Any]) -> str:
+    """
+    Get the @context of a JSON-LD object as a string, so that a loaded @context (e.g., a list or a dict) can be compared and indexed.
+    """
+    ctx = jsonld.get("@context")
+    if isinstance(ctx, str):
+        return ctx
+    return json.dumps(ctx, sort_keys=True)
+
+
+def get_type_key(jsonld: Dict[str, Any]) -> str:
+    """
+    Get the @type of a JSON-LD object as a string, as a loaded @type may be a list.
+    """
+    type_ = jsonld["@type"]
+    return type_ if isinstance(type_, str) else json.dumps(type_)
+
+
+class EntityStore:
+    """
+    The interface of a storage backend of entities.
+
+    Records are returned in the order of (kind, key), i.e., the order of ROCrate.all_entities.
+    """
+
+    def insert(
+        self, entries: Iterable[Tuple[int, Optional[str], Dict[str, Any]]]
+    ) -> List[int]:
+        """
+        Insert entities in a single transaction.
+
+        Args:
+            entries (Iterable[Tuple[int, Optional[str], Dict[str, Any]]]): The (kind, schema, JSON-LD) of each entity,
+                where the kind is KIND_DEFAULT, KIND_DATA or KIND_CONTEXTUAL, and the schema is its name, e.g., "base".
+
+        Returns:
+            List[int]: The keys of the inserted entities.
+        """
+        raise NotImplementedError
+
+    def update(self, key: int, jsonld: Dict[str, Any]) -> None:
+        """
+        Replace the JSON-LD object of an entity. The @id and @type are re-indexed.
+        """
+        raise NotImplementedError
+
+    def delete(self, keys: Iterable[int]) -> None:
+        """
+        Delete entities. Unknown keys are ignored.
+        """
+        raise NotImplementedError
+
+    def get(self, key: int) -> Optional[Record]:
+        """
+        Get an entity by its key, or None if it is not stored.
+        """
+        raise NotImplementedError
+
+    def find(
+        self,
+        id_: Optional[str] = None,
+        type_: Optional[str] = None,
+        schema: Optional[str] = None,
+        kind: Optional[int] = None,
+    ) -> Iterator[Record]:
+        """
+        Find entities by @id, @type, schema and kind. The conditions that are None are not used.
+        """
+        raise NotImplementedError
+
+    def ids(self, kind: int) -> Iterator[str]:
+        """
+        Get the @ids of the entities of a kind, in order.
+        """
+        raise NotImplementedError
+
+    def duplicates(self) -> List[Tuple[str, str]]:
+        """
+        Get the (@id, @context) pairs shared by several entities, one item per entity as ROCrate.check_duplicate_entity() reports them.
+        """
+        raise NotImplementedError
+
+    def count(self) -> int:
+        """
+        Get the number of stored entities.
+        """
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        """
+        Delete all entities.
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """
+        Release the resources of the store.
+        """
+
+
+class MemoryEntityStore(EntityStore):
+    """
+    Entities stored in memory as the JSON-LD objects they were loaded from, with an index by @id and by (@type, schema).
+
+    The JSON-LD objects are neither copied nor converted, so storing the entities of a crate costs little more than iterating its @graph.
+    """
+
+    def __init__(self) -> None:
+        self._next_key = 1
+        # kind -> key -> (schema, JSON-LD), in insertion order
+        self._records: Dict[int, Dict[int, Tuple[Optional[str], Dict[str, Any]]]] = {
+            KIND_DEFAULT: {},
+            KIND_DATA: {},
+            KIND_CONTEXTUAL: {},
+        }
+        self._kinds: Dict[int, int] = {}
+        # @id -> keys, and (@type, schema) -> keys; dicts are used as ordered sets
+        self._by_id: Dict[str, Dict[int, None]] = {}
+        self._by_type: Dict[Tuple[str, Optional[str]], Dict[int, None]] = {}
+        self._lock = threading.RLock()
+
+    def insert(
+        self, entries: Iterable[Tuple[int, Optional[str], Dict[str, Any]]]
+    ) -> List[int]:
+        keys = []
+        with self._lock:
+            for kind, schema, jsonld in entries:
+                key = self._next_key
+                self._next_key += 1
+                self._records[kind][key] = (schema, jsonld)
+                self._kinds[key] = kind
+                self._index(key, schema, jsonld)
+                keys.append(key)
+        return keys
+
+    def update(self, key: int, jsonld: Dict[str, Any]) -> None:
+        with self._lock:
+            kind = self._kinds.get(key)
+            if kind is None:
+                return
+            schema, old = self._records[kind][key]
+            self._unindex(key, schema, old)
+            self._records[kind][key] = (schema, jsonld)
+            self._index(key, schema, jsonld)
+
+    def delete(self, keys: Iterable[int]) -> None:
+        with self._lock:
+            for key in keys:
+                kind = self._kinds.pop(key, None)
+                if kind is None:
+                    continue
+                schema, jsonld = self._records[kind].pop(key)
+                self._unindex(key, schema, jsonld)
+
+    def get(self, key: int) -> Optional[Record]:
+        kind = self._kinds.get(key)
+        if kind is None:
+            return None
+        return key, kind, self._records[kind][key][1]
+
+    def find(
+        self,
+        id_: Optional[str] = None,
+        type_: Optional[str] = None,
+        schema: Optional[str] = None,
+        kind: Optional[int] = None,
+    ) -> Iterator[Record]:
+        with self._lock:
+            if id_ is not None or type_ is not None:
+                if id_ is not None:
+                    keys = list(self._by_id.get(id_, {}))
+                elif schema is not None:
+                    keys = list(self._by_type.get((type_, schema), {}))  # type: ignore
+                else:
+                    keys = [
+                        key
+                        for (t, _), type_keys in self._by_type.items()
+                        if t == type_
+                        for key in type_keys
+                    ]
+                records = [self.get(key) for key in keys]
+                found = [
+                    r
+                    for r in records
+                    if r is not None
+                    and (kind is None or r[1] == kind)
+                    and (type_ is None or get_type_key(r[2]) == type_)
+                    and (schema is None or self._records[r[1]][r[0]][0] == schema)
+                ]
+                return iter(sorted(found, key=lambda r: (r[1], r[0])))
+
+            kinds = sorted(self._records) if kind is None else [kind]
+            # a snapshot, so that the records can be updated while iterating
+            return iter(
+                [
+                    (key, k, jsonld)
+                    for k in kinds
+                    for key, (_, jsonld) in list(self._records[k].items())
+                ]
+            )
+
+    def ids(self, kind: int) -> Iterator[str]:
+        with self._lock:
+            return iter(
+                [jsonld["@id"] for _, jsonld in list(self._records[kind].values())]
+            )
+
+    def duplicates(self) -> List[Tuple[str, str]]:
+        with self._lock:
+            groups: Dict[Tuple[str, str], int] = {}
+            for id_, keys in self._by_id.items():
+                if len(keys) < 2:
+                    continue
+                for key in keys:
+                    id_ctx = (id_, get_context_key(self.get(key)[2]))  # type: ignore
+                    groups[id_ctx] = groups.get(id_ctx, 0) + 1
+        return [
+            id_ctx
+            for id_ctx, count in groups.items()
+            if count > 1
+            for _ in range(count)
+        ]
+
+    def count(self) -> int:
+        return len(self._kinds)
+
+    def clear(self) -> None:
+        with self._lock:
+            for records in self._records.values():
+                records.clear()
+            self._kinds.clear()
+            self._by_id.clear()
+            self._by_type.clear()
+
+    def _index(self, key: int, schema: Optional[str], jsonld: Dict[str, Any]) -> None:
+        self._by_id.setdefault(jsonld["@id"], {})[key] = None
+        self._by_type.setdefault((get_type_key(jsonld), schema), {})[key] = None
+
+    def _unindex(self, key: int, schema: Optional[str], jsonld: Dict[str, Any]) -> None:
+        for index, index_key in (
+            (self._by_id, jsonld["@id"]),
+            (self._by_type, (get_type_key(jsonld), schema)),
+        ):
+            keys = index.get(index_key)  # type: ignore
+            if keys is None:
+                continue
+            keys.pop(key, None)
+            if len(keys) == 0:
+                del index[index_key]  # type: ignore
+
+
+class SQLiteEntityStore(EntityStore):
+    """
+    Entities stored in a SQLite database, either in a file or in memory (":memory:").
+
+    Only the records fetched by a query are held in memory, so the number of entities is bounded by the disk rather than the memory.
+    The connection is shared between threads and guarded by a lock, as the API server validates crates in worker threads.
+    """
+
+    # rows fetched per query while scanning
+    BATCH_SIZE = 1000
+
+    def __init__(self, path: str = ":memory:") -> None:
+        """
+        Open the database, creating the table and its indexes if they do not exist.
+
+        Args:
+            path (str): The path to the database file, or ":memory:".
+        """
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS entities (
+                    key INTEGER PRIMARY KEY,
+                    kind INTEGER NOT NULL,
+                    id TEXT NOT NULL,
+                    type TEXT NOT NULL,
+                    schema TEXT,
+                    context TEXT NOT NULL,
+                    jsonld TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS entities_kind ON entities (kind, key);
+                CREATE INDEX IF NOT EXISTS entities_id ON entities (id);
+                CREATE INDEX IF NOT EXISTS entities_type ON entities (type, schema);
+                """)
+
+    def insert(
+        self, entries: Iterable[Tuple[int, Optional[str], Dict[str, Any]]]
+    ) -> List[int]:
+        with self._lock, self._conn:
+            start = self._max_key()
+            self._conn.executemany(
+                "INSERT INTO entities (kind, id, type, schema, context, jsonld) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        kind,
+                        jsonld["@id"],
+                        get_type_key(jsonld),
+                        schema,
+                        get_context_key(jsonld),
+                        json.dumps(jsonld),
+                    )
+                    for kind, schema, jsonld in entries
+                ),
+            )
+            # the keys are assigned in order as max(key) + 1, as no other connection writes to the table
+            return list(range(start + 1, self._max_key() + 1))
+
+    def update(self, key: int, jsonld: Dict[str, Any]) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE entities SET id = ?, type = ?, context = ?, jsonld = ? WHERE key = ?",
+                (
+                    jsonld["@id"],
+                    get_type_key(jsonld),
+                    get_context_key(jsonld),
+                    json.dumps(jsonld),
+                    key,
+                ),
+            )
+
+    def delete(self, keys: Iterable[int]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM entities WHERE key = ?", ((key,) for key in keys)
+            )
+
+    def get(self, key: int) -> Optional[Record]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT key, kind, jsonld FROM entities WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], row[1], json.loads(row[2])
+
+    def find(
+        self,
+        id_: Optional[str] = None,
+        type_: Optional[str] = None,
+        schema: Optional[str] = None,
+        kind: Optional[int] = None,
+    ) -> Iterator[Record]:
+        conditions = []
+        params: List[Any] = []
+        for column, value in (
+            ("id", id_),
+            ("type", type_),
+            ("schema", schema),
+            ("kind", kind),
+        ):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        where = " AND ".join(conditions) if len(conditions) > 0 else "1"
+
+        # fetched in batches with keyset pagination, so that no cursor is held across yields,
+        # e.g., while the caller updates the entities
+        last_kind, last_key = -1, -1
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT key, kind, jsonld FROM entities WHERE {where} AND (kind, key) > (?, ?) ORDER BY kind, key LIMIT ?",
+                    (*params, last_kind, last_key, self.BATCH_SIZE),
+                ).fetchall()
+            for key, kind_, jsonld in rows:
+                yield key, kind_, json.loads(jsonld)
+            if len(rows) < self.BATCH_SIZE:
+                return
+            last_key, last_kind = rows[-1][0], rows[-1][1]
+
+    def ids(self, kind: int) -> Iterator[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM entities WHERE kind = ? ORDER BY key", (kind,)
+            ).fetchall()
+        return (row[0] for row in rows)
+
+    def duplicates(self) -> List[Tuple[str, str]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, context, COUNT(*) FROM entities GROUP BY id, context HAVING COUNT(*) > 1"
+            ).fetchall()
+        return [(id_, ctx) for id_, ctx, count in rows for _ in range(count)]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entities").fetchone()[0]  # type: ignore
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM entities")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _max_key(self) -> int:
+        return self._conn.execute("SELECT COALESCE(MAX(key), 0) FROM entities").fetchone()[0]  # type: ignore
@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Implementation of RO-Crates whose entities are kept in an EntityStore and materialized as Entity instances on demand.
+"""
+
+import itertools
+import threading
+import weakref
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Type
+
+from nii_dg.entity import (ContextualEntity, DataEntity, DefaultEntity, Entity,
+                           ROCrateMetadata, RootDataEntity)
+from nii_dg.error import CrateError
+from nii_dg.graph import ReferenceGraph
+from nii_dg.ro_crate import (ROCrate, build_records, check_crate_jsonld,
+                             get_entity_class, get_id_and_type)
+from nii_dg.store import (KIND_CONTEXTUAL, KIND_DATA, KIND_DEFAULT,
+                          EntityStore, MemoryEntityStore, Record,
+                          SQLiteEntityStore, get_context_key)
+
+
+def get_kind(entity_class: Type[Entity]) -> int:
+    """
+    Get the kind of the records of an entity class in a store.
+
+    Raises:
+        TypeError: If the class is not a subclass of DefaultEntity, DataEntity or ContextualEntity.
+    """
+    if issubclass(entity_class, DefaultEntity):
+        return KIND_DEFAULT
+    if issubclass(entity_class, DataEntity):
+        return KIND_DATA
+    if issubclass(entity_class, ContextualEntity):
+        return KIND_CONTEXTUAL
+    raise TypeError(
+        "'Entity' class is not supported to be added directly. Please use 'DefaultEntity', 'DataEntity', or 'ContextualEntity' instead."
+    )
+
+
+@lru_cache(maxsize=None)
+def get_schema(entity_class: Type[Entity]) -> Optional[str]:
+    """
+    Get the schema name of an entity class, or None if the class does not have a default one.
+    """
+    try:
+        return entity_class.get_schema_name()
+    except NotImplementedError:
+        return None
+
+
+class StoredROCrate(ROCrate):
+    """
+    An RO-Crate whose entities are kept in an EntityStore instead of lists of Entity instances.
+
+    Entities are materialized from their JSON-LD when they are accessed, e.g., by get_by_id(), get_by_type() or iter_entities(),
+    and are released when the caller drops them. While an entity is alive, the crate returns the same instance,
+    and setting or deleting its props is written back to the store. Mutating a prop value in place, e.g., appending to a list,
+    is not observed. Call save() for the entity afterwards.
+
+    References are stored as {"@id": ...} dicts, so materialized entities hold them as the entities loaded from JSON-LD do.
+    The hasPart of the RootDataEntity is not stored, but rebuilt from the stored DataEntities when the entities are iterated, e.g., by dump().
+
+    The DefaultEntities are always kept in memory. ReferenceGraph is not available, as it holds all entities.
+    """
+
+    # rows converted to entities and inserted at once by add_records()
+    BATCH_SIZE = 1000
+
+    def __init__(
+        self, store: EntityStore, jsonld: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """
+        Initialize the RO-Crate.
+
+        If jsonld is given, the store is cleared and the entities of the JSON-LD data are stored.
+        Otherwise, the entities already in the store are used, if any.
+
+        Args:
+            store (EntityStore): The store of the entities.
+            jsonld (Optional[Dict[str, Any]]): The JSON-LD data to use for initializing the RO-Crate.
+        """
+        self.store = store
+        self._lock = threading.RLock()
+        # key -> materialized entity, released when the entity is no longer referenced elsewhere
+        self._cache: "weakref.WeakValueDictionary[int, Entity]" = (
+            weakref.WeakValueDictionary()
+        )
+        # id(entity) -> key
+        self._keys: Dict[int, int] = {}
+        # (@context, @type) -> class of the entities added from Python, or resolved from the context
+        self._classes: Dict[Tuple[str, str], Type[Entity]] = {}
+        self._validation_cache = None
+        self._cache_lock = threading.RLock()
+
+        if jsonld is not None:
+            self.from_jsonld(jsonld)
+        elif store.count() > 0:
+            self.default_entities = [
+                self._materialize(record)  # type: ignore
+                for record in store.find(kind=KIND_DEFAULT)
+            ]
+            roots = [e for e in self.default_entities if isinstance(e, RootDataEntity)]
+            if len(roots) == 0:
+                raise ValueError("The store must have a RootDataEntity.")
+            self.root = roots[0]
+        else:
+            self.root = RootDataEntity()
+            self.default_entities = [self.root, ROCrateMetadata()]
+            self._insert(self.default_entities)
+
+    @property
+    def graph(self) -> ReferenceGraph:  # type: ignore[override]
+        raise NotImplementedError("ReferenceGraph is not supported by stored crates.")
+
+    @property
+    def data_entities(self) -> List[DataEntity]:  # type: ignore[override]
+        """
+        Get all DataEntities, materialized from the store.
+        """
+        return list(self._iter_records(self.store.find(kind=KIND_DATA)))  # type: ignore
+
+    @property
+    def contextual_entities(self) -> List[ContextualEntity]:  # type: ignore[override]
+        """
+        Get all ContextualEntities, materialized from the store.
+        """
+        return list(self._iter_records(self.store.find(kind=KIND_CONTEXTUAL)))  # type: ignore
+
+    @property
+    def all_entities(self) -> List[Entity]:
+        return list(self.iter_entities())
+
+    def iter_entities(self) -> Iterator[Entity]:
+        """
+        Iterate over all entities, materializing them one by one, so that only the entities held by the caller stay in memory.
+
+        Returns:
+            Iterator[Entity]: The entities, in the order of all_entities.
+        """
+        self.root.data["hasPart"] = [{"@id": id_} for id_ in self.store.ids(KIND_DATA)]  # type: ignore
+        return self._iter_records(self.store.find())
+
+    def add(self, *entities: Entity) -> None:
+        """
+        Add entities to the RO-Crate. The entities are stored in a single transaction.
+
+        Args:
+            *entities (Entity): The entities to be added to the RO-Crate.
+
+        Raises:
+            TypeError: If the entity type is not supported.
+        """
+        for entity in entities:
+            get_kind(type(entity))
+        self._insert(entities)
+        self.default_entities.extend(
+            e for e in entities if isinstance(e, DefaultEntity)
+        )
+
+    def add_records(
+        self, entity_class: Type[Entity], rows: Iterable[Dict[str, Any]]
+    ) -> List[Entity]:
+        """
+        Create entities of a class from rows of props and add them to the RO-Crate, as ROCrate.add_records() does.
+
+        The rows are stored in batches of BATCH_SIZE.
+        """
+        if not issubclass(entity_class, (DataEntity, ContextualEntity)):
+            raise TypeError(
+                "Only subclasses of 'DataEntity' or 'ContextualEntity' can be added as records."
+            )
+
+        entities: List[Entity] = []
+        row_iter = iter(rows)
+        while True:
+            batch = build_records(
+                entity_class, itertools.islice(row_iter, self.BATCH_SIZE)
+            )
+            if len(batch) == 0:
+                break
+            self._insert(batch)
+            entities.extend(batch)
+
+        return entities
+
+    def remove(self, *entities: Entity, check_references: bool = False) -> None:
+        """
+        Removes entities from the RO-Crate.
+
+        Args:
+            *entities: The entities to be removed from the RO-Crate, as returned by the crate.
+            check_references (bool): Not supported by stored crates.
+
+        Raises:
+            ValueError: If the entity is not included in the RO-Crate or is a DefaultEntity.
+            TypeError: If the entity type is not supported.
+            NotImplementedError: If check_references is True.
+        """
+        if check_references:
+            raise NotImplementedError(
+                "check_references is not supported by stored crates."
+            )
+
+        keys: Dict[int, Entity] = {}
+        for entity in entities:
+            key = self._keys.get(id(entity))
+            if key is None:
+                raise ValueError(f"Entity {entity} is not included in the RO-Crate.")
+            if isinstance(entity, DefaultEntity):
+                raise ValueError(
+                    f"Entity {entity} is a DefaultEntity and cannot be removed."
+                )
+            elif not isinstance(entity, (DataEntity, ContextualEntity)):
+                raise TypeError(
+                    "'Entity' class is not supported to be removed directly. Please use 'DefaultEntity', 'DataEntity', or 'ContextualEntity' instead."
+                )
+            keys[key] = entity
+
+        self.store.delete(keys)
+        with self._lock:
+            for key, entity in keys.items():
+                entity.remove_observer(self._write_back)
+                self._keys.pop(id(entity), None)
+                self._cache.pop(key, None)
+
+    def save(self, *entities: Entity) -> None:
+        """
+        Write entities back to the store, e.g., after a prop value was mutated in place.
+
+        Args:
+            *entities (Entity): The entities, as returned by the crate.
+
+        Raises:
+            ValueError: If the entity is not included in the RO-Crate.
+        """
+        for entity in entities:
+            if id(entity) not in self._keys:
+                raise ValueError(f"Entity {entity} is not included in the RO-Crate.")
+            self._write_back(entity, "")
+
+    def close(self) -> None:
+        """
+        Close the store.
+        """
+        self.store.close()
+
+    def get_by_id(self, id_: str) -> List[Entity]:
+        return list(self._iter_records(self.store.find(id_=id_)))
+
+    def get_by_type(self, type_: Type[Entity]) -> List[Entity]:
+        if issubclass(type_, DefaultEntity):
+            return [e for e in self.default_entities if type(e) is type_]
+        records = self.store.find(type_=type_.__name__, schema=get_schema(type_))
+        return [e for e in self._iter_records(records) if type(e) is type_]
+
+    def get_by_id_and_type(self, id_: str, type_: Type[Entity]) -> List[Entity]:
+        return [e for e in self.get_by_id(id_) if type(e) is type_]
+
+    def from_jsonld(self, jsonld: Dict[str, Any]) -> None:
+        """
+        Store the entities of an RO-Crate in JSON-LD, replacing the entities in the store.
+
+        Only the DefaultEntities are instantiated. The class of the other entities is resolved to check that it is supported.
+
+        Raises:
+            TypeError: If the JSON-LD data is not a dictionary.
+            ValueError: If the JSON-LD data does not have the required keys or values.
+            ValueError: If a required RootDataEntity and ROCrateMetadata entity is not found.
+            ValueError: If an entity type is not found.
+        """
+        check_crate_jsonld(jsonld)
+        with self._lock:
+            for entity in list(self._cache.values()):
+                entity.remove_observer(self._write_back)
+            self._cache.clear()
+            self._keys.clear()
+            self.store.clear()
+
+        defaults: Dict[str, Entity] = {}
+        # (@context, @type) -> (kind, schema)
+        kinds: Dict[Tuple[str, str], Tuple[int, Optional[str]]] = {}
+
+        def entries() -> Iterator[Tuple[int, Optional[str], Dict[str, Any]]]:
+            for entity in jsonld["@graph"]:
+                id_, type_ = get_id_and_type(entity)
+                if id_ == "./" and type_ == "Dataset":
+                    defaults["root"] = RootDataEntity.from_jsonld(entity)
+                elif id_ == "ro-crate-metadata.json" and type_ == "CreativeWork":
+                    defaults["metadata"] = ROCrateMetadata.from_jsonld(entity)
+                else:
+                    class_key = (get_context_key(entity), str(type_))
+                    if class_key not in kinds:
+                        entity_class = self._get_class(entity, KIND_DATA)
+                        kind = get_kind(entity_class)
+                        if kind == KIND_DEFAULT:
+                            raise ValueError(f"Entity type {type_} is not supported.")
+                        kinds[class_key] = (kind, get_schema(entity_class))
+                    kind, schema = kinds[class_key]
+                    yield kind, schema, entity
+
+        try:
+            self.store.insert(entries())
+        except TypeError as e:
+            # raised by get_kind() for an Entity that is not a DataEntity or ContextualEntity
+            raise ValueError(str(e)) from e
+        if "root" not in defaults:
+            raise ValueError("The JSON-LD data must have a RootDataEntity.")
+        if "metadata" not in defaults:
+            raise ValueError("The JSON-LD data must have a ROCrateMetadata entity.")
+
+        self.root = defaults["root"]  # type: ignore
+        # rebuilt when iterating, see iter_entities()
+        self.root.data["hasPart"] = []  # type: ignore
+        self.default_entities = [self.root, defaults["metadata"]]  # type: ignore
+        self._insert(self.default_entities)
+
+    def check_duplicate_entity(
+        self, entities: Optional[Iterable[Entity]] = None
+    ) -> None:
+        """
+        Check for duplicate entities, i.e., entities with the same '@id' and '@context', as ROCrate.check_duplicate_entity() does, in the store.
+
+        Raises:
+            CrateError: If there are duplicate entities in the RO-Crate.
+        """
+        if entities is not None:
+            super().check_duplicate_entity(entities)
+            return
+
+        dup_id_ctx = self.store.duplicates()
+        if len(dup_id_ctx) > 0:
+            raise CrateError(
+                f"Duplicate entities are found in the RO-Crate: {dup_id_ctx}"
+            )
+
+    def _insert(self, entities: Iterable[Entity]) -> None:
+        entities = list(entities)
+        keys = self.store.insert(
+            (get_kind(type(e)), e.schema_name, self._to_jsonld(e)) for e in entities
+        )
+        with self._lock:
+            for key, entity in zip(keys, entities):
+                self._classes.setdefault(
+                    (get_context_key(entity.data), entity.type), type(entity)
+                )
+                self._track(key, entity)
+
+    def _iter_records(self, records: Iterable[Record]) -> Iterator[Entity]:
+        for record in records:
+            yield self._materialize(record)
+
+    def _materialize(self, record: Record) -> Entity:
+        key, kind, jsonld = record
+        with self._lock:
+            entity = self._cache.get(key)
+            if entity is None:
+                entity = self._get_class(jsonld, kind).from_jsonld(jsonld)
+                self._track(key, entity)
+        return entity
+
+    def _get_class(self, jsonld: Dict[str, Any], kind: int) -> Type[Entity]:
+        class_key = (get_context_key(jsonld), str(jsonld["@type"]))
+        entity_class = self._classes.get(class_key)
+        if entity_class is None:
+            if kind == KIND_DEFAULT:
+                entity_class = (
+                    RootDataEntity if jsonld["@id"] == "./" else ROCrateMetadata
+                )
+            else:
+                entity_class = get_entity_class(jsonld)
+            self._classes[class_key] = entity_class
+        return entity_class
+
+    def _track(self, key: int, entity: Entity) -> None:
+        self._cache[key] = entity
+        self._keys[id(entity)] = key
+        weakref.finalize(entity, self._keys.pop, id(entity), None)
+        entity.add_observer(self._write_back)
+
+    def _write_back(self, entity: Entity, prop: str) -> None:
+        key = self._keys.get(id(entity))
+        if key is not None:
+            self.store.update(key, self._to_jsonld(entity))
+
+    def _to_jsonld(self, entity: Entity) -> Dict[str, Any]:
+        jsonld = entity.as_jsonld()
+        if isinstance(entity, RootDataEntity):
+            # rebuilt when iterating, see iter_entities()
+            jsonld["hasPart"] = []
+        return jsonld
+
+
+class SQLiteROCrate(StoredROCrate):
+    """
+    An RO-Crate whose entities are kept in a local SQLite database, for crates that do not fit in memory as Entity instances.
+
+    The database is indexed by @id, @type and schema, so get_by_id() and get_by_type() only materialize the matching entities,
+    and check_props(), validate() and dump() materialize the entities one by one.
+    A crate stored in a file can be reopened later with the same path.
+    """
+
+    def __init__(
+        self, path: str = ":memory:", jsonld: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """
+        Initialize the RO-Crate.
+
+        Args:
+            path (str): The path to the SQLite database file, or ":memory:".
+            jsonld (Optional[Dict[str, Any]]): The JSON-LD data to use for initializing the RO-Crate. It replaces the entities in the database.
+        """
+        super().__init__(SQLiteEntityStore(path), jsonld)
+
+
+class LazyROCrate(StoredROCrate):
+    """
+    An RO-Crate loaded from JSON-LD whose entities are kept as the loaded dicts, indexed by @id and @type,
+    and converted to Entity instances only when they are accessed.
+
+    Loading only resolves the class of each (@context, @type) pair, so a crate can be loaded quickly
+    when only a few of its entities are used, e.g., to validate the entities given by their @id.
+    """
+
+    def __init__(self, jsonld: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Initialize the RO-Crate.
+
+        Args:
+            jsonld (Optional[Dict[str, Any]]): The JSON-LD data to use for initializing the RO-Crate.
+                The dicts in its @graph are used as they are, so they must not be modified afterwards.
+        """
+        super().__init__(MemoryEntityStore(), jsonld)
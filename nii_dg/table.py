@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Conversion of entities of a schema class to and from a columnar table.
+
+A table has a column for "@id" and a column for each prop defined in the EntityDef of the class.
+References to other entities are stored as their @id, so the table holds only plain values.
+The columns are lists by default. NumPy arrays and pandas DataFrames are supported if these packages are installed,
+e.g., with `pip install nii_dg[table]`.
+"""
+
+import importlib
+from typing import Any, Dict, Iterator, List, Sequence, Type
+
+from nii_dg.entity import Entity, get_ref_id
+from nii_dg.utils import get_entity_type_names
+
+TABLE_FORMATS = ["columns", "numpy", "pandas"]
+
+Columns = Dict[str, List[Any]]
+
+
+def get_columns(entity_class: Type[Entity]) -> List[str]:
+    """
+    Get the columns of the table of an entity class.
+
+    Args:
+        entity_class (Type[Entity]): The entity class.
+
+    Returns:
+        List[str]: "@id" followed by the props of the EntityDef of the class.
+    """
+    return ["@id", *entity_class.get_entity_def()["props"]]
+
+
+def get_ref_props(entity_class: Type[Entity]) -> List[str]:
+    """
+    Get the props of an entity class whose values are references to other entities.
+
+    Args:
+        entity_class (Type[Entity]): The entity class.
+
+    Returns:
+        List[str]: The props whose expected type is an entity, e.g., "DMP" or "List[File]".
+    """
+    return [
+        prop
+        for prop, prop_def in entity_class.get_entity_def()["props"].items()
+        if len(get_entity_type_names(prop_def["expected_type"])) > 0
+    ]
+
+
+def to_cell(value: Any) -> Any:
+    """
+    Convert a prop value to a table cell, i.e., references to their @id.
+    """
+    if value is None or type(value) in (str, int, float, bool):
+        return value
+    if isinstance(value, list):
+        return [to_cell(v) for v in value]
+    ref_id = get_ref_id(value)
+    if ref_id is not None:
+        return ref_id
+    return value
+
+
+def from_cell(value: Any, is_ref: bool) -> Any:
+    """
+    Convert a table cell back to a prop value, i.e., the @id in a reference prop to {"@id": ...}.
+    """
+    if isinstance(value, list):
+        return [from_cell(v, is_ref) for v in value]
+    if is_ref and isinstance(value, str):
+        return {"@id": value}
+    return value
+
+
+def is_missing(value: Any) -> bool:
+    """
+    Return True if a cell is empty, i.e., None or NaN as filled in by NumPy and pandas.
+    """
+    return value is None or (isinstance(value, float) and value != value)
+
+
+def entities_to_columns(
+    entities: Sequence[Entity], entity_class: Type[Entity]
+) -> Columns:
+    """
+    Convert entities to columns.
+
+    Args:
+        entities (Sequence[Entity]): The entities to be converted.
+        entity_class (Type[Entity]): The class of the entities, which defines the columns.
+
+    Returns:
+        Columns: The values of each column. A missing prop is None.
+    """
+    columns: Columns = {}
+    for column in get_columns(entity_class):
+        columns[column] = [to_cell(entity.data.get(column)) for entity in entities]
+
+    return columns
+
+
+def columns_to_rows(
+    columns: Columns, entity_class: Type[Entity]
+) -> Iterator[Dict[str, Any]]:
+    """
+    Convert columns to rows of props, as accepted by ROCrate.add_records().
+
+    Args:
+        columns (Columns): The values of each column, including "@id".
+        entity_class (Type[Entity]): The class of the entities.
+
+    Yields:
+        Dict[str, Any]: The props of each entity. Empty cells are omitted.
+
+    Raises:
+        ValueError: If there is no "@id" column or the columns have different lengths.
+    """
+    if "@id" not in columns:
+        raise ValueError("The table must have an '@id' column.")
+    lengths = {len(values) for values in columns.values()}
+    if len(lengths) > 1:
+        raise ValueError("The columns of the table must have the same length.")
+
+    ref_props = set(get_ref_props(entity_class))
+    int_props = {
+        prop
+        for prop, prop_def in entity_class.get_entity_def()["props"].items()
+        if prop_def["expected_type"] == "int"
+    }
+    names = list(columns)
+    for values in zip(*columns.values()):
+        row = {}
+        for name, value in zip(names, values):
+            if is_missing(value):
+                continue
+            if name in int_props and isinstance(value, float) and value.is_integer():
+                # an int column with empty cells is float in NumPy and pandas
+                value = int(value)
+            row[name] = from_cell(value, name in ref_props)
+        yield row
+
+
+def columns_to_format(columns: Columns, table_format: str) -> Any:
+    """
+    Convert columns to the given table format.
+
+    Args:
+        columns (Columns): The values of each column.
+        table_format (str): One of "columns", "numpy" or "pandas".
+
+    Returns:
+        Any: The columns as they are, a dict of NumPy arrays, or a pandas DataFrame.
+
+    Raises:
+        ValueError: If the table format is not supported.
+        ImportError: If the package of the table format is not installed.
+    """
+    if table_format == "columns":
+        return columns
+    if table_format == "numpy":
+        np = import_table_package("numpy")
+        arrays = {}
+        for name, values in columns.items():
+            if all(isinstance(v, (bool, int, float)) for v in values):
+                arrays[name] = np.array(values)
+            elif not any(isinstance(v, list) for v in values):
+                # str and empty cells
+                arrays[name] = np.array(values, dtype=object)
+            else:
+                # set one by one, so that lists are not turned into another dimension
+                array = np.empty(len(values), dtype=object)
+                for i, value in enumerate(values):
+                    array[i] = value
+                arrays[name] = array
+        return arrays
+    if table_format == "pandas":
+        pd = import_table_package("pandas")
+        return pd.DataFrame(columns_to_format(columns, "numpy"))
+
+    raise ValueError(
+        f"Invalid table format: {table_format}. Use one of {TABLE_FORMATS}."
+    )
+
+
+def format_to_columns(table: Any) -> Columns:
+    """
+    Convert a table of any supported format to columns.
+
+    Args:
+        table (Any): A dict of lists or NumPy arrays, or a pandas DataFrame.
+
+    Returns:
+        Columns: The values of each column as Python objects.
+    """
+    if hasattr(table, "to_dict") and hasattr(table, "columns"):
+        # pandas.DataFrame
+        return {str(name): table[name].tolist() for name in table.columns}
+
+    return {
+        str(name): values.tolist() if hasattr(values, "tolist") else list(values)
+        for name, values in table.items()
+    }
+
+
+def import_table_package(name: str) -> Any:
+    """
+    Import an optional package used for tables.
+
+    Raises:
+        ImportError: If the package is not installed.
+    """
+    try:
+        return importlib.import_module(name)
+    except ImportError as e:
+        raise ImportError(
+            f"{name} is required for this table format. Install it with `pip install nii_dg[table]`."
+        ) from e
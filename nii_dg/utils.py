@@ -6,21 +6,26 @@ This module provides utility functions for nii_dg.
 """
 
 import ast
+import hashlib
 import importlib
 import importlib.util
 import os
 import re
 import tempfile
+from concurrent.futures import CancelledError, Future
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import (TYPE_CHECKING, Any, Dict, List, Literal, NewType, Optional,
-                    Tuple, TypedDict, Union, get_args, get_origin)
+from typing import (TYPE_CHECKING, Any, BinaryIO, Dict, ForwardRef, List,
+                    Literal, NewType, Optional, Tuple, TypedDict, Union,
+                    get_args, get_origin)
 from urllib.error import HTTPError
 from urllib.request import urlopen
 
 import yaml
 
+from nii_dg.cancellation import get_timeout
 from nii_dg.const import RO_CRATE_CONTEXT
+from nii_dg.metrics import CACHE_REQUESTS
 from nii_dg.module_info import GH_REF, GH_REPO
 
 if TYPE_CHECKING:
@@ -41,6 +46,28 @@ def load_config() -> Dict[str, Any]:
         "DG_ALLOW_OTHER_GH_REPO": False,
         "DG_WSGI_SERVER": "waitress",
         "DG_WSGI_THREADS": 1,
+        "DG_SAPPORO_OUTPUTS_DIR": "",
+        "DG_SAPPORO_DOWNLOAD_WORKERS": 4,
+        "DG_SAPPORO_FAIL_FAST": False,
+        "DG_SAPPORO_POLL_INITIAL": 10.0,
+        "DG_SAPPORO_POLL_MAX": 120.0,
+        "DG_SAPPORO_POLL_FACTOR": 1.3,
+        "DG_SAPPORO_POLL_WORKERS": 4,
+        "DG_PROFILE_TOP": 10,
+        "DG_PROFILE_ALL_REQUESTS": False,
+        "DG_HTTP_TIMEOUT": 30.0,
+        "DG_JOB_TIMEOUT": 0.0,
+        "DG_JOB_TIMEOUT_MAX": 86400.0,
+        "DG_JOB_WORKERS": 3,
+        "DG_WORKFLOW_JOB_WORKERS": 2,
+        "DG_FAST_JOB_MAX_ENTITIES": 20,
+        "DG_CLIENT_ID_HEADER": "X-Client-Id",
+        "DG_MAX_QUEUED_JOBS": 1000,
+        "DG_MAX_JOBS_PER_CLIENT": 100,
+        "DG_MAX_CRATE_SIZE": 0,
+        "DG_RETRY_AFTER": 10,
+        "DG_HEALTH_MAX_QUEUED_JOBS": 800,
+        "DG_JOB_RECORD_TTL": 3600.0,
     }
 
     def str2bool(val: Union[str, bool]) -> bool:
@@ -55,10 +82,13 @@ def load_config() -> Dict[str, Any]:
     config = DEFAULT_CONFIG.copy()
     for key in DEFAULT_CONFIG.keys():
         if key in os.environ:
-            if key in ("DG_USE_EXTERNAL_CTX", "DG_ALLOW_OTHER_GH_REPO"):
+            # convert to the type of the default value
+            if isinstance(DEFAULT_CONFIG[key], bool):
                 config[key] = str2bool(os.environ[key])
-            elif key in ("DG_PORT", "DG_WSGI_THREADS"):
+            elif isinstance(DEFAULT_CONFIG[key], int):
                 config[key] = int(os.environ[key])
+            elif isinstance(DEFAULT_CONFIG[key], float):
+                config[key] = float(os.environ[key])
             else:
                 config[key] = os.environ[key]
 
@@ -205,12 +235,12 @@ def download_schema(
 
     try:
         schema_module_path = Path(schema_dir).joinpath(f"{schema_module_name}.py")
-        with urlopen(schema_module_url) as res:
+        with urlopen(schema_module_url, timeout=get_timeout(DG_CONFIG["DG_HTTP_TIMEOUT"])) as res:
             schema_module = res.read().decode("utf-8")
         with schema_module_path.open("w") as f:
             f.write(schema_module)
         schema_file_path = Path(schema_dir).joinpath(f"{schema_module_name}.yml")
-        with urlopen(schema_file_url) as res:
+        with urlopen(schema_file_url, timeout=get_timeout(DG_CONFIG["DG_HTTP_TIMEOUT"])) as res:
             schema_file = res.read().decode("utf-8")
         with schema_file_path.open("w") as f:
             f.write(schema_file)
@@ -249,8 +279,10 @@ def import_external_class(
     try:
         # Check if the module has already been imported
         if module_key in _module_cache:
+            CACHE_REQUESTS.inc(cache="external_module", result="hit")
             external_module = _module_cache[module_key]
             return getattr(external_module, class_name)
+        CACHE_REQUESTS.inc(cache="external_module", result="miss")
 
         # Download the schema module
         schema_module_path, _ = download_schema(gh_repo, gh_ref, schema_module_name)
@@ -269,6 +301,27 @@ def import_external_class(
         return None
 
 
+def get_entity_type_names(expected_type: str) -> List[str]:
+    """
+    Get the names of the entity classes in an expected type.
+
+    Args:
+        expected_type (str): The expected type. e.g., "List[Union[File, Dataset]]"
+
+    Returns:
+        List[str]: The names of the entity classes. e.g., ["File", "Dataset"]
+    """
+    typing_names = ("List", "Dict", "Tuple", "Union", "Optional", "Literal", "Any")
+    builtin_names = ("str", "int", "float", "bool", "None")
+    not_entity_names = {*typing_names, *builtin_names}
+    names = []
+    for node in ast.walk(ast.parse(expected_type)):
+        if isinstance(node, ast.Name) and node.id not in not_entity_names:
+            names.append(node.id)
+
+    return names
+
+
 def is_instance_of_expected_type(value: Any, expected_type: str) -> bool:
     """
     Check if a given value is an instance of a given expected type.
@@ -328,7 +381,8 @@ def is_instance_of_expected_type(value: Any, expected_type: str) -> bool:
             else:
                 custom_class = import_custom_class("nii_dg.entity", node.id)
                 if custom_class is None:
-                    return Any
+                    # an entity defined in a schema module, e.g., "DMP", checked by its class name
+                    return ForwardRef(node.id)
                 return custom_class
         elif isinstance(node, ast.Subscript):
             origin = ast_to_type(node.value)  # e.g., typing.List
@@ -402,11 +456,15 @@ def is_instance_of_expected_type(value: Any, expected_type: str) -> bool:
                 return True
 
             # Check if value is an instance of expected_type or its subclasses
+            if isinstance(expected_type, ForwardRef):
+                type_name = expected_type.__forward_arg__
+            else:
+                type_name = expected_type.__name__
             for cls in value.__class__.__mro__:
-                if cls.__name__ == expected_type.__name__:
+                if cls.__name__ == type_name:
                     return True
 
-            return isinstance(value, expected_type)
+            return isinstance(expected_type, type) and isinstance(value, expected_type)
 
     parsed_expected_type = parse_type_string(expected_type)
     # parsed_expected_type: e.g., typing.List[int], typing.Dict[str, int], int, etc.
@@ -455,6 +513,53 @@ def is_version_newer(ver1: str, ver2: str) -> bool:
     return False
 
 
+SIZE_UNITS = {
+    "B": 1,
+    "KB": 1024,
+    "MB": 1024**2,
+    "GB": 1024**3,
+    "TB": 1024**4,
+    "PB": 1024**5,
+}
+
+
+def parse_content_size(content_size: str) -> int:
+    """
+    Convert a content size, e.g., "156KB", to a number of bytes.
+
+    Args:
+        content_size (str): The content size suffixed with "B", "KB", "MB", "GB", "TB" or "PB".
+
+    Returns:
+        int: The content size in bytes.
+
+    Raises:
+        ValueError: If the content size is not in the expected format.
+    """
+    match = re.match(r"^(?P<size>\d+)(?P<unit>[KMGTP]?B)$", content_size)
+    if match is None:
+        raise ValueError(f"Invalid content size: {content_size}")
+
+    return int(match.group("size")) * SIZE_UNITS[match.group("unit")]
+
+
+def convert_file_size(size: int, size_unit: str) -> float:
+    """
+    Convert a number of bytes to the specified unit.
+
+    Args:
+        size (int): The size in bytes.
+        size_unit (str): The unit to convert to. e.g., "B", "KB", "MB", "GB", "TB", "PB"
+
+    Returns:
+        float: The size in the specified unit, rounded to 3 decimal places.
+    """
+    if size_unit not in SIZE_UNITS:
+        raise ValueError(f"Invalid size unit: {size_unit}")
+
+    return round(size / SIZE_UNITS[size_unit], 3)
+
+
 def sum_file_size(size_unit: str, entities: List["Entity"]) -> float:
     """
     Sum the file sizes of the given entities and convert the result to the specified unit.
@@ -466,27 +571,88 @@ def sum_file_size(size_unit: str, entities: List["Entity"]) -> float:
     Returns:
         float: The sum of the file sizes of the given entities in the specified unit.
     """
-    unit_conversion_table = {
-        "B": 1,
-        "KB": 1024,
-        "MB": 1024**2,
-        "GB": 1024**3,
-        "TB": 1024**4,
-        "PB": 1024**5,
-    }
-    if size_unit not in unit_conversion_table:
+    if size_unit not in SIZE_UNITS:
         raise ValueError(f"Invalid size unit: {size_unit}")
 
     total_size = 0
     for entity in entities:
         if "contentSize" not in entity:
             raise ValueError(f"contentSize is not defined for {entity}")
-        match = re.match(r"^(?P<size>\d+)(?P<unit>[KMGTP]?B)$", entity["contentSize"])
-        if match is None:
-            raise ValueError(f"Invalid content size: {entity['contentSize']}")
-        size = int(match.group("size"))
-        unit = match.group("unit")
-        total_size += size * unit_conversion_table[unit]
-
-    # round to 2 decimal places
-    return round(total_size / unit_conversion_table[size_unit], 3)
+        total_size += parse_content_size(entity["contentSize"])
+
+    return convert_file_size(total_size, size_unit)
+
+
+# 1 MiB; large enough that hashlib releases the GIL while digesting each chunk
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_stream(
+    stream: BinaryIO,
+    sink: Optional[BinaryIO] = None,
+    chunk_size: int = HASH_CHUNK_SIZE,
+) -> Tuple[int, str]:
+    """
+    Read a binary stream to the end in chunks, computing its size and SHA256 hash on the way.
+
+    Args:
+        stream (BinaryIO): The stream to be read, e.g., an opened file or an HTTP response.
+        sink (Optional[BinaryIO], optional): If given, the chunks are also written to it. Defaults to None.
+        chunk_size (int, optional): The number of bytes read at once. Defaults to HASH_CHUNK_SIZE.
+
+    Returns:
+        Tuple[int, str]: The size in bytes and the hex digest of the stream.
+    """
+    sha256 = hashlib.sha256()
+    size = 0
+    buf = bytearray(chunk_size)
+    view = memoryview(buf)
+    while True:
+        n = stream.readinto(buf)  # type: ignore
+        if not n:
+            break
+        sha256.update(view[:n])
+        if sink is not None:
+            sink.write(view[:n])
+        size += n
+
+    return size, sha256.hexdigest()
+
+
+def compute_sha256(path: Union[str, Path], chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    """
+    Compute the SHA256 hash of a file without loading the whole file into memory.
+
+    Args:
+        path (Union[str, Path]): The path to the file to be hashed.
+        chunk_size (int, optional): The number of bytes read at once. Defaults to HASH_CHUNK_SIZE.
+
+    Returns:
+        str: The hex digest of the file.
+    """
+    with Path(path).open("rb", buffering=0) as f:
+        return hash_stream(f, chunk_size=chunk_size)[1]
+
+
+def chain_future(source: "Future[Any]", target: "Future[Any]") -> None:
+    """
+    Copy the outcome of a future to another future once it is done.
+
+    Args:
+        source (Future[Any]): The future whose result or exception is copied.
+        target (Future[Any]): The future that receives it. It is left untouched if it is already done, e.g., cancelled.
+    """
+
+    def copy(src: "Future[Any]") -> None:
+        if target.done():
+            return
+        if src.cancelled():
+            if not target.cancel():
+                # a running future cannot be cancelled
+                target.set_exception(CancelledError())
+        elif src.exception() is not None:
+            target.set_exception(src.exception())
+        else:
+            target.set_result(src.result())
+
+    source.add_done_callback(copy)
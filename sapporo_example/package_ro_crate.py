@@ -2,11 +2,11 @@
 # coding: utf-8
 
 import argparse
-import hashlib
 import json
 from pathlib import Path
 
 from nii_dg.ro_crate import ROCrate
+from nii_dg.scanner import scan_directory
 from nii_dg.schema.sapporo import Dataset, File, SapporoRun
 
 
@@ -29,13 +29,16 @@ def package_ro_crate(sapporo_endpoint: str, wf_results_dir: Path) -> None:
 
     sapporo_run_ins = SapporoRun(props=run_req)
 
-    for file_path in wf_results_dir.joinpath("outputs").glob("**/*"):
-        file_ins = File(
-            str(file_path.relative_to(wf_results_dir)), {"name": file_path.name}
-        )
-        if file_path.suffix != ".html":
-            file_ins["contentSize"] = f"{file_path.stat().st_size}B"
-            file_ins["sha256"] = hashlib.sha256(file_path.read_bytes()).hexdigest()
+    # only the files are added, not the subdirectories of the outputs.
+    # the .html reports differ on every run, so they are neither hashed nor verified.
+    file_entities = scan_directory(
+        wf_results_dir.joinpath("outputs"),
+        file_class=File,
+        base_dir=wf_results_dir,
+        with_datasets=False,
+        verify_filter=lambda path: path.suffix != ".html",
+    )
+    for file_ins in file_entities:
         outputs_dir_ins["hasPart"].append(file_ins)
         ro_crate.add(file_ins)
 
@@ -35,6 +35,10 @@ setup(
         "waitress",
     ],
     extras_require={
+        "table": [
+            "numpy",
+            "pandas",
+        ],
         "tests": [
             "coverage",
             "flake8",
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Benchmark of crate construction, serialization and validation on synthetic crates.
+
+For each schema and size, the following operations are timed and their peak memory is measured:
+
+- construct: ROCrate() and ROCrate.add() of the generated entities
+- from_jsonld: ROCrate(jsonld)
+- check_props: ROCrate.check_props()
+- validate: ROCrate.validate(), with the network stubbed
+- as_jsonld: ROCrate.as_jsonld()
+- dump: ROCrate.dump()
+
+The results can be saved as JSON and compared with those of a baseline to detect regressions.
+"""
+
+import argparse
+import contextlib
+import gc
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from unittest import mock
+
+from nii_dg.generator import SCHEMAS, generate_crate, generate_jsonld
+from nii_dg.ro_crate import ROCrate
+from nii_dg.schema.sapporo import File, RunPoller, SapporoRun
+
+SIZES = [1_000, 10_000, 100_000]
+OPERATIONS = [
+    "construct",
+    "from_jsonld",
+    "check_props",
+    "validate",
+    "as_jsonld",
+    "dump",
+]
+
+Result = Dict[str, Any]
+
+
+@contextlib.contextmanager
+def stub_network(crate: ROCrate) -> Iterator[None]:
+    """
+    Stub the requests made in validate(), so that the benchmark measures the library only.
+
+    URLs are always accessible, and a sapporo run completes at once with the outputs recorded in the crate.
+    """
+    response = mock.MagicMock(status=200)
+    outputs = [{"file_name": file["name"]} for file in crate.get_by_type(File)]
+
+    def watch(endpoint: str, run_id: str) -> "Future[str]":
+        future: "Future[str]" = Future()
+        future.set_result("COMPLETE")
+        return future
+
+    with mock.patch(
+        "nii_dg.check_functions.urlopen", return_value=response
+    ), mock.patch.object(
+        SapporoRun, "execute_wf", return_value="run_id"
+    ), mock.patch.object(
+        SapporoRun, "get_run_log", return_value={"outputs": outputs}
+    ), mock.patch.object(
+        RunPoller, "watch", side_effect=watch
+    ):
+        yield
+
+
+def get_operations(
+    schema: str, size: int, seed: int, tmp_dir: Path
+) -> Dict[str, Callable[[], Any]]:
+    """
+    Prepare the inputs of each operation and return the functions to be measured.
+    """
+    jsonld = generate_jsonld(schema, size, seed)
+    crate = ROCrate(jsonld)
+    dump_path = tmp_dir.joinpath(f"{schema}_{size}.json")
+
+    def validate() -> None:
+        with stub_network(crate):
+            crate.validate()
+
+    return {
+        "construct": lambda: generate_crate(schema, size, seed),
+        "from_jsonld": lambda: ROCrate(jsonld),
+        "check_props": crate.check_props,
+        "validate": validate,
+        "as_jsonld": crate.as_jsonld,
+        "dump": lambda: crate.dump(dump_path),
+    }
+
+
+def measure(func: Callable[[], Any], repeat: int) -> Result:
+    """
+    Measure the best time of `repeat` runs, and the peak memory of another run.
+    """
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    # tracemalloc slows down the run, so the memory is measured separately
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {"time": min(times), "peak_memory": peak}
+
+
+def run_benchmarks(
+    schemas: List[str],
+    sizes: List[int],
+    operations: List[str] = OPERATIONS,
+    repeat: int = 3,
+    seed: int = 0,
+) -> List[Result]:
+    """
+    Run the benchmarks.
+
+    Returns:
+        List[Result]: The time in seconds and the peak memory in bytes of each schema, size and operation.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for schema in schemas:
+            for size in sizes:
+                funcs = get_operations(schema, size, seed, Path(tmp_dir))
+                for operation in operations:
+                    result = measure(funcs[operation], repeat)
+                    result.update(
+                        {"schema": schema, "size": size, "operation": operation}
+                    )
+                    print(format_result(result), file=sys.stderr)
+                    results.append(result)
+
+    return results
+
+
+def format_result(result: Result, baseline: Optional[Result] = None) -> str:
+    line = f"{result['schema']:<8} {result['size']:>7} {result['operation']:<12} {result['time']:>10.4f} s {result['peak_memory'] / 2**20:>10.1f} MiB"
+    if baseline is not None:
+        line += f"  (x{result['time'] / baseline['time']:.2f} time, x{result['peak_memory'] / baseline['peak_memory']:.2f} memory)"
+    return line
+
+
+def compare(
+    results: List[Result], baseline: List[Result], threshold: float
+) -> List[str]:
+    """
+    Compare the results with a baseline.
+
+    Returns:
+        List[str]: The results whose time or peak memory is more than `threshold` times that of the baseline.
+    """
+    baseline_map = {(r["schema"], r["size"], r["operation"]): r for r in baseline}
+    regressions = []
+    for result in results:
+        base = baseline_map.get((result["schema"], result["size"], result["operation"]))
+        if base is None:
+            continue
+        if (
+            result["time"] > base["time"] * threshold
+            or result["peak_memory"] > base["peak_memory"] * threshold
+        ):
+            regressions.append(format_result(result, base))
+
+    return regressions
+
+
+def parse_args(args: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--schemas", nargs="+", choices=SCHEMAS, default=SCHEMAS)
+    parser.add_argument("--sizes", nargs="+", type=int, default=SIZES)
+    parser.add_argument(
+        "--operations", nargs="+", choices=OPERATIONS, default=OPERATIONS
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="Save the results as JSON.")
+    parser.add_argument(
+        "--baseline", type=Path, help="Compare with the results saved by --output."
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.2,
+        help="Ratio to the baseline regarded as a regression (default: 1.2).",
+    )
+    return parser.parse_args(args)
+
+
+def main(args: List[str]) -> int:
+    parsed = parse_args(args)
+    results = run_benchmarks(
+        parsed.schemas, parsed.sizes, parsed.operations, parsed.repeat, parsed.seed
+    )
+    if parsed.output is not None:
+        with parsed.output.open("w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if parsed.baseline is not None:
+        with parsed.baseline.open("r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, parsed.threshold)
+        if len(regressions) > 0:
+            print("Regressions:", *regressions, sep="\n", file=sys.stderr)
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Load test of the REST API server without Docker.
+
+The server is started in this process on a free local port, with Flask's development server or waitress,
+or an already running server is given by --url. Concurrent clients POST /validate a synthetic crate and
+poll GET /<request_id> until the validation finishes.
+
+For each server mode, the following are reported:
+
+- post: the latency of POST /validate
+- get: the latency of each GET /<request_id>
+- queue: the time from the response of POST /validate until the job is first seen RUNNING or finished,
+  i.e., the queueing delay, with a resolution of --poll-interval
+- total: the time from sending POST /validate until the result is seen
+- throughput: the number of finished validations per second
+
+Requests rejected by admission control (429 or 503) are counted by status, e.g., "REJECTED_429", without latencies.
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+from unittest import mock
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from waitress.server import create_server
+from werkzeug.serving import make_server
+
+from nii_dg.api import create_app
+from nii_dg.generator import SCHEMAS, generate_jsonld
+
+SERVER_MODES = ["flask", "waitress"]
+FINISHED_STATUS = ["COMPLETE", "FAILED", "EXECUTOR_ERROR", "CANCELED"]
+METRICS = ["post", "get", "queue", "total"]
+
+Result = Dict[str, Any]
+
+
+@contextlib.contextmanager
+def start_server(mode: str, threads: int) -> Iterator[str]:
+    """
+    Start the API server in a thread on a free local port, and yield its URL.
+    """
+    app = create_app()
+    # the access log and the warnings of the task queue would flood the report
+    for name in ["werkzeug", "waitress"]:
+        logging.getLogger(name).setLevel(logging.ERROR)
+    if mode == "flask":
+        flask_server = make_server("127.0.0.1", 0, app, threaded=True)
+        url = f"http://127.0.0.1:{flask_server.server_port}"
+        thread = threading.Thread(target=flask_server.serve_forever, daemon=True)
+        stop = flask_server.shutdown
+    elif mode == "waitress":
+        waitress_server = create_server(app, host="127.0.0.1", port=0, threads=threads)
+        url = f"http://127.0.0.1:{waitress_server.effective_port}"  # type: ignore
+        thread = threading.Thread(target=waitress_server.run, daemon=True)
+
+        def stop() -> None:
+            waitress_server.close()
+            waitress_server.task_dispatcher.shutdown()
+
+    else:
+        raise ValueError(f"Invalid server mode: {mode}. Use one of {SERVER_MODES}.")
+
+    thread.start()
+    try:
+        yield url
+    finally:
+        stop()
+
+
+@contextlib.contextmanager
+def stub_network() -> Iterator[None]:
+    """
+    Make the URLs checked in validate() always accessible, so that the results do not depend on external services.
+    """
+    response = mock.MagicMock(status=200)
+    with mock.patch("nii_dg.check_functions.urlopen", return_value=response):
+        yield
+
+
+def send_request(url: str, body: bytes, poll_interval: float) -> Result:
+    """
+    POST /validate a crate and poll GET /<request_id> until the validation finishes.
+    """
+    start = time.perf_counter()
+    post_request = Request(
+        f"{url}/validate", data=body, headers={"Content-Type": "application/json"}
+    )
+    try:
+        with urlopen(post_request) as res:
+            request_id = json.load(res)["request_id"]
+    except HTTPError as err:
+        if err.code not in (429, 503):
+            raise
+        return {"status": f"REJECTED_{err.code}", **{metric: [] for metric in METRICS}}
+    posted = time.perf_counter()
+
+    get_latencies = []
+    started: Optional[float] = None
+    while True:
+        get_start = time.perf_counter()
+        with urlopen(f"{url}/{request_id}") as res:
+            status = json.load(res)["status"]
+        now = time.perf_counter()
+        get_latencies.append(now - get_start)
+        if started is None and status != "QUEUED":
+            started = now
+        if status in FINISHED_STATUS:
+            break
+        time.sleep(poll_interval)
+
+    return {
+        "status": status,
+        "post": [posted - start],
+        "get": get_latencies,
+        "queue": [(started or now) - posted],
+        "total": [now - start],
+    }
+
+
+def percentile(values: List[float], p: float) -> float:
+    """
+    Get the p-th percentile of the values by the nearest-rank method.
+    """
+    sorted_values = sorted(values)
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def run_load(
+    url: str, body: bytes, n_requests: int, concurrency: int, poll_interval: float
+) -> Result:
+    """
+    Send `n_requests` requests from `concurrency` clients and summarize the latencies.
+
+    Returns:
+        Result: The p50/p95/p99 of each metric in seconds, the throughput and the count of each final status.
+    """
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        futures = [
+            clients.submit(send_request, url, body, poll_interval)
+            for _ in range(n_requests)
+        ]
+        results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+
+    summary: Result = {
+        "requests": n_requests,
+        "concurrency": concurrency,
+        "elapsed": elapsed,
+        "throughput": n_requests / elapsed,
+        "status": dict(Counter(result["status"] for result in results)),
+    }
+    for metric in METRICS:
+        values = [value for result in results for value in result[metric]]
+        if len(values) == 0:
+            continue  # all requests were rejected
+        summary[metric] = {
+            f"p{p}": percentile(values, p) for p in (50, 95, 99)  # type: ignore
+        }
+
+    return summary
+
+
+def format_summary(summary: Result) -> str:
+    lines = [
+        f"=== {summary['mode']}: {summary['requests']} requests, concurrency {summary['concurrency']} ===",
+        f"throughput: {summary['throughput']:.2f} validations/s ({summary['elapsed']:.2f} s), status: {summary['status']}",
+    ]
+    for metric in METRICS:
+        if metric not in summary:
+            continue
+        values = " ".join(
+            f"{name}={value * 1000:.1f}ms" for name, value in summary[metric].items()
+        )
+        lines.append(f"{metric:<6} {values}")
+    return "\n".join(lines)
+
+
+def parse_args(args: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "--modes", nargs="+", choices=SERVER_MODES, default=SERVER_MODES
+    )
+    parser.add_argument(
+        "--threads",
+        nargs="+",
+        type=int,
+        default=[1, 3],
+        help="The numbers of threads of waitress to test (default: 1 3).",
+    )
+    parser.add_argument(
+        "--url",
+        help="Test a running server instead of starting one, e.g., http://localhost:5000.",
+    )
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--schema", choices=SCHEMAS, default="amed")
+    parser.add_argument(
+        "--size", type=int, default=1000, help="The number of entities in the crate."
+    )
+    parser.add_argument(
+        "--crate", type=Path, help="Send this crate instead of a synthetic one."
+    )
+    parser.add_argument("--poll-interval", type=float, default=0.05)
+    parser.add_argument(
+        "--network",
+        action="store_true",
+        help="Access the URLs in the crate, instead of stubbing them in the server started by this script.",
+    )
+    parser.add_argument("--output", type=Path, help="Save the results as JSON.")
+    return parser.parse_args(args)
+
+
+def main(args: List[str]) -> int:
+    parsed = parse_args(args)
+    if parsed.crate is not None:
+        body = parsed.crate.read_bytes()
+    else:
+        body = json.dumps(generate_jsonld(parsed.schema, parsed.size)).encode("utf-8")
+
+    summaries = []
+    if parsed.url is not None:
+        summary = run_load(
+            parsed.url, body, parsed.requests, parsed.concurrency, parsed.poll_interval
+        )
+        summary["mode"] = parsed.url
+        print(format_summary(summary))
+        summaries.append(summary)
+    else:
+        with contextlib.ExitStack() as stack:
+            if not parsed.network:
+                stack.enter_context(stub_network())
+            for mode in parsed.modes:
+                for threads in parsed.threads if mode == "waitress" else [1]:
+                    with start_server(mode, threads) as url:
+                        summary = run_load(
+                            url,
+                            body,
+                            parsed.requests,
+                            parsed.concurrency,
+                            parsed.poll_interval,
+                        )
+                    summary["mode"] = (
+                        f"{mode} (threads={threads})" if mode == "waitress" else mode
+                    )
+                    print(format_summary(summary))
+                    summaries.append(summary)
+
+    if parsed.output is not None:
+        with parsed.output.open("w", encoding="utf-8") as f:
+            json.dump(summaries, f, indent=2)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,13 +1,21 @@
 #!/usr/bin/env python3
 # coding: utf-8
 
+import threading
 from pathlib import Path
 from time import sleep
 from typing import Any
+from unittest import mock
 
 import pytest
 
-from nii_dg.api import create_app
+from nii_dg.api import (create_app, get_job_priority, pool_map, scheduler,
+                        token_map)
+from nii_dg.metrics import EXECUTOR_BUSY_WORKERS
+from nii_dg.ro_crate import ROCrate
+from nii_dg.schema.base import Organization
+from nii_dg.schema.sapporo import SapporoRun
+from nii_dg.utils import DG_CONFIG
 
 HERE = Path(__file__).parent.resolve()
 
@@ -145,3 +153,324 @@ def test_validation_failed_2(client: Any) -> None:
     assert "400 Bad Request" in json_data["message"]
     assert "CrateCheckPropsError" in json_data["message"]
     assert "Errors occurred in <cao.File file_1.txt>" in json_data["message"]
+
+
+def test_validation_with_entity_ids_checks_dependencies_only(client: Any) -> None:
+    """
+    file_1.txt in invalid_crate2 has an invalid contentSize. It is checked only if the requested entities depend on it.
+    """
+    with PAYLOAD_INVALID_CRATE_2_PATH.open("r", encoding="utf-8") as f:
+        payload = f.read()
+    res = client.post("/validate?entityIds=https://example.com/repository", data=payload, content_type="application/json")
+    assert res.status_code == 200
+    assert "request_id" in res.get_json()
+
+    # the DMP looks up the files
+    res = client.post("/validate?entityIds=%23dmp:1", data=payload, content_type="application/json")
+    assert res.status_code == 400
+    assert "Errors occurred in <cao.File file_1.txt>" in res.get_json()["message"]
+
+    res = client.post("/validate?entityIds=unknown", data=payload, content_type="application/json")
+    assert res.status_code == 400
+    assert "Entity ID `unknown` is not found in the crate." in res.get_json()["message"]
+
+
+def test_metrics(client: Any) -> None:
+    with PAYLOAD_SAMPLE_CRATE_PATH.open("r", encoding="utf-8") as f:
+        payload = f.read()
+    res = client.post("/validate", data=payload, content_type="application/json")
+    request_id = res.get_json()["request_id"]
+
+    response = mock.MagicMock(status=200)
+    with mock.patch("nii_dg.check_functions.urlopen", return_value=response):
+        for _ in range(50):
+            sleep(0.2)
+            if client.get(f"/{request_id}").get_json()["status"] == "COMPLETE":
+                break
+
+    res = client.get("/metrics")
+    assert res.status_code == 200
+    assert res.content_type.startswith("text/plain; version=0.0.4")
+    metrics = res.get_data(as_text=True)
+    assert 'nii_dg_http_requests_total{method="POST",endpoint="/validate",status="200"}' in metrics
+    # requests are counted by the URL rule, not by the request ID
+    assert 'endpoint="/<string:request_id>"' in metrics
+    assert request_id not in metrics
+    assert "nii_dg_job_queue_length 0.0" in metrics
+    assert 'nii_dg_executor_workers{pool="default"} 3.0' in metrics
+    assert 'nii_dg_job_queue_wait_seconds_count{priority="fast"}' in metrics
+    assert 'nii_dg_jobs_total{status="COMPLETE"}' in metrics
+    assert 'nii_dg_phase_duration_seconds_count{phase="check_props"}' in metrics
+    assert 'nii_dg_phase_duration_seconds_count{phase="validate"}' in metrics
+    assert 'nii_dg_entity_validation_duration_seconds_count{entity_type="cao.DMP"}' in metrics
+    assert 'nii_dg_url_check_duration_seconds_count{result="accessible"}' in metrics
+
+
+def test_profile(client: Any) -> None:
+    with PAYLOAD_SAMPLE_CRATE_PATH.open("r", encoding="utf-8") as f:
+        payload = f.read()
+    res = client.post("/validate?profile", data=payload, content_type="application/json")
+    request_id = res.get_json()["request_id"]
+
+    response = mock.MagicMock(status=200)
+    with mock.patch("nii_dg.check_functions.urlopen", return_value=response):
+        for _ in range(50):
+            sleep(0.2)
+            if client.get(f"/{request_id}").get_json()["status"] == "COMPLETE":
+                break
+
+    assert "profile" not in client.get(f"/{request_id}").get_json()
+    profile = client.get(f"/{request_id}?profile").get_json()["profile"]
+    assert profile["total"] > 0
+    assert set(profile["phases"]) == {"check_props", "validate"}
+    assert profile["entityClasses"]["cao.DMP"]["count"] == 1
+    assert len(profile["slowestEntities"]) > 0
+    assert len(profile["slowestUrls"]) > 0
+
+    # not profiled unless requested
+    res = client.post("/validate", data=payload, content_type="application/json")
+    request_id = res.get_json()["request_id"]
+    assert client.get(f"/{request_id}?profile").get_json()["profile"] is None
+
+
+def test_cancel_running_validation(client: Any) -> None:
+    with PAYLOAD_SAMPLE_CRATE_PATH.open("r", encoding="utf-8") as f:
+        payload = f.read()
+    released = threading.Event()
+
+    def access(request: Any, timeout: float) -> Any:
+        # a slow URL check, which keeps the job RUNNING
+        released.wait(10)
+        return mock.MagicMock(status=200)
+
+    with mock.patch("nii_dg.check_functions.urlopen", side_effect=access):
+        res = client.post("/validate", data=payload, content_type="application/json")
+        request_id = res.get_json()["request_id"]
+        for _ in range(50):
+            sleep(0.1)
+            if client.get(f"/{request_id}").get_json()["status"] == "RUNNING":
+                break
+
+        res = client.post(f"/{request_id}/cancel")
+        assert res.status_code == 200
+        assert client.get(f"/{request_id}").get_json()["status"] == "CANCELING"
+
+        released.set()
+        for _ in range(50):
+            sleep(0.1)
+            if client.get(f"/{request_id}").get_json()["status"] == "CANCELED":
+                break
+        assert client.get(f"/{request_id}").get_json()["status"] == "CANCELED"
+
+    # a finished job cannot be cancelled
+    res = client.post(f"/{request_id}/cancel")
+    assert res.status_code == 400
+
+
+def test_validation_timeout(client: Any) -> None:
+    with PAYLOAD_SAMPLE_CRATE_PATH.open("r", encoding="utf-8") as f:
+        payload = f.read()
+
+    def access(request: Any, timeout: float) -> Any:
+        # a URL that does not respond until the timeout
+        sleep(timeout)
+        raise OSError("timed out")
+
+    for timeout in ["0", "-1", "abc", "1e9"]:
+        res = client.post(f"/validate?timeout={timeout}", data=payload, content_type="application/json")
+        assert res.status_code == 400
+
+    with mock.patch("nii_dg.check_functions.urlopen", side_effect=access):
+        res = client.post("/validate?timeout=0.5", data=payload, content_type="application/json")
+        assert res.status_code == 200
+        request_id = res.get_json()["request_id"]
+        for _ in range(50):
+            sleep(0.1)
+            if client.get(f"/{request_id}").get_json()["status"] not in ["QUEUED", "RUNNING"]:
+                break
+
+    res_body = client.get(f"/{request_id}").get_json()
+    assert res_body["status"] == "EXECUTOR_ERROR"
+    assert res_body["results"][0]["err_msg"] == "The validation did not finish within 0.5 seconds."
+
+
+def test_validation_without_timeout(client: Any) -> None:
+    with PAYLOAD_SAMPLE_CRATE_PATH.open("r", encoding="utf-8") as f:
+        payload = f.read()
+
+    response = mock.MagicMock(status=200)
+    with mock.patch("nii_dg.check_functions.urlopen", return_value=response):
+        res = client.post("/validate", data=payload, content_type="application/json")
+        request_id = res.get_json()["request_id"]
+        for _ in range(50):
+            sleep(0.1)
+            if client.get(f"/{request_id}").get_json()["status"] == "COMPLETE":
+                break
+    assert client.get(f"/{request_id}").get_json()["status"] == "COMPLETE"
+    # no deadline is set unless it is asked for, e.g., for long workflow re-executions
+    assert token_map[request_id].timeout is None
+
+
+def test_forget_finished_requests(client: Any) -> None:
+    with PAYLOAD_SAMPLE_CRATE_PATH.open("r", encoding="utf-8") as f:
+        payload = f.read()
+
+    response = mock.MagicMock(status=200)
+    with mock.patch("nii_dg.check_functions.urlopen", return_value=response), mock.patch.dict(DG_CONFIG, {"DG_JOB_RECORD_TTL": 0.5}):
+        res = client.post("/validate", data=payload, content_type="application/json")
+        request_id = res.get_json()["request_id"]
+        for _ in range(50):
+            sleep(0.1)
+            if client.get(f"/{request_id}").get_json()["status"] == "COMPLETE":
+                break
+        # the RO-Crate is not kept once the job is queued
+        assert client.get(f"/{request_id}").get_json()["request"] == {"entityIds": []}
+
+        sleep(0.5)
+        # the finished requests are forgotten when a new request arrives
+        client.post("/validate", data=payload, content_type="application/json")
+        res = client.get(f"/{request_id}")
+        assert res.status_code == 400
+        assert request_id not in token_map
+
+
+def test_job_priority() -> None:
+    crate = ROCrate()
+    crate.add(Organization("https://example.com/org", {"name": "Org"}))
+    assert get_job_priority(crate, []) == "fast"
+    with mock.patch.dict(DG_CONFIG, {"DG_FAST_JOB_MAX_ENTITIES": 1}):
+        assert get_job_priority(crate, []) == "bulk"
+        assert get_job_priority(crate, crate.get_by_type(Organization)) == "fast"
+
+    # a sapporo re-execution runs in the workflow pool
+    crate.add(SapporoRun(props={"workflow_engine_name": "cwltool", "sapporo_location": "http://localhost:1122", "state": "COMPLETE"}))
+    assert get_job_priority(crate, []) == "workflow"
+
+
+def test_follow_up_work_waits_for_free_worker() -> None:
+    # e.g., checking the outputs of a finished sapporo run
+    pool = pool_map["workflow"]
+    released = threading.Event()
+    futures = [pool.submit(released.wait, 10) for _ in range(pool.max_workers + 1)]
+    sleep(0.5)
+    assert EXECUTOR_BUSY_WORKERS.get(pool="workflow") == pool.max_workers
+    assert not futures[-1].running()
+
+    released.set()
+    for future in futures:
+        assert future.result(timeout=5)
+    sleep(0.1)
+    assert EXECUTOR_BUSY_WORKERS.get(pool="workflow") == 0
+
+
+def test_cancel_queued_validation(client: Any) -> None:
+    with PAYLOAD_SAMPLE_CRATE_PATH.open("r", encoding="utf-8") as f:
+        payload = f.read()
+    released = threading.Event()
+
+    def access(request: Any, timeout: float) -> Any:
+        released.wait(10)
+        return mock.MagicMock(status=200)
+
+    with mock.patch("nii_dg.check_functions.urlopen", side_effect=access):
+        # keep all workers of the default pool busy, so that the last request stays queued
+        request_ids = []
+        for _ in range(DG_CONFIG["DG_JOB_WORKERS"] + 1):
+            res = client.post("/validate", data=payload, content_type="application/json", headers={"X-Client-Id": "test"})
+            request_ids.append(res.get_json()["request_id"])
+        sleep(0.5)
+        assert client.get(f"/{request_ids[-1]}").get_json()["status"] == "QUEUED"
+
+        res = client.post(f"/{request_ids[-1]}/cancel")
+        assert res.status_code == 200
+        assert client.get(f"/{request_ids[-1]}").get_json()["status"] == "CANCELED"
+        released.set()
+
+
+def test_reject_large_crate(client: Any) -> None:
+    with PAYLOAD_SAMPLE_CRATE_PATH.open("r", encoding="utf-8") as f:
+        payload = f.read()
+    with mock.patch.dict(DG_CONFIG, {"DG_MAX_CRATE_SIZE": 10}):
+        res = client.post("/validate", data=payload, content_type="application/json")
+    assert res.status_code == 413
+    assert res.get_json() == {"message": "The RO-Crate exceeds the maximum size of 10 bytes."}
+
+
+def test_reject_when_queue_is_full(client: Any) -> None:
+    with PAYLOAD_SAMPLE_CRATE_PATH.open("r", encoding="utf-8") as f:
+        payload = f.read()
+    with mock.patch.dict(DG_CONFIG, {"DG_MAX_QUEUED_JOBS": 5, "DG_HEALTH_MAX_QUEUED_JOBS": 4, "DG_RETRY_AFTER": 30}):
+        with mock.patch.object(scheduler, "qsize", return_value=4):
+            # the load balancer is told to stop sending requests before they are rejected
+            res = client.get("/healthcheck")
+            assert res.status_code == 503
+            assert res.headers["Retry-After"] == "30"
+            assert res.get_json() == {"message": "Too many queued jobs", "queuedJobs": 4}
+            res = client.post("/validate", data=payload, content_type="application/json")
+            assert res.status_code == 200
+        with mock.patch.object(scheduler, "qsize", return_value=5):
+            res = client.post("/validate", data=payload, content_type="application/json")
+            assert res.status_code == 503
+            assert res.headers["Retry-After"] == "30"
+    assert 'nii_dg_rejected_requests_total{reason="queue_full"}' in client.get("/metrics").get_data(as_text=True)
+
+
+def test_reject_too_many_jobs_of_client(client: Any) -> None:
+    with PAYLOAD_SAMPLE_CRATE_PATH.open("r", encoding="utf-8") as f:
+        payload = f.read()
+    released = threading.Event()
+
+    def access(request: Any, timeout: float) -> Any:
+        released.wait(10)
+        return mock.MagicMock(status=200)
+
+    with mock.patch("nii_dg.check_functions.urlopen", side_effect=access), mock.patch.dict(DG_CONFIG, {"DG_MAX_JOBS_PER_CLIENT": 1}):
+        res = client.post("/validate", data=payload, content_type="application/json", headers={"X-Client-Id": "busy"})
+        assert res.status_code == 200
+        request_id = res.get_json()["request_id"]
+        res = client.post("/validate", data=payload, content_type="application/json", headers={"X-Client-Id": "busy"})
+        assert res.status_code == 429
+        assert res.headers["Retry-After"] == str(DG_CONFIG["DG_RETRY_AFTER"])
+        # other clients are not limited
+        res = client.post("/validate", data=payload, content_type="application/json", headers={"X-Client-Id": "other"})
+        assert res.status_code == 200
+
+        released.set()
+        for _ in range(50):
+            sleep(0.1)
+            if client.get(f"/{request_id}").get_json()["status"] == "COMPLETE":
+                break
+        # the client can submit again once its job has finished
+        res = client.post("/validate", data=payload, content_type="application/json", headers={"X-Client-Id": "busy"})
+        assert res.status_code == 200
+
+
+def test_concurrent_requests_of_client(client: Any) -> None:
+    with PAYLOAD_SAMPLE_CRATE_PATH.open("r", encoding="utf-8") as f:
+        payload = f.read()
+    released = threading.Event()
+
+    def access(request: Any, timeout: float) -> Any:
+        released.wait(10)
+        return mock.MagicMock(status=200)
+
+    requests = 8
+    barrier = threading.Barrier(requests)
+    status_codes = []
+
+    def post() -> None:
+        # a client per thread, as the contexts of a test client are not shared between threads
+        thread_client = client.application.test_client()
+        barrier.wait()
+        res = thread_client.post("/validate", data=payload, content_type="application/json", headers={"X-Client-Id": "racing"})
+        status_codes.append(res.status_code)
+
+    with mock.patch("nii_dg.check_functions.urlopen", side_effect=access), mock.patch.dict(DG_CONFIG, {"DG_MAX_JOBS_PER_CLIENT": 2}):
+        # the requests pass the early check together, but only as many as the limit are queued
+        threads = [threading.Thread(target=post) for _ in range(requests)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        released.set()
+    assert sorted(status_codes) == [200] * 2 + [429] * (requests - 2)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import importlib.util
+import json
+from pathlib import Path
+
+from nii_dg.generator import SCHEMAS
+
+# === load test module ===
+
+here = Path(__file__).parent.resolve()
+test_module_path = here.joinpath("../benchmark/run_benchmark.py").resolve()
+spec = importlib.util.spec_from_file_location("run_benchmark", test_module_path)
+test_module = importlib.util.module_from_spec(spec)  # type: ignore
+spec.loader.exec_module(test_module)  # type: ignore
+
+load_test_module_path = here.joinpath("../benchmark/run_load_test.py").resolve()
+spec = importlib.util.spec_from_file_location("run_load_test", load_test_module_path)
+load_test_module = importlib.util.module_from_spec(spec)  # type: ignore
+spec.loader.exec_module(load_test_module)  # type: ignore
+
+
+def test_run_benchmarks() -> None:
+    results = test_module.run_benchmarks(SCHEMAS, [20], repeat=1)
+
+    assert len(results) == len(SCHEMAS) * len(test_module.OPERATIONS)
+    for result in results:
+        assert result["time"] > 0
+        assert result["peak_memory"] > 0
+
+
+def test_compare_with_baseline(tmp_path: Path) -> None:
+    output = tmp_path.joinpath("results.json")
+    args = ["--schemas", "base", "--sizes", "20", "--repeat", "1"]
+    assert test_module.main([*args, "--output", str(output)]) == 0
+
+    with output.open("r", encoding="utf-8") as f:
+        results = json.load(f)
+    assert test_module.compare(results, results, 1.2) == []
+
+    faster = [{**r, "time": r["time"] / 10} for r in results]
+    assert len(test_module.compare(results, faster, 1.2)) == len(results)
+
+
+def test_run_load_test(tmp_path: Path) -> None:
+    output = tmp_path.joinpath("load.json")
+    args = ["--threads", "2", "--requests", "4", "--concurrency", "2"]
+    args += ["--schema", "base", "--size", "20", "--output", str(output)]
+    assert load_test_module.main(args) == 0
+
+    with output.open("r", encoding="utf-8") as f:
+        summaries = json.load(f)
+    assert [summary["mode"] for summary in summaries] == [
+        "flask",
+        "waitress (threads=2)",
+    ]
+    for summary in summaries:
+        assert summary["status"] == {"COMPLETE": 4}
+        assert summary["throughput"] > 0
+        for metric in load_test_module.METRICS:
+            assert 0 <= summary[metric]["p50"] <= summary[metric]["p99"]
+
+
+def test_percentile() -> None:
+    values = [float(v) for v in range(1, 101)]
+    assert load_test_module.percentile(values, 50) == 50
+    assert load_test_module.percentile(values, 99) == 99
+    assert load_test_module.percentile([1.0], 95) == 1.0
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+from concurrent.futures import CancelledError
+from time import sleep
+from typing import Any, List
+from unittest import mock
+
+import pytest
+
+from nii_dg.cancellation import (CancelToken, cancellable, check_cancelled,
+                                 get_cancel_token, get_timeout)
+from nii_dg.ro_crate import ROCrate
+from nii_dg.schema.base import Organization
+
+
+def test_cancel_token() -> None:
+    token = CancelToken()
+    called: List[str] = []
+    token.add_callback(lambda: called.append("before"))
+    assert not token.cancelled
+
+    with cancellable(token):
+        assert get_cancel_token() is token
+        check_cancelled()
+        token.cancel()
+        with pytest.raises(CancelledError):
+            check_cancelled()
+    assert get_cancel_token() is None
+    check_cancelled()
+
+    token.cancel()
+    token.add_callback(lambda: called.append("after"))
+    assert called == ["before", "after"]
+
+
+def test_cancel_validation_between_entities() -> None:
+    crate = ROCrate()
+    for i in range(3):
+        crate.add(Organization(f"https://example.com/org_{i}", {"name": f"Org {i}"}))
+
+    token = CancelToken()
+    urls: List[str] = []
+
+    def access(request: Any, timeout: float) -> Any:
+        urls.append(request.full_url)
+        token.cancel()
+        return mock.MagicMock(status=200)
+
+    with mock.patch("nii_dg.check_functions.urlopen", side_effect=access):
+        with cancellable(token), pytest.raises(CancelledError):
+            crate.validate()
+    # the validation stops after the URL being accessed when it is cancelled
+    assert len(urls) == 1
+
+
+def test_deadline() -> None:
+    assert get_timeout(30) == 30
+    token = CancelToken()
+    with cancellable(token):
+        assert get_timeout(30) == 30
+        token.set_deadline(10)
+        # outbound requests do not outlive the deadline
+        assert get_timeout(30) <= 10
+        assert get_timeout(1) == 1
+    token.close()
+    assert not token.cancelled
+
+
+def test_deadline_stops_validation() -> None:
+    crate = ROCrate()
+    crate.add(Organization("https://example.com/org_0", {"name": "Org 0"}))
+
+    token = CancelToken()
+    timeouts: List[float] = []
+
+    def access(request: Any, timeout: float) -> Any:
+        # a URL that does not respond until the timeout
+        timeouts.append(timeout)
+        sleep(timeout)
+        raise OSError("timed out")
+
+    token.set_deadline(0.2)
+    with mock.patch("nii_dg.check_functions.urlopen", side_effect=access):
+        with cancellable(token), pytest.raises(TimeoutError) as exc_info:
+            crate.validate()
+    assert token.timed_out
+    assert timeouts[0] <= 0.2
+    assert str(exc_info.value) == "The validation did not finish within 0.2 seconds."
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+from nii_dg.schema.amed import File as AmedFile
+from nii_dg.schema.base import File
+
+
+def test_entity_equality() -> None:
+    file_1 = File("a.txt", {"name": "a.txt"})
+    file_2 = File("a.txt", {"name": "other name"})
+    amed_file = AmedFile("a.txt", {"name": "a.txt"})
+
+    # the same @id and @context
+    assert file_1 == file_2
+    assert hash(file_1) == hash(file_2)
+    assert len({file_1, file_2}) == 1
+    # the same @id, but a different @context
+    assert file_1 != amed_file
+    assert file_1 != File("b.txt", {"name": "a.txt"})
+
+    # references
+    assert file_1 == {"@id": "a.txt"}
+    assert {"@id": "a.txt"} == file_1
+    assert file_1 in [{"@id": "b.txt"}, {"@id": "a.txt"}]
+    assert file_1 == {"@id": "a.txt", "@context": file_1.context}
+    assert file_1 != {"@id": "a.txt", "@context": amed_file.context}
+    assert file_1 != {"@id": "b.txt"}
+    assert file_1 != {"name": "a.txt"}
+    assert file_1 != "a.txt"
+
+
+def test_entity_hash_after_rename() -> None:
+    file = File("a.txt", {"name": "a.txt"})
+    files = {file}
+
+    # renamed while in the set, it stays at the slot of its old hash,
+    # where it is no longer equal to an entity with the old @id
+    file._set_special_item("@id", "b.txt")
+    assert File("a.txt", {"name": "a.txt"}) not in files
+
+    # renamed after it is removed, and added again
+    file._set_special_item("@id", "a.txt")
+    files.remove(file)
+    file._set_special_item("@id", "b.txt")
+    files.add(file)
+    assert file in files
+    assert File("b.txt", {"name": "a.txt"}) in files
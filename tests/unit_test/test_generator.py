@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+from nii_dg.error import CrateCheckPropsError
+from nii_dg.generator import (SCHEMAS, CrateShape, generate_crate,
+                              generate_entities, generate_jsonld, write_crate)
+from nii_dg.ro_crate import ROCrate
+from nii_dg.schema.amed import DMP
+from nii_dg.schema.base import File
+
+
+@pytest.mark.parametrize("schema", SCHEMAS)
+def test_generate_crate(schema: str) -> None:
+    crate = generate_crate(schema, 300)
+    assert len(crate.all_entities) == 302
+
+    crate.check_duplicate_entity()
+    crate.check_props()
+    if schema != "sapporo":
+        # sapporo re-executes the workflow, which is covered by the benchmark
+        response = mock.MagicMock(status=200)
+        with mock.patch("nii_dg.check_functions.urlopen", return_value=response):
+            crate.validate()
+
+
+def test_generate_jsonld_is_deterministic() -> None:
+    jsonld = generate_jsonld("base", 50, seed=1)
+    assert jsonld == generate_jsonld("base", 50, seed=1)
+    assert jsonld != generate_jsonld("base", 50, seed=2)
+    assert ROCrate(jsonld).as_jsonld() == jsonld
+
+    with pytest.raises(ValueError):
+        generate_entities("unknown", 10)
+
+
+@pytest.mark.parametrize("schema", SCHEMAS)
+def test_write_crate_is_same_as_dump(tmp_path: Path, schema: str) -> None:
+    shape = CrateShape(files_per_dataset=3, files_per_dmp=2, depth=4)
+    crate = generate_crate(schema, 100, seed=1, shape=shape)
+    assert len(crate.all_entities) == 102
+    crate.check_props()
+
+    crate.dump(tmp_path.joinpath("crate.json"))
+    with tmp_path.joinpath("stream.json").open("w", encoding="utf-8") as f:
+        write_crate(f, schema, 100, seed=1, shape=shape)
+    assert (
+        tmp_path.joinpath("stream.json").read_text()
+        == tmp_path.joinpath("crate.json").read_text()
+    )
+
+
+def test_generate_deep_and_invalid_crates() -> None:
+    crate = generate_crate("ginfork", 200, shape=CrateShape(depth=5))
+    ids = [entity.id for entity in crate.data_entities]
+    assert "experiment_0/source/level_1/level_2/level_3/level_4/" in ids
+    response = mock.MagicMock(status=200)
+    with mock.patch("nii_dg.check_functions.urlopen", return_value=response):
+        crate.validate()
+
+    crate = generate_crate("amed", 100, shape=CrateShape(files_per_dmp=1))
+    assert len(crate.get_by_type(DMP)) == 50
+
+    crate = generate_crate("base", 100, shape=CrateShape(invalid_ratio=1.0))
+    with pytest.raises(CrateCheckPropsError) as e:
+        crate.check_props()
+    assert str(e.value).count("EntityError") == len(crate.get_by_type(File))
+
+    with pytest.raises(ValueError):
+        CrateShape(depth=0)
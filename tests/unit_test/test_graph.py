@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import copy
+
+import pytest
+
+from nii_dg.const import RO_CRATE_CONTEXT
+from nii_dg.ro_crate import ROCrate
+from nii_dg.schema.amed import DMP, DMPMetadata, File
+
+
+def build_crate() -> ROCrate:
+    crate = ROCrate()
+    dmp_1 = DMP("#dmp:1", {"dataNumber": 1})
+    dmp_2 = DMP("#dmp:2", {"dataNumber": 2})
+    dmp_metadata = DMPMetadata(props={"about": crate.root, "hasPart": [dmp_1, dmp_2]})
+    crate.add(dmp_metadata, dmp_1, dmp_2)
+    crate.add(
+        File("a.txt", {"dmpDataNumber": dmp_1}),
+        File("b.txt", {"dmpDataNumber": {"@id": "#dmp:1"}}),
+    )
+    return crate
+
+
+def test_reference_graph() -> None:
+    crate = build_crate()
+    graph = crate.graph
+    dmp_metadata, dmp_1, dmp_2 = crate.contextual_entities
+    file_a, file_b = crate.data_entities
+
+    assert graph.get("#dmp:1") == [dmp_1]
+    assert graph.references(dmp_metadata) == {
+        "about": ["./"],
+        "hasPart": ["#dmp:1", "#dmp:2"],
+    }
+    assert graph.referrers(dmp_1) == [
+        (dmp_metadata, "hasPart"),
+        (file_a, "dmpDataNumber"),
+        (file_b, "dmpDataNumber"),
+    ]
+    assert graph.referrers("b.txt") == [(crate.root, "hasPart")]
+
+    assert graph.walk(file_a) == [file_a, dmp_1]
+    assert graph.walk(dmp_2, reverse=True) == [dmp_2, dmp_metadata]
+    assert graph.walk(crate.root) == [crate.root, file_a, file_b, dmp_1]
+
+    # __setitem__ and __delitem__ are observed
+    file_b["dmpDataNumber"] = dmp_2
+    assert (file_b, "dmpDataNumber") not in graph.referrers(dmp_1)
+    assert (file_b, "dmpDataNumber") in graph.referrers(dmp_2)
+    del file_b["dmpDataNumber"]
+    assert graph.referrers(dmp_2) == [(dmp_metadata, "hasPart")]
+
+    # in-place mutation requires refresh()
+    dmp_metadata["hasPart"].pop()
+    graph.refresh(dmp_metadata)
+    assert graph.referrers(dmp_2) == []
+
+    # a copy is not observed
+    file_c = copy.deepcopy(file_a)
+    file_c["dmpDataNumber"] = dmp_2
+    assert (file_c, "dmpDataNumber") not in graph.referrers(dmp_2)
+
+
+def test_remove_with_dangling_references() -> None:
+    crate = build_crate()
+    dmp_metadata, dmp_1, dmp_2 = crate.contextual_entities
+    file_a, file_b = crate.data_entities
+
+    assert crate.graph.dangling() == []
+    assert crate.graph.dangling(removed=[dmp_1]) == [
+        (dmp_metadata, "hasPart", "#dmp:1"),
+        (file_a, "dmpDataNumber", "#dmp:1"),
+        (file_b, "dmpDataNumber", "#dmp:1"),
+    ]
+
+    with pytest.raises(ValueError):
+        crate.remove(dmp_1, check_references=True)
+    assert dmp_1 in crate.graph
+
+    # referenced only by the RootDataEntity
+    crate.remove(file_a, file_b, check_references=True)
+    assert crate.graph.referrers("a.txt") == []
+    assert file_a not in crate.graph
+
+    crate.remove(dmp_1)
+    assert crate.graph.dangling() == [(dmp_metadata, "hasPart", "#dmp:1")]
+
+
+def test_graph_after_from_jsonld() -> None:
+    jsonld = {
+        "@context": RO_CRATE_CONTEXT,
+        "@graph": [entity.as_jsonld() for entity in build_crate().all_entities],
+    }
+    crate = ROCrate()
+    old_root = crate.root
+    crate.from_jsonld(jsonld)
+
+    file_a, file_b = crate.data_entities
+    assert crate.root is not old_root
+    assert old_root not in crate.graph
+    assert crate.root["hasPart"] == [file_a, file_b]
+    assert crate.graph.referrers(file_a) == [(crate.root, "hasPart")]
+    assert crate.get_by_id("a.txt") == [file_a]
+    assert len(crate.graph.referrers("#dmp:1")) == 3
+
+
+def test_rename_and_remove() -> None:
+    crate = build_crate()
+    dmp_metadata, dmp_1, dmp_2 = crate.contextual_entities
+    file_a, file_b = crate.data_entities
+
+    file_a._set_special_item("@id", "c.txt")
+    assert crate.get_by_id("a.txt") == []
+    assert crate.get_by_id("c.txt") == [file_a]
+    # the RootDataEntity holds the entity itself, so its reference follows the new @id
+    assert crate.graph.referrers("c.txt") == [(crate.root, "hasPart")]
+    assert crate.graph.referrers("a.txt") == []
+
+    dmp_1._set_special_item("@id", "#dmp:3")
+    # the {"@id": ...} dict of file_b still references the old @id
+    assert crate.graph.dangling() == [(file_b, "dmpDataNumber", "#dmp:1")]
+    assert crate.graph.dangling(removed=[dmp_1]) == [
+        (dmp_metadata, "hasPart", "#dmp:3"),
+        (file_a, "dmpDataNumber", "#dmp:3"),
+    ]
+
+    crate.remove(file_a, check_references=True)
+    assert file_a not in crate.graph
+    assert crate.get_by_id("c.txt") == []
+    assert crate.graph.referrers("c.txt") == []
+    crate.remove(dmp_1)
+    assert crate.get_by_id("#dmp:3") == []
+
+
+def test_list_modified_in_place() -> None:
+    crate = build_crate()
+    dmp_metadata, dmp_1, dmp_2 = crate.contextual_entities
+    dmp_3 = DMP("#dmp:3", {"dataNumber": 3})
+    crate.add(dmp_3)
+
+    dmp_metadata["hasPart"].append(dmp_3)
+    assert crate.graph.referrers(dmp_3) == [(dmp_metadata, "hasPart")]
+    with pytest.raises(ValueError):
+        crate.remove(dmp_3, check_references=True)
+
+    dmp_metadata["hasPart"].remove(dmp_3)
+    assert crate.graph.referrers(dmp_3) == []
+    crate.remove(dmp_3, check_references=True)
+
+
+def test_add_twice() -> None:
+    crate = ROCrate()
+    file = File("h.txt", {"contentSize": "1B"})
+    crate.add(file)
+    crate.add(file)
+    assert crate.data_entities == [file]
+    assert crate.graph.referrers(file) == [(crate.root, "hasPart")]
+
+    crate.remove(file)
+    assert crate.data_entities == []
+    assert crate.graph.referrers("h.txt") == []
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+from unittest import mock
+
+import pytest
+
+from nii_dg.check_functions import is_url_accessible
+from nii_dg.metrics import (CACHE_REQUESTS, URL_CHECK_DURATION, Counter, Gauge,
+                            Histogram, Registry)
+from nii_dg.ro_crate import ROCrate
+
+
+def test_render_metrics() -> None:
+    registry = Registry()
+    counter = registry.register(
+        Counter("requests_total", "The number of requests.", ["path"])
+    )
+    gauge = registry.register(Gauge("queue_length", "The length of the queue."))
+    histogram = registry.register(
+        Histogram("duration_seconds", "The duration.", buckets=[0.1, 1.0])
+    )
+    assert isinstance(counter, Counter)
+    assert isinstance(gauge, Gauge)
+    assert isinstance(histogram, Histogram)
+
+    counter.inc(path='/a"b')
+    counter.inc(2, path='/a"b')
+    gauge.set_function(lambda: 3)
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    assert registry.render() == "\n".join(
+        [
+            "# HELP requests_total The number of requests.",
+            "# TYPE requests_total counter",
+            'requests_total{path="/a\\"b"} 3.0',
+            "# HELP queue_length The length of the queue.",
+            "# TYPE queue_length gauge",
+            "queue_length 3.0",
+            "# HELP duration_seconds The duration.",
+            "# TYPE duration_seconds histogram",
+            'duration_seconds_bucket{le="0.1"} 1.0',
+            'duration_seconds_bucket{le="1.0"} 2.0',
+            'duration_seconds_bucket{le="+Inf"} 3.0',
+            "duration_seconds_sum 5.55",
+            "duration_seconds_count 3.0",
+            "",
+        ]
+    )
+
+    with pytest.raises(ValueError):
+        counter.inc(method="GET")
+    with pytest.raises(ValueError):
+        registry.register(Gauge("queue_length", "Duplicated."))
+
+
+def test_cache_and_url_check_metrics() -> None:
+    crate = ROCrate()
+    hits = CACHE_REQUESTS.get(cache="entity_index", result="hit")
+    misses = CACHE_REQUESTS.get(cache="entity_index", result="miss")
+    with crate.validation_pass():
+        crate.get_by_id("./")
+        crate.get_by_id("./")
+    assert CACHE_REQUESTS.get(cache="entity_index", result="miss") == misses + 1
+    assert CACHE_REQUESTS.get(cache="entity_index", result="hit") == hits + 1
+
+    count = URL_CHECK_DURATION.get_count(result="accessible")
+    response = mock.MagicMock(status=200)
+    with mock.patch("nii_dg.check_functions.urlopen", return_value=response):
+        assert is_url_accessible("https://example.com")
+    assert URL_CHECK_DURATION.get_count(result="accessible") == count + 1
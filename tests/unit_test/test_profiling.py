@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+from typing import Any, List, Optional
+from unittest import mock
+
+import pytest
+
+from nii_dg.entity import Entity
+from nii_dg.error import CrateValidationError
+from nii_dg.profiling import (CHECK, CHECK_PROPS, HTTP, VALIDATE, get_profiler,
+                              profile, timed)
+from nii_dg.ro_crate import ROCrate
+from nii_dg.schema.base import File, Organization
+
+
+def test_profile_crate() -> None:
+    crate = ROCrate()
+    crate.add(File("file_1.txt", {"name": "file 1", "contentSize": "1KB"}))
+    crate.add(Organization("https://example.com/org", {"name": "Org"}))
+
+    timings: List[Any] = []
+
+    def callback(
+        kind: str, name: str, entity: Optional[Entity], seconds: float
+    ) -> None:
+        timings.append((kind, name, entity))
+
+    response = mock.MagicMock(status=200)
+    with mock.patch("nii_dg.check_functions.urlopen", return_value=response):
+        with profile() as profiler:
+            profiler.add_callback(callback)
+            assert get_profiler() is profiler
+            crate.check_props()
+            crate.validate()
+    assert get_profiler() is None
+
+    summary = profiler.summary()
+    assert summary[CHECK_PROPS]["base.File"]["count"] == 1
+    assert summary[VALIDATE]["base.Organization"]["count"] == 1
+    assert summary[VALIDATE]["ro-crate.Dataset"]["count"] == 1
+    assert summary[CHECK]["base.File:_check_prop_types"]["count"] == 1
+    assert summary[CHECK]["base.File:contentSize(is_content_size)"]["count"] == 1
+    assert summary[HTTP]["https://example.com/org"]["count"] == 1
+    assert profiler.entity_stats[("base.File", "file_1.txt")].count == 2
+    assert ("http", "https://example.com/org", None) in timings
+    assert len(profiler.report(top=1)["slowestChecks"]) == 1
+
+    # nothing is recorded without an active profiler
+    crate.check_props()
+    assert profiler.summary() == summary
+    with timed(CHECK, "unused"):
+        pass
+
+
+def test_validate_with_profile() -> None:
+    crate = ROCrate()
+    crate.add(File("file_1.txt", {"name": "file 1", "contentSize": "1KB"}))
+    crate.add(Organization("https://example.com/org", {"name": "Org"}))
+
+    response = mock.MagicMock(status=200)
+    with mock.patch("nii_dg.check_functions.urlopen", return_value=response):
+        assert crate.validate() is None
+        report = crate.validate(profile=True)
+    assert report is not None
+    assert report["total"] == report["phases"][VALIDATE] > 0
+    assert report["entityClasses"]["base.File"]["count"] == 1
+    assert report["entityClasses"]["base.Organization"]["validate"] > 0
+    assert len(report["slowestEntities"]) == len(crate.all_entities)
+    assert report["slowestUrls"][0]["url"] == "https://example.com/org"
+
+    with mock.patch("nii_dg.check_functions.urlopen", side_effect=Exception):
+        with pytest.raises(CrateValidationError) as e:
+            crate.validate(profile=True)
+    assert e.value.profile is not None
+    assert e.value.profile["slowestUrls"][0]["url"] == "https://example.com/org"
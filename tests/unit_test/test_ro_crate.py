@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import copy
+import threading
+from time import sleep
+from typing import Any, Dict, List
+
+import pytest
+
+from nii_dg.const import RO_CRATE_CONTEXT
+from nii_dg.entity import RootDataEntity
+from nii_dg.entity_list import EntityList
+from nii_dg.error import CrateCheckPropsError, CrateError
+from nii_dg.ro_crate import ROCrate
+from nii_dg.schema.amed import DMP, File
+from nii_dg.schema.base import File as BaseFile
+
+
+def build_crate() -> ROCrate:
+    crate = ROCrate()
+    dmp_1 = DMP("#dmp:1", {"dataNumber": 1, "contentSize": "1GB"})
+    dmp_2 = DMP("#dmp:2", {"dataNumber": 2, "contentSize": "1GB"})
+    crate.add(dmp_1, dmp_2)
+    crate.add(
+        File("a.txt", {"contentSize": "1KB", "dmpDataNumber": dmp_1}),
+        File("b.txt", {"contentSize": "1MB", "dmpDataNumber": dmp_1}),
+        # a reference loaded from JSON-LD
+        File("c.txt", {"contentSize": "512B", "dmpDataNumber": {"@id": "#dmp:2"}}),
+    )
+    return crate
+
+
+def test_file_size_index() -> None:
+    crate = build_crate()
+    index = crate.get_file_size_index(File, "dmpDataNumber")
+
+    assert index.sizes == {"#dmp:1": 1024 + 1024**2, "#dmp:2": 512}
+    assert index.total_size("#dmp:1", "KB") == 1025.0
+    assert index.total_size("#dmp:2", "B") == 512.0
+    assert index.total_size("#dmp:3", "GB") == 0.0
+
+    crate.add(File("d.txt", {"contentSize": "1XB", "dmpDataNumber": {"@id": "#dmp:2"}}))
+    index = crate.get_file_size_index(File, "dmpDataNumber")
+    assert index.total_size("#dmp:1", "B") == 1024 + 1024**2
+    with pytest.raises(ValueError):
+        index.total_size("#dmp:2", "B")
+
+
+def test_file_size_index_is_shared_within_validation_pass() -> None:
+    crate = build_crate()
+    assert crate.get_file_size_index(
+        File, "dmpDataNumber"
+    ) is not crate.get_file_size_index(File, "dmpDataNumber")
+
+    with crate.validation_pass():
+        index = crate.get_file_size_index(File, "dmpDataNumber")
+        with crate.validation_pass():
+            assert crate.get_file_size_index(File, "dmpDataNumber") is index
+        assert crate.get_file_size_index(File, "dmpDataNumber") is index
+
+    assert crate.get_file_size_index(File, "dmpDataNumber") is not index
+
+
+def test_cached_from_threads() -> None:
+    crate = build_crate()
+    started = threading.Event()
+    released = threading.Event()
+    builds: List[int] = []
+
+    def build() -> int:
+        builds.append(1)
+        started.set()
+        released.wait(5)
+        return len(builds)
+
+    results: List[int] = []
+    barrier = threading.Barrier(5)
+
+    def get() -> None:
+        barrier.wait()
+        results.append(crate.cached("key", build))
+
+    with crate.validation_pass():
+        threads = [threading.Thread(target=get) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        started.wait(5)
+        sleep(0.1)  # the other threads wait for the value being built
+    # the pass is closed while the value is being built, e.g., by follow-up work of an entity
+    released.set()
+    for thread in threads:
+        thread.join()
+    assert results == [1, 1, 1, 1]
+    assert len(builds) == 1
+
+
+def test_resolve_references() -> None:
+    crate = build_crate()
+    jsonld: Dict[str, Any] = {
+        "@context": RO_CRATE_CONTEXT,
+        "@graph": [entity.as_jsonld() for entity in crate.all_entities],
+    }
+    jsonld["@graph"].append(
+        {
+            "@id": "e.txt",
+            "@type": "File",
+            "@context": jsonld["@graph"][-1]["@context"],
+            "name": "e.txt",
+            "contentSize": "1B",
+            "dmpDataNumber": {"@id": "#dmp:3"},
+        }
+    )
+
+    loaded = ROCrate(jsonld)
+    assert loaded.get_by_id("a.txt")[0]["dmpDataNumber"] == {"@id": "#dmp:1"}
+    with pytest.raises(CrateCheckPropsError) as exc_info:
+        loaded.resolve_references()
+    assert [(e.entity.id, list(e.errors)) for e in exc_info.value.errors] == [
+        ("e.txt", ["dmpDataNumber"])
+    ]
+
+    dmp_1 = loaded.get_by_id("#dmp:1")[0]
+    assert loaded.get_by_id("a.txt")[0]["dmpDataNumber"] is dmp_1
+    assert loaded.get_by_id("e.txt")[0]["dmpDataNumber"] == {"@id": "#dmp:3"}
+    assert loaded.default_entities[1]["about"] is loaded.root
+    # non-reference props are left as is
+    assert loaded.default_entities[1]["conformsTo"] == jsonld["@graph"][1]["conformsTo"]
+
+
+def test_remove() -> None:
+    crate = ROCrate()
+    files = [BaseFile(f"{i}.txt", {"name": f"{i}.txt"}) for i in range(10)]
+    crate.add(*files)
+
+    crate.remove(*files[2:8:2])
+    assert crate.data_entities == [files[i] for i in (0, 1, 3, 5, 7, 8, 9)]
+    assert crate.root["hasPart"] is crate.data_entities
+    assert crate.graph.referrers("2.txt") == []
+
+    # an equal entity that is not the one in the crate
+    with pytest.raises(ValueError):
+        crate.remove(BaseFile("0.txt", {"name": "0.txt"}))
+    # nothing is removed if one of the entities cannot be removed
+    with pytest.raises(ValueError):
+        crate.remove(files[0], crate.root)
+    assert files[0] in crate.graph
+    assert len(crate.data_entities) == 7
+
+    # removed one by one, in the order of as_jsonld()
+    for i in (0, 1, 3):
+        crate.remove(files[i])
+    assert crate.data_entities == [files[i] for i in (5, 7, 8, 9)]
+    assert [ent["@id"] for ent in crate.root.as_jsonld()["hasPart"]] == [
+        "5.txt",
+        "7.txt",
+        "8.txt",
+        "9.txt",
+    ]
+
+    # an entity appended to the list directly, not by add()
+    other = BaseFile("other.txt", {"name": "other.txt"})
+    crate.data_entities.append(other)
+    crate.remove(other)
+    assert crate.data_entities == [files[i] for i in (5, 7, 8, 9)]
+
+
+def test_entity_list() -> None:
+    files = [BaseFile(f"{i}.txt", {"name": f"{i}.txt"}) for i in range(5)]
+    entities = EntityList(files)
+    entities.discard(files[1])
+    entities.discard(files[3])
+    # an entity appended again after it was discarded is kept
+    entities.append(files[3])
+    assert entities == [files[0], files[2], files[4], files[3]]
+    assert len(entities) == 4
+    assert entities.contains(files[0])
+    assert not entities.contains(BaseFile("0.txt", {"name": "0.txt"}))
+
+    entities.discard(files[0])
+    assert [files[1]] + entities == [files[1], files[2], files[4], files[3]]
+    assert copy.deepcopy(entities) == [files[2], files[4], files[3]]
+
+
+def test_add_records() -> None:
+    crate = ROCrate()
+    rows = [
+        {"@id": f"{i}.txt", "name": f"{i}.txt", "contentSize": f"{i}B"}
+        for i in range(3)
+    ]
+    entities = crate.add_records(BaseFile, rows)
+
+    assert crate.data_entities == entities
+    for row, entity in zip(rows, entities):
+        expected = BaseFile(row["@id"], {k: v for k, v in row.items() if k != "@id"})
+        assert type(entity) is BaseFile
+        assert entity.data == expected.data
+        assert entity.schema_name == expected.schema_name
+        entity.check_props()
+    assert crate.graph.referrers(entities[0]) == [(crate.root, "hasPart")]
+
+    dmps = crate.add_records(DMP, [{"@id": "#dmp:1", "dataNumber": 1}])
+    assert crate.contextual_entities == dmps
+
+    with pytest.raises(ValueError):
+        crate.add_records(BaseFile, [{"name": "no id"}])
+    with pytest.raises(TypeError):
+        crate.add_records(RootDataEntity, [{"@id": "./"}])
+
+
+def test_get_validation_closure() -> None:
+    crate = build_crate()
+    dmp_1, dmp_2 = crate.contextual_entities
+    file_a, file_b, file_c = crate.data_entities
+
+    # a File references its DMP
+    assert crate.get_validation_closure([file_c]) == [file_c, dmp_2]
+    # a DMP looks up the Files and their DMPs
+    assert crate.get_validation_closure([dmp_1]) == [
+        dmp_1,
+        file_a,
+        file_b,
+        file_c,
+        dmp_2,
+    ]
+    # the references of the RootDataEntity are not followed
+    assert crate.get_validation_closure([crate.root]) == [crate.root]
+
+    crate.check_duplicate_entity([file_a])
+    crate.add(File("a.txt", {"contentSize": "1KB"}))
+    with pytest.raises(CrateError):
+        crate.check_duplicate_entity([file_a])
+    crate.check_duplicate_entity([file_b])
+
+
+def test_check_props_of_entities() -> None:
+    crate = ROCrate()
+    valid = BaseFile("a.txt", {"name": "a.txt", "contentSize": "1B"})
+    invalid = BaseFile("b.txt", {"name": 1, "contentSize": "1B"})
+    crate.add(valid, invalid)
+
+    crate.check_props([valid])
+    with pytest.raises(CrateCheckPropsError):
+        crate.check_props()
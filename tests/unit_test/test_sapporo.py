@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Iterator
+from unittest import mock
+
+import pytest
+
+from nii_dg.cancellation import CancelToken, cancellable
+from nii_dg.entity import ContextualEntity
+from nii_dg.error import EntityError
+from nii_dg.ro_crate import ROCrate
+from nii_dg.schema.sapporo import (Dataset, File, OutputDownloader,
+                                   PollingBackoff, RunPoller, SapporoRun,
+                                   get_output_path, get_run_poller)
+from nii_dg.utils import DG_CONFIG
+
+OUTPUTS = {
+    "result.txt": b"result\n" * 1000,
+    "report.html": b"<html></html>",
+    **{f"part_{i}.txt": f"part {i}\n".encode("utf-8") for i in range(8)},
+}
+
+# the fake run reports RUNNING to the first status requests
+RUNNING_POLLS = 2
+SLOW_OUTPUT_DELAY = 5
+
+
+class FakeSapporoHandler(BaseHTTPRequestHandler):
+    # keep connections alive between requests
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+    def send_json(self, data: Dict[str, Any]) -> None:
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_json({"run_id": "run-1"})
+
+    def do_GET(self) -> None:
+        if self.path == "/runs/run-1/status":
+            self.server.status_requests += 1  # type: ignore
+            if self.server.status_requests <= RUNNING_POLLS:  # type: ignore
+                self.send_json({"state": "RUNNING"})
+            else:
+                self.send_json({"state": "COMPLETE"})
+        elif self.path == "/runs/run-1":
+            names = [*OUTPUTS, *self.server.extra_outputs]  # type: ignore
+            self.send_json({"outputs": [{"file_name": name} for name in names]})
+        elif self.path == "/runs/run-1/data/outputs/moved.txt":
+            body = b"Moved"
+            self.send_response(302)
+            self.send_header("Location", "/files/result.txt")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path == "/files/result.txt" or self.path.startswith(
+            "/runs/run-1/data/outputs/"
+        ):
+            file_name = self.path.rsplit("/", 1)[-1]
+            if file_name not in OUTPUTS:
+                self.send_error(404)
+                return
+            body = OUTPUTS[file_name]
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if file_name in self.server.slow_outputs:  # type: ignore
+                # send the first half, and the rest only after a long while
+                half = len(body) // 2
+                self.wfile.write(body[:half])
+                self.wfile.flush()
+                self.server.released.wait(SLOW_OUTPUT_DELAY)  # type: ignore
+                body = body[half:]
+            try:
+                self.wfile.write(body)
+            except OSError:
+                pass  # the client has aborted the download
+        else:
+            self.send_error(404)
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setitem(DG_CONFIG, "DG_SAPPORO_POLL_INITIAL", 0.01)
+    monkeypatch.setitem(DG_CONFIG, "DG_SAPPORO_POLL_MAX", 0.05)
+
+
+@pytest.fixture
+def sapporo_server() -> Iterator[ThreadingHTTPServer]:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeSapporoHandler)
+    server.status_requests = 0  # type: ignore
+    server.slow_outputs = set()  # type: ignore
+    server.extra_outputs = []  # type: ignore
+    server.released = threading.Event()  # type: ignore
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+    )
+    thread.start()
+    yield server
+    server.released.set()  # type: ignore
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def sapporo_endpoint(sapporo_server: ThreadingHTTPServer) -> str:
+    return f"http://127.0.0.1:{sapporo_server.server_address[1]}/"
+
+
+def build_crate(endpoint: str, result_sha256: str) -> ROCrate:
+    crate = ROCrate()
+    result = File(
+        "outputs/result.txt",
+        {
+            "name": "result.txt",
+            "contentSize": f"{len(OUTPUTS['result.txt'])}B",
+            "sha256": result_sha256,
+        },
+    )
+    report = File("outputs/report.html", {"name": "report.html"})
+    parts = [
+        File(
+            f"outputs/{name}",
+            {"name": name, "sha256": hashlib.sha256(OUTPUTS[name]).hexdigest()},
+        )
+        for name in OUTPUTS
+        if name.startswith("part_")
+    ]
+    outputs = Dataset(
+        "outputs/", {"name": "outputs", "hasPart": [result, report, *parts]}
+    )
+    sapporo_run = SapporoRun(
+        props={
+            "workflow_engine_name": "cwltool",
+            "sapporo_location": endpoint,
+            "state": "COMPLETE",
+            "outputs": outputs,
+        }
+    )
+    crate.add(result, report, *parts, outputs, sapporo_run)
+    return crate
+
+
+def test_download_output(sapporo_endpoint: str) -> None:
+    with OutputDownloader(sapporo_endpoint, "run-1") as downloader:
+        size, sha256 = downloader.fetch("result.txt")
+        assert size == len(OUTPUTS["result.txt"])
+        assert sha256 == hashlib.sha256(OUTPUTS["result.txt"]).hexdigest()
+        # the redirected output is downloaded, not the body of the redirect
+        assert downloader.fetch("moved.txt") == (size, sha256)
+        with pytest.raises(ValueError):
+            downloader.fetch("missing.txt")
+
+
+def test_validate_sapporo_run(sapporo_endpoint: str) -> None:
+    crate = build_crate(
+        sapporo_endpoint, hashlib.sha256(OUTPUTS["result.txt"]).hexdigest()
+    )
+    crate.get_by_type(SapporoRun)[0].validate(crate)
+
+
+def test_validate_sapporo_run_hash_mismatch(sapporo_endpoint: str) -> None:
+    crate = build_crate(sapporo_endpoint, "0" * 64)
+    with pytest.raises(EntityError) as e:
+        crate.get_by_type(SapporoRun)[0].validate(crate)
+    assert "does not match the `sha256` value" in e.value.errors["outputs"]
+
+
+def test_get_output_path(tmp_path: Path) -> None:
+    outputs_dir = str(tmp_path)
+    run_dir = tmp_path.resolve().joinpath("run-1")
+    assert get_output_path(outputs_dir, "run-1", "a/b.txt") == run_dir / "a" / "b.txt"
+    assert get_output_path(outputs_dir, "run-1", "a/../b.txt") == run_dir / "b.txt"
+    assert get_output_path(outputs_dir, "run-1", "../run-2/b.txt") is None
+    assert get_output_path(outputs_dir, "run-1", "../../b.txt") is None
+    assert get_output_path(outputs_dir, "run-1", "/etc/passwd") is None
+    assert get_output_path(outputs_dir, "run-1", ".") is None
+    assert get_output_path(outputs_dir, "../run-1", "b.txt") is None
+    assert get_output_path(outputs_dir, "/tmp", "b.txt") is None
+    assert get_output_path(outputs_dir, ".", "b.txt") is None
+
+
+def test_validate_sapporo_run_outputs_dir(
+    sapporo_server: ThreadingHTTPServer,
+    sapporo_endpoint: str,
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+) -> None:
+    outputs_dir = tmp_path.joinpath("outputs")
+    monkeypatch.setitem(DG_CONFIG, "DG_SAPPORO_OUTPUTS_DIR", str(outputs_dir))
+    crate = build_crate(
+        sapporo_endpoint, hashlib.sha256(OUTPUTS["result.txt"]).hexdigest()
+    )
+    crate.get_by_type(SapporoRun)[0].validate(crate)
+    assert (
+        outputs_dir.joinpath("run-1", "result.txt").read_bytes()
+        == OUTPUTS["result.txt"]
+    )
+
+    # an output of the run that would be saved outside the outputs directory
+    sapporo_server.extra_outputs.append("../../escape.txt")  # type: ignore
+    escape = File(
+        "outputs/escape.txt",
+        {"name": "../../escape.txt", "sha256": hashlib.sha256(b"").hexdigest()},
+    )
+    crate.add(escape)
+    crate.get_by_type(Dataset)[0]["hasPart"].append(escape)
+    with pytest.raises(EntityError) as e:
+        crate.get_by_type(SapporoRun)[0].validate(crate)
+    assert "outside DG_SAPPORO_OUTPUTS_DIR" in e.value.errors["outputs"]
+    assert not tmp_path.joinpath("escape.txt").exists()
+    assert list(tmp_path.iterdir()) == [outputs_dir]
+
+
+def test_validate_sapporo_run_fail_fast(
+    sapporo_endpoint: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setitem(DG_CONFIG, "DG_SAPPORO_FAIL_FAST", True)
+    monkeypatch.setitem(DG_CONFIG, "DG_SAPPORO_DOWNLOAD_WORKERS", 1)
+    crate = build_crate(sapporo_endpoint, "0" * 64)
+    with pytest.raises(EntityError) as e:
+        crate.get_by_type(SapporoRun)[0].validate(crate)
+    assert "result.txt does not match the `sha256` value" in e.value.errors["outputs"]
+
+
+def test_fail_fast_aborts_running_downloads(
+    sapporo_server: ThreadingHTTPServer,
+    sapporo_endpoint: str,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setitem(DG_CONFIG, "DG_SAPPORO_FAIL_FAST", True)
+    monkeypatch.setitem(DG_CONFIG, "DG_SAPPORO_DOWNLOAD_WORKERS", 2)
+    sapporo_server.slow_outputs.add("part_0.txt")  # type: ignore
+    crate = build_crate(sapporo_endpoint, "0" * 64)
+    start = time.perf_counter()
+    with pytest.raises(EntityError):
+        crate.get_by_type(SapporoRun)[0].validate(crate)
+    # the slow download of part_0.txt, running next to result.txt, is not waited for
+    assert time.perf_counter() - start < SLOW_OUTPUT_DELAY / 2
+
+
+def test_polling_backoff() -> None:
+    backoff = PollingBackoff(initial=10, maximum=60, factor=2)
+    assert backoff.next_interval(None, False) == 10
+    assert backoff.next_interval(10, False) == 20
+    assert backoff.next_interval(40, False) == 60
+    assert backoff.next_interval(60, True) == 10
+
+
+def test_run_poller_workers(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setitem(DG_CONFIG, "DG_SAPPORO_POLL_WORKERS", 2)
+    poller = RunPoller()
+    assert poller.max_workers == 2
+    # no thread is started until a run is watched
+    assert poller.tracked_runs() == 0
+    assert poller._executor is None
+
+
+def test_validate_async_sapporo_run(sapporo_endpoint: str) -> None:
+    crate = build_crate(
+        sapporo_endpoint, hashlib.sha256(OUTPUTS["result.txt"]).hexdigest()
+    )
+    sapporo_run = crate.get_by_type(SapporoRun)[0]
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = sapporo_run.validate_async(crate, executor)
+        # the run is still RUNNING, but no worker is blocked on it
+        assert get_run_poller().tracked_runs() == 1
+        assert future.result(timeout=5) is None
+
+
+def test_validate_async_invalid_sapporo_run(sapporo_endpoint: str) -> None:
+    crate = build_crate(sapporo_endpoint, "0" * 64)
+    sapporo_run = crate.get_by_type(SapporoRun)[0]
+    error = EntityError(sapporo_run)
+    with mock.patch.object(ContextualEntity, "validate", side_effect=error):
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = sapporo_run.validate_async(crate, executor)
+    # the error is reported through the Future, and the workflow is not re-executed
+    assert future.exception() is error
+    assert get_run_poller().tracked_runs() == 0
+
+
+def test_cancel_async_sapporo_run(sapporo_endpoint: str) -> None:
+    crate = build_crate(
+        sapporo_endpoint, hashlib.sha256(OUTPUTS["result.txt"]).hexdigest()
+    )
+    sapporo_run = crate.get_by_type(SapporoRun)[0]
+    token = CancelToken()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        with cancellable(token):
+            future = sapporo_run.validate_async(crate, executor)
+        assert get_run_poller().tracked_runs() == 1
+        # the run is no longer polled
+        token.cancel()
+        with pytest.raises(CancelledError):
+            future.result(timeout=5)
+        assert get_run_poller().tracked_runs() == 0
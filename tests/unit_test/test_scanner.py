@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import hashlib
+from pathlib import Path
+
+from nii_dg.hash_cache import HashCache
+from nii_dg.scanner import scan_directory
+from nii_dg.schema.base import Dataset, File
+from nii_dg.schema.sapporo import Dataset as SapporoDataset
+from nii_dg.schema.sapporo import File as SapporoFile
+from nii_dg.utils import compute_sha256
+
+
+def test_compute_sha256(tmp_path: Path) -> None:
+    file_path = tmp_path.joinpath("data.bin")
+    content = b"nii-dg" * 100000
+    file_path.write_bytes(content)
+
+    assert compute_sha256(file_path, chunk_size=4096) == hashlib.sha256(content).hexdigest()
+
+
+def test_scan_directory(tmp_path: Path) -> None:
+    tmp_path.joinpath("sub").mkdir()
+    tmp_path.joinpath("a.txt").write_text("a")
+    tmp_path.joinpath("sub/b.json").write_text("{}")
+
+    entities = scan_directory(tmp_path)
+    assert [ent.id for ent in entities] == ["sub/", "a.txt", "sub/b.json"]
+    assert isinstance(entities[0], Dataset)
+    assert isinstance(entities[1], File)
+    assert entities[1]["contentSize"] == "1B"
+    assert entities[1]["encodingFormat"] == "text/plain"
+    assert entities[1]["sha256"] == hashlib.sha256(b"a").hexdigest()
+    for ent in entities:
+        ent.check_props()
+
+
+def test_scan_directory_with_base_dir(tmp_path: Path) -> None:
+    outputs_dir = tmp_path.joinpath("outputs")
+    outputs_dir.mkdir()
+    outputs_dir.joinpath("result.txt").write_text("result")
+
+    entities = scan_directory(
+        outputs_dir,
+        file_class=SapporoFile,
+        dataset_class=SapporoDataset,
+        base_dir=tmp_path,
+    )
+    assert [ent.id for ent in entities] == ["outputs/", "outputs/result.txt"]
+    assert entities[0]["hasPart"] == [entities[1]]
+    assert "encodingFormat" not in entities[1]
+
+
+def test_scan_directory_with_hash_cache(tmp_path: Path) -> None:
+    data_dir = tmp_path.joinpath("data")
+    data_dir.mkdir()
+    data_dir.joinpath("a.txt").write_text("a")
+    data_dir.joinpath("b.txt").write_text("b")
+    cache_path = tmp_path.joinpath("hash_cache.json")
+
+    with HashCache(cache_path) as hash_cache:
+        scan_directory(data_dir, hash_cache=hash_cache)
+        assert (hash_cache.hits, hash_cache.misses) == (0, 2)
+
+    data_dir.joinpath("b.txt").write_text("modified")
+    hash_cache = HashCache(cache_path)
+    entities = scan_directory(data_dir, hash_cache=hash_cache)
+    assert (hash_cache.hits, hash_cache.misses) == (1, 1)
+    assert entities[1]["sha256"] == hashlib.sha256(b"modified").hexdigest()
+    assert hash_cache.verify(data_dir.joinpath("a.txt"), hashlib.sha256(b"a").hexdigest())
+
+
+def test_scan_directory_with_verify_filter(tmp_path: Path) -> None:
+    tmp_path.joinpath("result.txt").write_text("result")
+    tmp_path.joinpath("report.html").write_text("<html></html>")
+    cache_path = tmp_path.joinpath("hash_cache.json")
+
+    with HashCache(cache_path) as hash_cache:
+        report, result = scan_directory(
+            tmp_path,
+            with_datasets=False,
+            hash_cache=hash_cache,
+            verify_filter=lambda path: path.suffix != ".html",
+        )
+        # only result.txt is hashed
+        assert (hash_cache.hits, hash_cache.misses) == (0, 1)
+    assert report["encodingFormat"] == "text/html"
+    assert "contentSize" not in report and "sha256" not in report
+    assert result["contentSize"] == "6B"
+    assert result["sha256"] == hashlib.sha256(b"result").hexdigest()
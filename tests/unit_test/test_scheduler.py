@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import threading
+import time
+from queue import Empty
+
+import pytest
+
+from nii_dg.scheduler import JobScheduler
+
+
+def test_priority() -> None:
+    scheduler = JobScheduler()
+    scheduler.put("1", "bulk_1", "bulk", "a")
+    scheduler.put("2", "fast_1", "fast", "a")
+    scheduler.put("3", "workflow_1", "workflow", "a")
+    assert scheduler.qsize() == 3
+    assert scheduler.qsize("fast") == 1
+
+    assert scheduler.get(["fast", "bulk"]) == "fast_1"
+    assert scheduler.get(["fast", "bulk"]) == "bulk_1"
+    with pytest.raises(Empty):
+        scheduler.get(["fast", "bulk"], timeout=0.01)
+    assert scheduler.get(["workflow"]) == "workflow_1"
+    assert scheduler.qsize() == 0
+
+
+def test_fair_queuing() -> None:
+    scheduler = JobScheduler()
+    for i in range(3):
+        scheduler.put(f"a{i}", f"a{i}", "bulk", "a")
+    scheduler.put("b0", "b0", "bulk", "b")
+    scheduler.put("c0", "c0", "bulk", "c")
+    assert scheduler.qsize(client="a") == 3
+
+    # the clients take turns, so that b and c do not wait for all jobs of a
+    jobs = [scheduler.get(["bulk"]) for _ in range(5)]
+    assert jobs == ["a0", "b0", "c0", "a1", "a2"]
+
+
+def test_remove() -> None:
+    scheduler = JobScheduler()
+    scheduler.put("1", "job_1", "bulk", "a")
+    scheduler.put("2", "job_2", "bulk", "a")
+    assert scheduler.remove("1")
+    assert not scheduler.remove("1")
+    assert scheduler.qsize() == 1
+    assert scheduler.get(["bulk"]) == "job_2"
+
+
+def test_get_waits_for_job() -> None:
+    scheduler = JobScheduler()
+    timer = threading.Timer(0.1, scheduler.put, ("1", "job_1", "fast", "a"))
+    timer.start()
+    assert scheduler.get(["fast"], timeout=5) == "job_1"
+
+
+def test_wake() -> None:
+    scheduler = JobScheduler()
+    timer = threading.Timer(0.1, scheduler.wake)
+    timer.start()
+    start = time.monotonic()
+    with pytest.raises(Empty):
+        scheduler.get(["fast"], timeout=5)
+    assert time.monotonic() - start < 1
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import gc
+import json
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from nii_dg.error import CrateError
+from nii_dg.ro_crate import ROCrate
+from nii_dg.schema.amed import DMP, File
+from nii_dg.stored_crate import LazyROCrate, SQLiteROCrate, StoredROCrate
+
+SAMPLE_CRATE = Path(__file__).parents[1].joinpath("example/sample_crate.json")
+
+
+@pytest.mark.parametrize("stored_crate_class", [SQLiteROCrate, LazyROCrate])
+def test_stored_crate_is_equivalent_to_crate(
+    tmp_path: Path, stored_crate_class: Callable[..., StoredROCrate]
+) -> None:
+    with SAMPLE_CRATE.open("r", encoding="utf-8") as f:
+        jsonld = json.load(f)
+    crate = ROCrate(jsonld)
+    stored = stored_crate_class(jsonld=jsonld)
+
+    assert [repr(e) for e in stored.all_entities] == [
+        repr(e) for e in crate.all_entities
+    ]
+    for entity in crate.all_entities:
+        assert stored.get_by_id(entity.id) == crate.get_by_id(entity.id)
+        assert stored.get_by_type(type(entity)) == crate.get_by_type(type(entity))
+
+    crate.dump(tmp_path.joinpath("crate.json"))
+    stored.dump(tmp_path.joinpath("stored.json"))
+    assert (
+        tmp_path.joinpath("stored.json").read_text()
+        == tmp_path.joinpath("crate.json").read_text()
+    )
+
+
+def test_sqlite_crate_materializes_on_demand(tmp_path: Path) -> None:
+    path = str(tmp_path.joinpath("crate.db"))
+    crate = SQLiteROCrate(path)
+    dmp = DMP("#dmp:1", {"dataNumber": 1})
+    crate.add(dmp)
+    crate.add_records(
+        File, [{"@id": f"{i}.txt", "dmpDataNumber": dmp} for i in range(3)]
+    )
+
+    # the same instance while it is alive, and setting a prop is written back
+    file_0 = crate.get_by_id("0.txt")[0]
+    assert crate.get_by_type(File)[0] is file_0
+    assert file_0["dmpDataNumber"] == {"@id": "#dmp:1"}
+    file_0["name"] = "renamed"
+    del file_0
+    gc.collect()
+    assert crate.get_by_id("0.txt")[0]["name"] == "renamed"
+
+    # in-place mutation requires save()
+    dmp["keyword"] = ["a"]
+    dmp["keyword"].append("b")
+    crate.save(dmp)
+
+    crate.remove(crate.get_by_id("1.txt")[0])
+    assert [e.id for e in crate.data_entities] == ["0.txt", "2.txt"]
+    with pytest.raises(ValueError):
+        crate.remove(File("2.txt", {}))
+    crate.close()
+
+    reopened = SQLiteROCrate(path)
+    assert reopened.get_by_id("#dmp:1")[0]["keyword"] == ["a", "b"]
+    assert [e.id for e in reopened.data_entities] == ["0.txt", "2.txt"]
+    assert list(reopened.iter_entities())[0] is reopened.root
+    assert reopened.root["hasPart"] == [
+        {"@id": "0.txt"},
+        {"@id": "2.txt"},
+    ]
+
+    reopened.add(DMP("#dmp:1", {"dataNumber": 2}))
+    with pytest.raises(CrateError):
+        reopened.check_duplicate_entity()
+
+
+def test_lazy_crate_materializes_accessed_entities_only() -> None:
+    with SAMPLE_CRATE.open("r", encoding="utf-8") as f:
+        jsonld = json.load(f)
+    crate = LazyROCrate(jsonld)
+    # only the DefaultEntities are instantiated while loading
+    assert len(crate._cache) == 2
+
+    dmp = crate.get_by_id("#dmp:1")[0]
+    assert len(crate._cache) == 3
+    assert dmp.as_jsonld() == jsonld["@graph"][6]
+
+    dmp["dataNumber"] = 2
+    del dmp
+    gc.collect()
+    assert crate.get_by_id("#dmp:1")[0]["dataNumber"] == 2
+    assert len(crate.get_by_type(type(crate.get_by_id("file_1.txt")[0]))) == 1
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import pytest
+
+from nii_dg.ro_crate import ROCrate
+from nii_dg.schema.amed import DMP, File
+
+
+def build_crate() -> ROCrate:
+    crate = ROCrate()
+    dmp = DMP("#dmp:1", {"dataNumber": 1})
+    crate.add(dmp)
+    crate.add(
+        File("a.txt", {"name": "a.txt", "contentSize": "1KB", "dmpDataNumber": dmp}),
+        File("b.txt", {"name": "b.txt", "dmpDataNumber": {"@id": "#dmp:1"}}),
+    )
+    return crate
+
+
+def test_to_table() -> None:
+    crate = build_crate()
+    table = crate.to_table(File)
+
+    assert list(table)[:1] == ["@id"]
+    assert set(File.get_entity_def()["props"]) <= set(table)
+    assert table["@id"] == ["a.txt", "b.txt"]
+    assert table["contentSize"] == ["1KB", None]
+    assert table["dmpDataNumber"] == ["#dmp:1", "#dmp:1"]
+
+    with pytest.raises(ValueError):
+        crate.to_table(File, "csv")
+
+
+def test_from_table() -> None:
+    crate = build_crate()
+    table = crate.to_table(File)
+
+    other = ROCrate()
+    entities = other.from_table(File, table)
+    assert [ent.as_jsonld() for ent in entities] == [
+        ent.as_jsonld() for ent in crate.data_entities
+    ]
+    assert entities[1]["dmpDataNumber"] == {"@id": "#dmp:1"}
+    assert "contentSize" not in entities[1]
+
+    with pytest.raises(ValueError):
+        other.from_table(File, {"name": ["c.txt"]})
+    with pytest.raises(ValueError):
+        other.from_table(File, {"@id": ["c.txt"], "name": []})
+
+
+@pytest.mark.parametrize("table_format", ["numpy", "pandas"])
+def test_table_formats(table_format: str) -> None:
+    pytest.importorskip(table_format)
+    crate = build_crate()
+    crate.add(DMP("#dmp:2"))
+    table = crate.to_table(DMP, table_format)
+    assert list(table["dataNumber"])[:1] == [1]
+    # an int column with an empty cell
+    dmps = ROCrate().from_table(DMP, table)
+    assert type(dmps[0]["dataNumber"]) is int
+    assert "dataNumber" not in dmps[1]
+
+    table = crate.to_table(File, table_format)
+    assert list(table["@id"]) == ["a.txt", "b.txt"]
+
+    entities = ROCrate().from_table(File, table)
+    assert [ent.as_jsonld() for ent in entities] == [
+        ent.as_jsonld() for ent in crate.data_entities
+    ]
@@ -1,8 +1,13 @@
 #!/usr/bin/env python3
 # coding: utf-8
 
+import hashlib
+import io
+
 from nii_dg.entity import RootDataEntity
-from nii_dg.utils import is_instance_of_expected_type
+from nii_dg.schema.amed import DMP
+from nii_dg.utils import (get_entity_type_names, hash_stream,
+                          is_instance_of_expected_type)
 
 
 def test_is_instance_of_expected_type() -> None:
@@ -40,3 +45,26 @@ def test_is_instance_of_expected_type() -> None:
     assert not is_instance_of_expected_type({"a": [1, 2], "b": [3, 4]}, "Dict[str, List[str]]")
 
     assert not is_instance_of_expected_type(RootDataEntity(), "str")
+
+    # entities defined in schema modules are checked by their class name
+    dmp = DMP("#dmp:1")
+    assert is_instance_of_expected_type(dmp, "DMP")
+    assert is_instance_of_expected_type([dmp, {"@id": "#dmp:2"}], "List[DMP]")
+    assert not is_instance_of_expected_type(dmp, "File")
+    assert not is_instance_of_expected_type("#dmp:1", "DMP")
+
+
+def test_get_entity_type_names() -> None:
+    assert get_entity_type_names("List[Union[File, Dataset]]") == ["File", "Dataset"]
+    assert get_entity_type_names("Optional[DMP]") == ["DMP"]
+    assert get_entity_type_names('Literal["open access", "embargoed access"]') == []
+    assert get_entity_type_names("Dict[str, str]") == []
+
+
+def test_hash_stream() -> None:
+    content = b"nii-dg" * 100000
+    sink = io.BytesIO()
+    size, sha256 = hash_stream(io.BytesIO(content), sink=sink, chunk_size=4096)
+    assert size == len(content)
+    assert sha256 == hashlib.sha256(content).hexdigest()
+    assert sink.getvalue() == content